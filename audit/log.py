@@ -0,0 +1,181 @@
+"""
+Audit trail of changes to tracked models.
+
+A Trail follows one model through its signals: post_init keeps a copy of the
+tracked fields as they were read, post_save and post_delete turn the
+difference into an entry {field: [old, new]}. Entries are not written one by
+one. They go into the buffer of the current request (AuditMiddleware) or job
+(buffered()), only once their transaction commits, and the buffer is written
+with one bulk_create when the request or job ends. Changes made outside a
+buffer are written straight away.
+
+The buffer is bounded by settings.AUDIT['MAX_BUFFER']. Once full, the 'flush'
+policy writes it out early, so the request producing that much pays for it,
+and the 'drop' policy discards further entries and logs how many were lost.
+"""
+
+import json
+import logging
+import threading
+from contextlib import contextmanager
+
+from django.conf import settings
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import DatabaseError, transaction
+from django.db.models.signals import post_init, post_save, post_delete
+from django.utils import timezone
+
+from .models import AuditEntry
+
+logger = logging.getLogger(__name__)
+
+FLUSH = 'flush'
+DROP = 'drop'
+
+_local = threading.local()
+_registry = {}
+
+
+def get_setting(name, default):
+    return getattr(settings, 'AUDIT', {}).get(name, default)
+
+
+def labels():
+    return set(_registry)
+
+
+def write(entries, user=None):
+    user_id = user.pk if user is not None and user.is_authenticated else None
+    AuditEntry.objects.bulk_create([AuditEntry(user_id=user_id, **entry) for entry in entries])
+
+
+class AuditBuffer:
+
+    def __init__(self, get_user=None):
+        self.get_user = get_user or (lambda: None)
+        self.entries = []
+        self.dropped = 0
+        self.closed = False
+        self.max_entries = get_setting('MAX_BUFFER', 1000)
+        self.overflow = get_setting('OVERFLOW', FLUSH)
+
+    def add(self, entry):
+        if self.closed:
+            # committed after the request or job ended
+            write([entry], self.get_user())
+            return
+        if len(self.entries) >= self.max_entries:
+            if self.overflow == DROP:
+                self.dropped += 1
+                return
+            self.flush()
+        self.entries.append(entry)
+
+    def flush(self):
+        entries, self.entries = self.entries, []
+        if self.dropped:
+            logger.warning("Audit buffer was full, %d entries were dropped", self.dropped)
+            self.dropped = 0
+        if entries:
+            write(entries, self.get_user())
+
+
+def _stack():
+    if not hasattr(_local, 'stack'):
+        _local.stack = []
+    return _local.stack
+
+
+@contextmanager
+def buffered(get_user=None):
+    buffer = AuditBuffer(get_user)
+    _stack().append(buffer)
+    try:
+        yield buffer
+    finally:
+        _stack().pop()
+        buffer.closed = True
+        try:
+            buffer.flush()
+        except DatabaseError:
+            # the audit trail never fails the request that made the changes
+            logger.exception("Could not write %d audit entries", len(buffer.entries))
+
+
+# for bulk maintenance (archiving, clearing all data) whose deletes are not user changes
+@contextmanager
+def suppressed():
+    _local.suppressed = getattr(_local, 'suppressed', 0) + 1
+    try:
+        yield
+    finally:
+        _local.suppressed -= 1
+
+
+def record(entry):
+    if getattr(_local, 'suppressed', 0):
+        return
+    stack = _stack()
+    buffer = stack[-1] if stack else None
+    # a rolled back transaction drops its callbacks, and the entries with them
+    transaction.on_commit(lambda: buffer.add(entry) if buffer is not None else write([entry]))
+
+
+class Trail:
+    """
+    Audits `fields` of `model`. With `parent` (a foreign key name) the changes
+    are filed under the related row instead, e.g. bill details under their bill,
+    and only recorded as changes of it.
+    """
+
+    def __init__(self, model, fields, parent=None):
+        self.model = model
+        self.attnames = {name: model._meta.get_field(name).attname for name in fields}
+        if parent:
+            field = model._meta.get_field(parent)
+            self.label, self.object_attr = field.related_model._meta.label, field.attname
+        else:
+            self.label, self.object_attr = model._meta.label, model._meta.pk.attname
+        self.parent = parent
+        _registry.setdefault(self.label, []).append(self)
+
+        post_init.connect(self._loaded, sender=model, weak=False)
+        post_save.connect(self._saved, sender=model, weak=False)
+        post_delete.connect(self._deleted, sender=model, weak=False)
+
+    # deferred fields are left out rather than loaded
+    def values(self, instance):
+        return {name: instance.__dict__[attname] for name, attname in self.attnames.items() if attname in instance.__dict__}
+
+    def entry(self, instance, action, changes):
+        return {
+            'model': self.label,
+            'object_id': getattr(instance, self.object_attr),
+            'object_repr': str(instance)[:200],
+            'action': action,
+            'changes': json.dumps(changes, cls=DjangoJSONEncoder),
+            'time': timezone.now(),
+        }
+
+    def _loaded(self, sender, instance, **kwargs):
+        instance._audit_snapshot = self.values(instance)
+
+    def _saved(self, sender, instance, created, update_fields=None, raw=False, **kwargs):
+        if raw:
+            return
+        current = self.values(instance)
+        if created and not self.parent:
+            action, changes = AuditEntry.CREATE, {name: [None, value] for name, value in current.items()}
+        else:
+            before = {} if created else getattr(instance, '_audit_snapshot', {})
+            action, changes = AuditEntry.UPDATE, {
+                name: [before.get(name), value] for name, value in current.items()
+                if before.get(name) != value and (update_fields is None or name in update_fields)
+            }
+        instance._audit_snapshot = current
+        if changes:
+            record(self.entry(instance, action, changes))
+
+    def _deleted(self, sender, instance, **kwargs):
+        if not self.parent:
+            record(self.entry(instance, AuditEntry.DELETE, {name: [value, None] for name, value in self.values(instance).items()}))
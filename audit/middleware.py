@@ -0,0 +1,12 @@
+from .log import buffered
+
+
+# collects the audit entries of a request and writes them in one insert once the response is ready
+class AuditMiddleware:
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        # request.user is only resolved if something was changed, read only requests cost nothing
+        with buffered(get_user=lambda: request.user):
+            return self.get_response(request)
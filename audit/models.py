@@ -0,0 +1,36 @@
+import json
+
+from django.conf import settings
+from django.db import models
+from django.utils import timezone
+
+
+class AuditEntry(models.Model):
+    CREATE = 'create'
+    UPDATE = 'update'
+    DELETE = 'delete'
+    ACTION_CHOICES = [
+        (CREATE, 'Created'),
+        (UPDATE, 'Changed'),
+        (DELETE, 'Deleted'),
+    ]
+
+    id = models.AutoField(primary_key=True)
+    model = models.CharField(max_length=50)                             # label of the audited model, e.g. 'inventory.Stock'
+    object_id = models.IntegerField()
+    object_repr = models.CharField(max_length=200)                      # str() of the row, still readable once it is deleted
+    action = models.CharField(max_length=10, choices=ACTION_CHOICES)
+    changes = models.TextField(default='{}')                            # json encoded {field: [old, new]}
+    user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.SET_NULL, blank=True, null=True, related_name='audit_entries')
+    time = models.DateTimeField(default=timezone.now)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['model', 'object_id', 'time']),
+        ]
+
+    def __str__(self):
+        return f"{self.model} {self.object_id}: {self.action} at {self.time}"
+
+    def get_changes(self):
+        return [(field, old, new) for field, (old, new) in json.loads(self.changes).items()]
@@ -0,0 +1,90 @@
+import json
+from decimal import Decimal
+
+from django.contrib.auth.models import User
+from django.db import transaction
+from django.test import TransactionTestCase, override_settings
+from django.urls import reverse
+
+from inventory.models import Stock
+from transactions.models import Customer, SaleBill, SaleBillDetails, Supplier
+from .log import DROP, buffered, suppressed
+from .models import AuditEntry
+
+
+class TrailTest(TransactionTestCase):
+    def setUp(self):
+        self.stock = Stock.objects.create(name='Widget', quantity=5, cost=Decimal('2.00'))
+
+    def entries(self, action=None):
+        queryset = AuditEntry.objects.filter(model='inventory.Stock').order_by('id')
+        return [json.loads(entry.changes) for entry in (queryset.filter(action=action) if action else queryset)]
+
+    def test_create_update_and_delete_are_recorded(self):
+        self.stock.quantity = 8
+        self.stock.save()
+        pk = self.stock.pk
+        self.stock.delete()
+        self.assertEqual([entry.action for entry in AuditEntry.objects.filter(object_id=pk).order_by('id')],
+                         [AuditEntry.CREATE, AuditEntry.UPDATE, AuditEntry.DELETE])
+        self.assertEqual(self.entries(AuditEntry.UPDATE), [{'quantity': [5, 8]}])
+
+    def test_rolled_back_change_is_not_recorded(self):
+        with self.assertRaises(ValueError), transaction.atomic():
+            self.stock.quantity = 8
+            self.stock.save()
+            raise ValueError
+        self.assertEqual(self.entries(AuditEntry.UPDATE), [])
+
+    def test_suppressed_changes_are_not_recorded(self):
+        with suppressed():
+            self.stock.delete()
+        self.assertEqual(self.entries(AuditEntry.DELETE), [])
+
+    def test_details_are_filed_under_their_bill(self):
+        customer = Customer.objects.create(name='Ann', phone='9876543210', address='Road', email='ann@example.com')
+        bill = SaleBill.objects.create(customer=customer)
+        SaleBillDetails.objects.create(billno=bill, eway='E1')
+        entry = AuditEntry.objects.get(model='transactions.SaleBill', action=AuditEntry.UPDATE)
+        self.assertEqual((entry.object_id, json.loads(entry.changes)), (bill.pk, {'eway': [None, 'E1']}))
+        self.assertFalse(AuditEntry.objects.filter(model='transactions.SaleBillDetails').exists())
+
+
+class BufferTest(TransactionTestCase):
+    def setUp(self):
+        self.stocks = [Stock.objects.create(name=f"Part {number}", quantity=1, cost=Decimal('2.00')) for number in range(3)]
+        AuditEntry.objects.all().delete()
+
+    def change_all(self):
+        for stock in self.stocks:
+            stock.quantity += 1
+            stock.save()
+
+    def test_entries_are_written_together_when_the_buffer_closes(self):
+        with buffered():
+            self.change_all()
+            self.assertEqual(AuditEntry.objects.count(), 0)
+        self.assertEqual(AuditEntry.objects.count(), 3)
+
+    @override_settings(AUDIT={'MAX_BUFFER': 2, 'OVERFLOW': 'flush'})
+    def test_full_buffer_is_flushed_early(self):
+        with buffered():
+            self.change_all()
+            self.assertEqual(AuditEntry.objects.count(), 2)
+        self.assertEqual(AuditEntry.objects.count(), 3)
+
+    @override_settings(AUDIT={'MAX_BUFFER': 2, 'OVERFLOW': DROP})
+    def test_full_buffer_drops_further_entries(self):
+        with self.assertLogs('audit.log', 'WARNING') as logs, buffered():
+            self.change_all()
+        self.assertEqual(AuditEntry.objects.count(), 2)
+        self.assertIn('1 entries were dropped', logs.output[0])
+
+    def test_request_entries_carry_the_user(self):
+        clerk = User.objects.create_user('clerk')
+        self.client.force_login(clerk)
+        supplier = Supplier.objects.create(name='Acme', phone='9876543210', address='Road', email='acme@example.com', gstin='G1')
+        data = {'name': 'Acme', 'phone': '9876543210', 'address': 'New road', 'email': 'acme@example.com', 'gstin': 'G1', 'version': 0}
+        self.client.post(reverse('edit-supplier', args=[supplier.pk]), data)
+        entry = AuditEntry.objects.get(model='transactions.Supplier', action=AuditEntry.UPDATE)
+        self.assertEqual((entry.user, json.loads(entry.changes)), (clerk, {'address': ['Road', 'New road']}))
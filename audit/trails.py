@@ -0,0 +1,13 @@
+from inventory.models import Stock
+from transactions.models import Supplier, PurchaseBill, PurchaseBillDetails, SaleBill, SaleBillDetails
+
+from .log import Trail
+
+DETAIL_FIELDS = ('eway', 'veh', 'destination', 'po', 'cgst', 'sgst', 'igst', 'cess', 'tcs', 'total')
+
+stock_trail = Trail(Stock, fields=('name', 'sub_category', 'sku', 'quantity', 'cost', 'reorder_point', 'is_deleted'))
+supplier_trail = Trail(Supplier, fields=('name', 'phone', 'address', 'email', 'gstin', 'is_deleted'))
+purchase_trail = Trail(PurchaseBill, fields=('supplier', 'auto_generated'))
+purchase_details_trail = Trail(PurchaseBillDetails, fields=DETAIL_FIELDS, parent='billno')
+sale_trail = Trail(SaleBill, fields=('customer',))
+sale_details_trail = Trail(SaleBillDetails, fields=DETAIL_FIELDS, parent='billno')
@@ -0,0 +1,6 @@
+from django.urls import path
+from . import views
+
+urlpatterns = [
+    path('<str:label>/<int:object_id>/', views.HistoryView.as_view(), name='audit-history'),
+]
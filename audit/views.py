@@ -0,0 +1,24 @@
+from django.http import Http404
+from django.views.generic import ListView
+
+from .log import labels
+from .models import AuditEntry
+
+
+# change history of one audited row, newest first; reads the (model, object_id, time) index
+class HistoryView(ListView):
+    template_name = 'audit/history.html'
+    context_object_name = 'entries'
+    paginate_by = 20
+
+    def get_queryset(self):
+        if self.kwargs['label'] not in labels():
+            raise Http404("%s is not audited" % self.kwargs['label'])
+        return AuditEntry.objects.filter(model=self.kwargs['label'], object_id=self.kwargs['object_id']).select_related('user').order_by('-time', '-id')
+
+    def get_context_data(self, **kwargs):
+        context = super().get_context_data(**kwargs)
+        latest = self.object_list.first()
+        context['label'] = self.kwargs['label']
+        context['object_repr'] = latest.object_repr if latest else '%s %s' % (self.kwargs['label'], self.kwargs['object_id'])
+        return context
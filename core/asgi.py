@@ -2,6 +2,10 @@
 ASGI config for core project.
 
 It exposes the ASGI callable as a module-level variable named ``application``.
+Besides Django it serves the stock feed (inventory/feed.py), the long lived
+Server-Sent Events streams a WSGI worker would be held up by.
+The Procfile's web process serves this application (gunicorn with uvicorn
+workers); core/wsgi.py stays for tools that need WSGI.
 
 For more information on this file, see
 https://docs.djangoproject.com/en/3.0/howto/deployment/asgi/
@@ -9,8 +13,18 @@ https://docs.djangoproject.com/en/3.0/howto/deployment/asgi/
 
 import os
 
+from django.conf import settings
 from django.core.asgi import get_asgi_application
 
-os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'core.settings')
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'core.settings.prod')
 
-application = get_asgi_application()
+django_application = get_asgi_application()
+
+from inventory.feed import StockFeedApp  # noqa: E402 (needs the apps loaded by get_asgi_application)
+
+application = StockFeedApp(django_application)
+
+# compiles every template before the worker serves its first request (prod)
+if settings.TEMPLATE_WARMUP:
+    from core.warmup import warm_templates
+    warm_templates()
@@ -0,0 +1,98 @@
+"""
+Optimistic concurrency for edited rows.
+
+VersionedModel adds a version column. Saving a row that already exists runs
+UPDATE ... WHERE pk = %s AND version = <the version that was read> and
+increments the version. If someone else saved the row in between, nothing
+matches and ConflictError is raised, so the change is not silently lost. Saves
+of some fields (update_fields) also write the version and any auto_now field. Forms
+carry the version they were rendered with in a hidden field and only write
+the fields the user actually changed.
+"""
+
+from django import forms
+from django.db import models, transaction
+
+
+class ConflictError(Exception):
+    pass
+
+
+class VersionedModel(models.Model):
+    version = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        abstract = True
+
+    def save(self, *args, **kwargs):
+        if self._state.adding:
+            return super().save(*args, **kwargs)
+        if kwargs.get('update_fields') is not None:
+            touched = {field.name for field in self._meta.concrete_fields if getattr(field, 'auto_now', False)}
+            kwargs['update_fields'] = set(kwargs['update_fields']) | {'version'} | touched
+        self._expected_version = self.version
+        self.version += 1
+        try:
+            # in a savepoint, so a conflict leaves a surrounding transaction usable for the caller to recover
+            with transaction.atomic(using=kwargs.get('using')):
+                super().save(*args, **kwargs)
+        except ConflictError:
+            self.version = self._expected_version
+            raise
+        finally:
+            self._expected_version = None
+
+    def _do_update(self, base_qs, using, pk_val, values, update_fields, forced_update):
+        expected = getattr(self, '_expected_version', None)
+        if expected is None:
+            return super()._do_update(base_qs, using, pk_val, values, update_fields, forced_update)
+        updated = super()._do_update(base_qs.filter(version=expected), using, pk_val, values, update_fields, forced_update)
+        if not updated and base_qs.filter(pk=pk_val).exists():
+            raise ConflictError(
+                "%s %s was changed by someone else (version %s expected)." % (self._meta.verbose_name, pk_val, expected)
+            )
+        return updated
+
+
+class VersionedFormMixin:
+    """For ModelForms of a VersionedModel that list 'version' in Meta.fields."""
+
+    conflict_message = "Someone else changed this record while you were editing it. Their changes were kept, check the form and save again to apply yours."
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.fields['version'].widget = forms.HiddenInput()
+        self.fields['version'].required = False
+
+    def clean_version(self):
+        # a form posted without a version (an old page) falls back to last write wins
+        version = self.cleaned_data.get('version')
+        return self.instance.version if version is None else version
+
+    def save(self, commit=True):
+        if not commit or self.instance._state.adding:
+            return super().save(commit)
+        fields = [name for name in self.changed_data if name != 'version']
+        if fields:
+            self.instance.save(update_fields=fields)
+        return self.instance
+
+    # after a conflict the form keeps the user's input but is re-armed with the current version
+    def add_conflict_error(self):
+        current = type(self.instance)._default_manager.filter(pk=self.instance.pk).values_list('version', flat=True).first()
+        self.data = self.data.copy()
+        self.data[self.add_prefix('version')] = current
+        self.add_error(None, self.conflict_message)
+
+
+class ConflictMixin:
+    """For UpdateViews of a VersionedFormMixin form, answers a conflicting save with 409 and the re-armed form."""
+
+    def form_valid(self, form):
+        try:
+            return super().form_valid(form)
+        except ConflictError:
+            form.add_conflict_error()
+            response = self.form_invalid(form)
+            response.status_code = 409
+            return response
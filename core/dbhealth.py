@@ -0,0 +1,350 @@
+"""
+Database health: sizes, maintenance, index hints and integrity checks, for
+'manage.py dbhealth' and the scheduled 'db_maintenance' job.
+
+sizes() reports per model the rows (and soft-deleted rows), the bytes of the
+table and of its indexes, and the bloat: on SQLite the unused bytes inside the
+table's pages (from the dbstat table, where the library has it) and, for the
+whole file, the free pages (free_space()); on PostgreSQL the share of dead
+tuples.
+
+maintain() refreshes the planner statistics and reclaims space. On SQLite it
+runs ANALYZE under PRAGMA analysis_limit, which keeps it quick on big tables;
+PRAGMA optimize is not enough from a fresh connection, as before SQLite 3.46 it
+only analyzes the tables that connection queried. VACUUM rewrites the whole
+file under an exclusive lock, so it only runs once DBHEALTH['VACUUM_FREE_RATIO']
+of the file is free pages. On PostgreSQL, ANALYZE then VACUUM the tables that
+have more than that share of dead tuples.
+
+SlowQueryMiddleware (opt-in, DBHEALTH['RECORD_SLOW'] or DJANGO_SLOW_QUERIES=1)
+records the queries of a request slower than DBHEALTH['SLOW_QUERY'] seconds to
+<DIR>/slow.<pid>.jsonl, which is moved to slow.<pid>.1.jsonl (replacing the
+previous one) once it passes MAX_LOG_BYTES. The parameters are not kept, they
+may be phone numbers, emails or session keys: only their types are, and
+index_hints() plans the queries again (EXPLAIN) with a stand-in value of each
+type. It flags full scans and sorts on tables of at least MIN_ROWS rows, with
+the columns the query filters on that no index leads with.
+
+check() runs the INTEGRITY_CHECKS, each in pk ranges of BATCH_SIZE rows with a
+PAUSE between them, so it can run next to live traffic.
+"""
+
+import glob
+import json
+import os
+import re
+import time
+import uuid
+from collections import namedtuple, Counter
+from datetime import date, datetime, time as time_of_day, timedelta
+from decimal import Decimal
+from itertools import chain
+
+from django.apps import apps
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import connection
+from django.db.models import Exists, F, OuterRef, Q
+
+from inventory.models import CostLayer, Stock
+from transactions.models import PurchaseBill, PurchaseItem, SaleBill, SaleItem
+
+SLOW_LOG = 'slow.*.jsonl'
+
+# what a recorded query parameter is planned with, by the name of its type
+STAND_INS = {
+    'int': 1,
+    'float': 1.0,
+    'bool': True,
+    'str': 'x',
+    'bytes': b'x',
+    'Decimal': Decimal('1'),
+    'datetime': datetime(2000, 1, 1),
+    'date': date(2000, 1, 1),
+    'time': time_of_day(0, 0),
+    'timedelta': timedelta(seconds=1),
+    'UUID': uuid.UUID(int=1),
+    'NoneType': None,
+}
+
+TableSize = namedtuple('TableSize', 'model table rows deleted table_bytes index_bytes bloat_bytes')
+IndexHint = namedtuple('IndexHint', 'table problem columns views count seconds sql')
+CheckResult = namedtuple('CheckResult', 'name count sample')
+
+
+def get_setting(name, default):
+    return getattr(settings, 'DBHEALTH', {}).get(name, default)
+
+
+def _models():
+    return [model for model in apps.get_models() if model._meta.managed and not model._meta.proxy]
+
+
+# sizes
+
+def _sqlite_sizes():
+    with connection.cursor() as cursor:
+        cursor.execute("SELECT name, tbl_name FROM sqlite_master WHERE type = 'index'")
+        owner = dict(cursor.fetchall())
+        try:
+            cursor.execute("SELECT name, SUM(pgsize), SUM(unused) FROM dbstat GROUP BY name")
+        except Exception:
+            # SQLite built without SQLITE_ENABLE_DBSTAT_VTAB
+            return {}
+        sizes = {}
+        for name, size, unused in cursor.fetchall():
+            table = owner.get(name, name)
+            table_bytes, index_bytes, bloat_bytes = sizes.get(table, (0, 0, 0))
+            if name in owner:
+                sizes[table] = (table_bytes, index_bytes + size, bloat_bytes + unused)
+            else:
+                sizes[table] = (table_bytes + size, index_bytes, bloat_bytes + unused)
+        return sizes
+
+
+def _postgresql_sizes():
+    with connection.cursor() as cursor:
+        cursor.execute(
+            "SELECT relname, pg_relation_size(relid), pg_indexes_size(relid), "
+            "pg_relation_size(relid) * n_dead_tup / GREATEST(n_live_tup + n_dead_tup, 1) "
+            "FROM pg_stat_user_tables"
+        )
+        return {table: (table_bytes, index_bytes, bloat_bytes) for table, table_bytes, index_bytes, bloat_bytes in cursor.fetchall()}
+
+
+# per model, largest first
+def sizes():
+    measured = {'sqlite': _sqlite_sizes, 'postgresql': _postgresql_sizes}.get(connection.vendor, dict)()
+    result = []
+    for model in _models():
+        table = model._meta.db_table
+        rows = model._base_manager.count()
+        soft_delete = any(field.name == 'is_deleted' for field in model._meta.concrete_fields)
+        deleted = model._base_manager.filter(is_deleted=True).count() if soft_delete else None
+        result.append(TableSize(model._meta.label, table, rows, deleted, *measured.get(table, (None, None, None))))
+    return sorted(result, key=lambda size: (-(size.table_bytes or 0) - (size.index_bytes or 0), -size.rows))
+
+
+# (file bytes, free bytes) of a SQLite database, None elsewhere
+def free_space():
+    if connection.vendor != 'sqlite':
+        return None
+    with connection.cursor() as cursor:
+        values = []
+        for pragma in ('page_size', 'page_count', 'freelist_count'):
+            cursor.execute(f'PRAGMA {pragma}')
+            values.append(cursor.fetchone()[0])
+    page_size, pages, free = values
+    return pages * page_size, free * page_size
+
+
+# maintenance
+
+def maintain(vacuum=None):
+    """
+    Analyzes, and vacuums what needs it (vacuum=None), everything (True) or
+    nothing (False). Returns the statements run.
+    """
+    ratio = get_setting('VACUUM_FREE_RATIO', 0.2)
+    statements = []
+    with connection.cursor() as cursor:
+        if connection.vendor == 'sqlite':
+            statements += [f"PRAGMA analysis_limit = {int(get_setting('ANALYSIS_LIMIT', 1000))}", 'ANALYZE']
+            file_bytes, free_bytes = free_space()
+            if vacuum or (vacuum is None and file_bytes and free_bytes / file_bytes >= ratio):
+                statements.append('VACUUM')
+        elif connection.vendor == 'postgresql':
+            statements.append('ANALYZE')
+            if vacuum is not False:
+                cursor.execute("SELECT relname, n_live_tup, n_dead_tup FROM pg_stat_user_tables")
+                for table, live, dead in cursor.fetchall():
+                    if vacuum or dead / max(live + dead, 1) >= ratio:
+                        statements.append(f"VACUUM {connection.ops.quote_name(table)}")
+        for statement in statements:
+            cursor.execute(statement)
+    return statements
+
+
+# slow queries
+
+class SlowQueryMiddleware:
+
+    def __init__(self, get_response):
+        self.threshold = get_setting('SLOW_QUERY', None)
+        if not get_setting('RECORD_SLOW', False) or self.threshold is None:
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+        self.directory = get_setting('DIR', os.path.join(settings.BASE_DIR, 'cache', 'dbhealth'))
+        self.max_bytes = get_setting('MAX_LOG_BYTES', 5 * 2 ** 20)
+        os.makedirs(self.directory, exist_ok=True)
+
+    def __call__(self, request):
+        slow = []
+
+        def timed(execute, sql, params, many, context):
+            began = time.perf_counter()
+            try:
+                return execute(sql, params, many, context)
+            finally:
+                seconds = time.perf_counter() - began
+                if seconds >= self.threshold and not many:
+                    slow.append((sql, params, seconds))
+
+        with connection.execute_wrapper(timed):
+            response = self.get_response(request)
+        if slow:
+            self.write(request, slow)
+        return response
+
+    def write(self, request, slow):
+        match = getattr(request, 'resolver_match', None)
+        view = (match.url_name or match.view_name) if match else 'unresolved'
+        lines = ''.join(
+            json.dumps({'view': view, 'sql': sql, 'types': [type(param).__name__ for param in params or ()], 'seconds': round(seconds, 4)}) + '\n'
+            for sql, params, seconds in slow
+        )
+        path = os.path.join(self.directory, f"slow.{os.getpid()}.jsonl")
+        try:
+            if os.path.getsize(path) > self.max_bytes:
+                os.replace(path, os.path.join(self.directory, f"slow.{os.getpid()}.1.jsonl"))
+        except FileNotFoundError:
+            pass
+        with open(path, 'a') as file:
+            file.write(lines)
+
+
+def slow_queries(directory=None):
+    directory = directory or get_setting('DIR', os.path.join(settings.BASE_DIR, 'cache', 'dbhealth'))
+    for path in sorted(glob.glob(os.path.join(directory, SLOW_LOG))):
+        with open(path) as file:
+            for line in file:
+                try:
+                    yield json.loads(line)
+                except ValueError:
+                    continue                    # a line cut short by a worker being killed
+
+
+def clear_slow_queries(directory=None):
+    directory = directory or get_setting('DIR', os.path.join(settings.BASE_DIR, 'cache', 'dbhealth'))
+    for path in glob.glob(os.path.join(directory, SLOW_LOG)):
+        os.remove(path)
+
+
+# (table, problem) pairs of a query's plan
+def _plan_problems(sql, params):
+    with connection.cursor() as cursor:
+        if connection.vendor == 'sqlite':
+            cursor.execute('EXPLAIN QUERY PLAN ' + sql, params)
+            problems = []
+            for row in cursor.fetchall():
+                detail = row[-1]
+                scan = re.match(r'SCAN (?:TABLE )?(\w+)(.*)', detail)
+                if scan and 'USING' not in scan.group(2):
+                    problems.append((scan.group(1), 'full scan'))
+                elif 'USE TEMP B-TREE FOR ORDER BY' in detail:
+                    problems.append((None, 'sort'))
+            return problems
+        if connection.vendor == 'postgresql':
+            cursor.execute('EXPLAIN (FORMAT JSON) ' + sql, params)
+            plan = cursor.fetchone()[0]
+            problems, nodes = [], [plan[0]['Plan']]
+            while nodes:
+                node = nodes.pop()
+                nodes.extend(node.get('Plans', ()))
+                if node['Node Type'] == 'Seq Scan' and 'Filter' in node:
+                    problems.append((node['Relation Name'], 'full scan'))
+                elif node['Node Type'] == 'Sort':
+                    problems.append((None, 'sort'))
+            return problems
+    return []
+
+
+# the columns of `table` the query compares or sorts on that no index of the table starts with
+def _unindexed_columns(sql, table, leading):
+    where = re.split(r'\bWHERE\b', sql, maxsplit=1)
+    if len(where) < 2:
+        return []
+    quoted = re.escape(connection.ops.quote_name(table))
+    columns = re.findall(quoted + r'\.(?:"(\w+)"|(\w+))\s*(?:=|<|>|!=|IN\b|LIKE\b|IS\b|BETWEEN\b|ASC\b|DESC\b|,|$)', where[1])
+    found = []
+    for column in chain.from_iterable(columns):
+        if column and column not in leading and column not in found:
+            found.append(column)
+    return found
+
+
+def index_hints(directory=None):
+    """
+    The recorded slow queries whose plans scan or sort a table of at least
+    MIN_ROWS rows, grouped by table, problem and statement, most time first.
+    """
+    min_rows = get_setting('MIN_ROWS', 1000)
+    rows = {model._meta.db_table: model._base_manager.count() for model in _models()}
+    statements = {}
+    for query in slow_queries(directory):
+        entry = statements.setdefault(query['sql'], {'types': query.get('types', []), 'views': Counter(), 'count': 0, 'seconds': 0.0})
+        entry['views'][query['view']] += 1
+        entry['count'] += 1
+        entry['seconds'] += query['seconds']
+
+    with connection.cursor() as cursor:
+        constraints = {table: connection.introspection.get_constraints(cursor, table) for table in rows}
+    leading = {
+        table: {constraint['columns'][0] for constraint in found.values() if constraint['index'] and constraint['columns']}
+        for table, found in constraints.items()
+    }
+
+    hints = []
+    for sql, entry in statements.items():
+        try:
+            problems = _plan_problems(sql, [STAND_INS.get(name, 'x') for name in entry['types']])
+        except Exception:
+            # a statement that no longer fits the schema, e.g. after a migration
+            continue
+        for table, problem in set(problems):
+            if table is None:
+                table = next((name for name in rows if connection.ops.quote_name(name) in sql), None)
+            if table is None or rows.get(table, 0) < min_rows:
+                continue
+            columns = _unindexed_columns(sql, table, leading.get(table, set()))
+            if problem == 'full scan' and not columns:
+                continue                        # an unfiltered read of the table, an index would not help
+            hints.append(IndexHint(table, problem, columns, sorted(entry['views']), entry['count'], entry['seconds'], sql))
+    return sorted(hints, key=lambda hint: -hint.seconds)
+
+
+# integrity checks
+
+INTEGRITY_CHECKS = [
+    ('purchase items without their bill', PurchaseItem, lambda: ~Exists(PurchaseBill.objects.filter(pk=OuterRef('billno_id')))),
+    ('purchase items without their stock', PurchaseItem, lambda: ~Exists(Stock.objects.filter(pk=OuterRef('stock_id')))),
+    ('sale items without their bill', SaleItem, lambda: ~Exists(SaleBill.objects.filter(pk=OuterRef('billno_id')))),
+    ('sale items without their stock', SaleItem, lambda: ~Exists(Stock.objects.filter(pk=OuterRef('stock_id')))),
+    ('stocks with a negative quantity', Stock, lambda: Q(quantity__lt=0)),
+    ('cost layers with more remaining than received', CostLayer, lambda: Q(remaining__gt=F('quantity')) | Q(remaining__lt=0)),
+]
+
+
+def check(batch_size=None, progress=None, sample=10):
+    batch_size = batch_size or get_setting('BATCH_SIZE', 1000)
+    pause = get_setting('PAUSE', 0.05)
+    results = []
+    for name, model, condition in INTEGRITY_CHECKS:
+        count, found, after = 0, [], 0
+        while True:
+            # the range of the next batch_size rows by pk, then one short read of it, no transaction held between them
+            ranged = model._base_manager.filter(pk__gt=after)
+            end = ranged.order_by('pk').values_list('pk', flat=True)[batch_size - 1:batch_size].first()
+            batch = ranged if end is None else ranged.filter(pk__lte=end)
+            pks = list(batch.filter(condition()).values_list('pk', flat=True))
+            count += len(pks)
+            found.extend(pks[:sample - len(found)])
+            if end is None:
+                break
+            after = end
+            if pause:
+                time.sleep(pause)
+        results.append(CheckResult(name, count, found))
+        if progress:
+            progress(len(results), len(INTEGRITY_CHECKS))
+    return results
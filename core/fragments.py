@@ -0,0 +1,55 @@
+"""
+Version counters for cached template fragments.
+
+A FragmentVersion is a token per model, kept in Django's cache framework
+without an expiry and replaced by a new random one once a save or delete of a
+row of the model commits (optionally only when
+one of the given fields was saved). Templates put it in the key of a
+{% cache %} fragment, see homepage/templatetags/fragments.py, so every fragment
+built from that model is rebuilt after a change, in every worker.
+"""
+
+import uuid
+
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models.signals import post_save, post_delete
+
+_registry = {}
+
+
+class FragmentVersion:
+
+    def __init__(self, model, fields=None):
+        self.model = model
+        self.fields = frozenset(fields) if fields else None
+        self.key = 'fragment-version:%s' % model._meta.label_lower
+        _registry[model._meta.label] = self
+
+        post_save.connect(self._changed, sender=model, weak=False)
+        post_delete.connect(self._changed, sender=model, weak=False)
+
+    def get(self):
+        version = cache.get(self.key)
+        if version is None:
+            # random rather than a counter, so a cleared cache never hands out a version that was already used
+            cache.add(self.key, uuid.uuid4().hex, None)
+            version = cache.get(self.key, '')
+        return version
+
+    # not cache.incr(): it re-sets the key with the default timeout, and concurrent bumps can be lost
+    def bump(self):
+        version = uuid.uuid4().hex
+        cache.set(self.key, version, None)
+        return version
+
+    def _changed(self, sender, instance, update_fields=None, **kwargs):
+        if self.fields is None or update_fields is None or self.fields & set(update_fields):
+            transaction.on_commit(self.bump)
+
+
+def get_version(label):
+    try:
+        return _registry[label].get()
+    except KeyError:
+        raise LookupError("No FragmentVersion is registered for %s" % label)
@@ -0,0 +1,162 @@
+"""
+Small read-through LRU cache for hot model lookups.
+
+Rows are cached per process, keyed by primary key and by a natural key. Each
+cache is bounded by size and TTL, and is invalidated through post_save /
+post_delete. Other workers notice a change through a version token kept in
+Django's cache framework, so CACHES must point at a shared backend (memcached,
+redis, database) for cross-worker invalidation to work. The token is a new
+random value on every change, written once the change is committed and without
+an expiry: a counter bumped with cache.incr() expires (incr re-sets it with the
+default timeout), restarts at a value workers already hold and loses
+concurrent bumps. Reading the token is a round trip to that backend (a file
+read with the FileBasedCache), so a worker reads it at most once every
+VERSION_CHECK seconds: its own changes clear it at once, those of other
+workers show up at most that late.
+"""
+
+import threading
+import time
+import uuid
+from collections import OrderedDict
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models.signals import post_save, post_delete
+from django.http import Http404
+
+
+class ModelLRUCache:
+
+    def __init__(self, model, natural_key, maxsize=None, ttl=None):
+        options = getattr(settings, 'MODEL_LRU_CACHE', {})
+        self.model = model
+        self.natural_key = tuple(natural_key)
+        self.maxsize = maxsize or options.get('MAXSIZE', 1024)
+        self.ttl = ttl or options.get('TTL', 300)
+        self.version_check = options.get('VERSION_CHECK', 1)
+        self.version_key = 'lrucache-version:%s' % model._meta.label_lower
+        self.fields = [f.attname for f in model._meta.concrete_fields]
+        self.pk_index = self.fields.index(model._meta.pk.attname)
+
+        self._entries = OrderedDict()                   # ('pk', value) or ('nk', values) -> (expires, row)
+        self._lock = threading.Lock()
+        self._version = None
+        self._version_checked = None                    # time.monotonic() of the last read of the version token
+        self.hits = self.misses = self.evictions = self.invalidations = 0
+
+        post_save.connect(self._invalidate, sender=model, weak=False)
+        post_delete.connect(self._invalidate, sender=model, weak=False)
+
+    # public lookups
+
+    def get(self, pk):
+        return self._lookup(('pk', int(pk)), {'pk': pk})
+
+    def get_by_key(self, *values):
+        values = tuple(values)
+        return self._lookup(('nk', values), dict(zip(self.natural_key, values)))
+
+    def get_or_404(self, pk=None, **natural):
+        try:
+            if pk is not None:
+                return self.get(pk)
+            return self.get_by_key(*[natural[field] for field in self.natural_key])
+        except (self.model.DoesNotExist, ValueError):
+            raise Http404("No %s matches the given query." % self.model._meta.object_name)
+
+    def stats(self):
+        lookups = self.hits + self.misses
+        return {
+            'model': self.model._meta.label,
+            'size': len(self._entries),
+            'maxsize': self.maxsize,
+            'ttl': self.ttl,
+            'hits': self.hits,
+            'misses': self.misses,
+            'evictions': self.evictions,
+            'invalidations': self.invalidations,
+            'hit_rate': round(self.hits / lookups, 4) if lookups else 0.0,
+        }
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    # for bulk writes (bulk_update, queryset.update) that bypass the save signals
+    def invalidate_all(self):
+        self.clear()
+        transaction.on_commit(self.clear)
+        transaction.on_commit(self._bump_version)
+
+    # internals
+
+    def _lookup(self, key, filters):
+        now = time.monotonic()
+        self._check_version(now)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[0] > now:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return self._build(entry[1])
+            self.misses += 1
+
+        obj = self.model._default_manager.get(**filters)
+        self._store(obj, now)
+        return obj
+
+    def _store(self, obj, now):
+        # store raw column values so every caller gets its own fresh instance
+        row = tuple(getattr(obj, field) for field in self.fields)
+        entry = (now + self.ttl, row)
+        with self._lock:
+            for key in self._keys_for(obj):
+                self._entries[key] = entry
+                self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def _build(self, row):
+        return self.model.from_db('default', self.fields, row)
+
+    def _keys_for(self, obj):
+        return (
+            ('pk', obj.pk),
+            ('nk', tuple(getattr(obj, field) for field in self.natural_key)),
+        )
+
+    def _check_version(self, now):
+        if self._version_checked is not None and now - self._version_checked < self.version_check:
+            return
+        self._version_checked = now
+        version = cache.get(self.version_key, 0)
+        if version != self._version:
+            self.clear()
+            self._version = version
+
+    def _invalidate(self, sender, instance, **kwargs):
+        pk = instance.pk
+        self._forget(pk)
+        self.invalidations += 1
+
+        # other threads may cache the old row again until the change commits, so it is forgotten again then,
+        # and the other workers are told only then, so none of them re-reads the old row for the TTL
+        def committed():
+            self._forget(pk)
+            self._bump_version()
+        transaction.on_commit(committed)
+
+    def _forget(self, pk):
+        with self._lock:
+            # the natural key may have changed, so drop whatever the old row was cached under
+            stale = [key for key, entry in self._entries.items() if entry[1][self.pk_index] == pk]
+            for key in stale:
+                del self._entries[key]
+
+    def _bump_version(self):
+        version = uuid.uuid4().hex
+        cache.set(self.version_key, version, None)
+        self._version = version
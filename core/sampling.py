@@ -0,0 +1,143 @@
+"""
+Sampling profiler for requests in production.
+
+SamplingProfilerMiddleware (opt-in, settings.PROFILING) profiles a random
+RATE of the requests from their start, and every other request once it has
+run for longer than SLOW_THRESHOLD seconds, so a slow request shows where its
+slow part went. One sampler thread per process looks at the stacks of the
+profiled requests' threads every INTERVAL seconds (sys._current_frames(), the
+requests themselves run untouched) and counts each stack, from the middleware
+down to the running function.
+
+A profiled request appends its stacks, in the collapsed format of
+flamegraph.pl and speedscope ("frame;frame;frame count" per line, root
+first), to <DIR>/<url name>.<pid>.collapsed. 'manage.py profile_report'
+merges the files into a hot path report.
+"""
+
+import os
+import random
+import re
+import sys
+import threading
+import time
+from collections import Counter
+
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+
+COLLAPSED = '.collapsed'
+
+
+def get_setting(name, default):
+    return getattr(settings, 'PROFILING', {}).get(name, default)
+
+
+def frame_name(code, module):
+    return f"{module}:{getattr(code, 'co_qualname', code.co_name)}"
+
+
+class Recording:
+
+    def __init__(self, root, start_after=0.0):
+        self.thread_id = threading.get_ident()
+        self.root = root                            # the frame sampling stops at, the middleware's
+        self.start_at = time.perf_counter() + start_after
+        self.stacks = Counter()
+
+    def add(self, frame):
+        names = []
+        while frame is not None and frame is not self.root:
+            names.append(frame_name(frame.f_code, frame.f_globals.get('__name__', '?')))
+            frame = frame.f_back
+        if frame is self.root:
+            self.stacks[';'.join(reversed(names))] += 1
+
+
+class Sampler:
+
+    def __init__(self, interval):
+        self.interval = interval
+        self._recordings = {}
+        self._lock = threading.Lock()
+        self._wake = threading.Event()
+        self._deadline = None                       # when the thread wakes up next, None while idle
+        self._thread = None
+
+    def start(self, recording):
+        with self._lock:
+            self._recordings[recording.thread_id] = recording
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name='sampling-profiler', daemon=True)
+                self._thread.start()
+            if self._deadline is None or recording.start_at < self._deadline:
+                self._wake.set()
+
+    def stop(self, recording):
+        with self._lock:
+            self._recordings.pop(recording.thread_id, None)
+
+    def _run(self):
+        while True:
+            now = time.perf_counter()
+            with self._lock:
+                recordings = list(self._recordings.values())
+                due = [recording for recording in recordings if recording.start_at <= now]
+                if due:
+                    timeout = self.interval
+                elif recordings:
+                    # requests waiting to pass the slow threshold cost nothing until they do
+                    timeout = max(self.interval, min(recording.start_at for recording in recordings) - now)
+                else:
+                    timeout = None
+                self._deadline = None if timeout is None else now + timeout
+                self._wake.clear()
+                # under the lock, so a request never writes out a recording still being added to
+                if due:
+                    frames = sys._current_frames()
+                    for recording in due:
+                        frame = frames.get(recording.thread_id)
+                        if frame is not None:
+                            recording.add(frame)
+                    del frames
+            self._wake.wait(timeout)
+
+
+class SamplingProfilerMiddleware:
+
+    def __init__(self, get_response):
+        if not get_setting('ENABLED', False):
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+        self.rate = get_setting('RATE', 0.01)
+        self.slow_threshold = get_setting('SLOW_THRESHOLD', None)
+        self.directory = get_setting('DIR', os.path.join(settings.BASE_DIR, 'cache', 'profiles'))
+        self.sampler = Sampler(get_setting('INTERVAL', 0.005))
+        self._write_lock = threading.Lock()
+        os.makedirs(self.directory, exist_ok=True)
+
+    def __call__(self, request):
+        if random.random() < self.rate:
+            start_after = 0.0
+        elif self.slow_threshold is not None:
+            start_after = self.slow_threshold
+        else:
+            return self.get_response(request)
+
+        recording = Recording(sys._getframe(), start_after)
+        self.sampler.start(recording)
+        try:
+            return self.get_response(request)
+        finally:
+            self.sampler.stop(recording)
+            if recording.stacks:
+                self.write(request, recording.stacks)
+
+    def write(self, request, stacks):
+        match = getattr(request, 'resolver_match', None)
+        name = (match.url_name or match.view_name) if match else 'unresolved'
+        root = re.sub(r'[^\w.-]', '_', name or 'unnamed')
+        path = os.path.join(self.directory, f"{root}.{os.getpid()}{COLLAPSED}")
+        lines = ''.join(f"{root};{stack} {count}\n" if stack else f"{root} {count}\n" for stack, count in stacks.items())
+        with self._write_lock, open(path, 'a') as file:
+            file.write(lines)
@@ -0,0 +1,7 @@
+"""
+Settings profiles: core.settings.dev (manage.py's default) and core.settings.prod
+(the default of core.wsgi and core.asgi). Both extend core.settings.base.
+"""
+
+# DJANGO_SETTINGS_MODULE=core.settings still works and means the dev profile
+from .dev import *
@@ -0,0 +1,292 @@
+"""
+Django settings for core project, shared by the dev and prod profiles.
+
+Generated by 'django-admin startproject' using Django 3.0.
+
+For more information on this file, see
+https://docs.djangoproject.com/en/3.0/topics/settings/
+
+For the full list of settings and their values, see
+https://docs.djangoproject.com/en/3.0/ref/settings/
+"""
+
+import os
+
+# Build paths inside the project like this: os.path.join(BASE_DIR, ...)
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+# See https://docs.djangoproject.com/en/3.0/howto/deployment/checklist/
+# DEBUG, ALLOWED_HOSTS and the template loaders are set per profile (core/settings/dev.py and prod.py)
+
+# SECURITY WARNING: keep the secret key used in production secret!
+SECRET_KEY = 'qyu(9l9v%^+r(vt#ecf+36#lis516#3bo5@bo-rd*d%a=!%8#!'
+
+
+# Application definition
+
+INSTALLED_APPS = [
+    'django.contrib.admin',
+    'django.contrib.auth',
+    'django.contrib.contenttypes',
+    'django.contrib.sessions',
+    'django.contrib.messages',
+    'django.contrib.staticfiles',
+
+    'widget_tweaks',                            # uses 'django-widget-tweaks' app
+    'crispy_forms',                             # uses 'django-crispy-forms' app
+    'login_required',                           # uses 'django-login-required-middleware' app
+
+    'homepage.apps.HomepageConfig',
+    'inventory.apps.InventoryConfig',
+    'transactions.apps.TransactionsConfig',
+    'jobs.apps.JobsConfig',
+    'audit.apps.AuditConfig',
+
+]
+
+MIDDLEWARE = [
+    'core.sampling.SamplingProfilerMiddleware',             # samples requests' stacks when PROFILING['ENABLED'] (core/sampling.py)
+    'core.dbhealth.SlowQueryMiddleware',                    # records slow queries when DBHEALTH['RECORD_SLOW'] (core/dbhealth.py)
+    'django.middleware.security.SecurityMiddleware',
+    "whitenoise.middleware.WhiteNoiseMiddleware",
+    'django.contrib.sessions.middleware.SessionMiddleware',
+    'django.middleware.common.CommonMiddleware',
+    'django.middleware.csrf.CsrfViewMiddleware',
+    'django.contrib.auth.middleware.AuthenticationMiddleware',
+    'audit.middleware.AuditMiddleware',                     # writes the request's audit entries in one insert (audit/log.py)
+    'django.contrib.messages.middleware.MessageMiddleware',
+    'django.middleware.clickjacking.XFrameOptionsMiddleware',
+
+    'login_required.middleware.LoginRequiredMiddleware',    # middleware used for global login
+]
+
+ROOT_URLCONF = 'core.urls'
+
+TEMPLATES = [
+    {
+        'BACKEND': 'django.template.backends.django.DjangoTemplates',
+        'DIRS': [os.path.join(BASE_DIR, 'templates')],  # included 'templates' directory for django to access the html templates
+        'APP_DIRS': True,
+        'OPTIONS': {
+            'context_processors': [
+                'django.template.context_processors.request',
+                'django.contrib.auth.context_processors.auth',
+                'django.contrib.messages.context_processors.messages',
+            ],
+        },
+    },
+]
+
+WSGI_APPLICATION = 'core.wsgi.application'
+
+
+# Database
+# https://docs.djangoproject.com/en/3.0/ref/settings/#databases
+
+DATABASES = {
+    'default': {
+        'ENGINE': 'django.db.backends.sqlite3',
+        'NAME': os.path.join(BASE_DIR, 'db.sqlite3'),
+    }
+}
+
+
+# Cache
+# https://docs.djangoproject.com/en/3.0/topics/cache/
+# file based so that every gunicorn worker on the host shares the lookup cache version keys
+
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+        'LOCATION': os.path.join(BASE_DIR, 'cache'),
+    },
+    # rendered {% cache %} fragments, kept per worker: their keys carry versions that live in the
+    # shared 'default' cache (core/fragments.py), so a change reaches every worker without a shared store
+    'template_fragments': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'template-fragments',
+        'OPTIONS': {'MAX_ENTRIES': 5000},
+    },
+}
+
+MODEL_LRU_CACHE = {                                     # in-process Stock / Supplier lookup cache (core/lrucache.py)
+    'MAXSIZE': 1024,                                    # max cached keys per model (pk and natural key count separately)
+    'TTL': 300,                                         # seconds before a cached row is re-read from the database
+    'VERSION_CHECK': 1,                                 # seconds between reads of the shared version token, i.e. how late
+                                                        # a worker sees the changes made by the others
+}
+
+
+INVENTORY_VALUATION_METHOD = 'fifo'                   # 'fifo' or 'average', how sales are costed (inventory/valuation.py)
+
+JOBS = {                                                # background jobs run by 'manage.py runjobs' (jobs app)
+    'QUEUES': {                                         # queue name -> max jobs running at once across all workers
+        'default': 2,
+        'heavy': 1,
+    },
+    'POLL_INTERVAL': 1,                                 # seconds an idle worker waits before looking for jobs again
+    'STALE_AFTER': 600,                                 # seconds without progress before a running job is requeued
+    'SCHEDULE': {                                       # task name -> seconds between runs, queued by the workers
+        'db_maintenance': 24 * 3600,
+    },
+}
+
+BILL_ARCHIVE = {                                        # old bills moved out of the current tables (transactions/archive.py)
+    'KEEP_YEARS': 2,                                    # calendar years kept current, the running one included
+    'BATCH_SIZE': 500,                                  # bills moved per transaction by 'manage.py archive_bills'
+}
+
+STOCK_FEED = {                                          # stock quantities pushed to open pages (inventory/feed.py)
+    'PATH': '/inventory/feed',                          # served by the ASGI application (core/asgi.py)
+    'POLL': 1.0,                                        # seconds between reads of new changes, one reader per ASGI process
+    'KEEPALIVE': 15,                                    # seconds of silence before a keepalive comment is sent
+    'BUFFER': 1000,                                     # recent changes kept in memory for reconnecting pages
+    'MAX_PENDING': 500,                                 # stocks a page may fall behind on before it is told to reload
+    'KEEP_ROWS': 10000,                                 # changes kept in the table
+}
+
+SYNC = {                                                # delta sync of the stock and supplier catalogs (core/sync.py)
+    'PAGE_SIZE': 500,                                   # rows per response at most
+    'SETTLE': 5,                                        # seconds of recent changes sent again, for transactions committing late
+}
+
+SALES_INGEST = {                                        # batches of sales posted by POS terminals (transactions/ingest.py)
+    'MAX_BATCH': 500,                                   # sales accepted in one request
+    'TOKENS': dict(                                     # 'Authorization: Bearer <token>' of a terminal -> the user its sales are audited as
+        pair.split('=', 1) for pair in os.environ.get('DJANGO_POS_TOKENS', '').split(',') if '=' in pair
+    ),
+}
+
+# Sessions and the logged in user are read on every request, neither should cost a query
+# 'cached_db' reads sessions from the 'default' cache and falls back to the database; 'signed_cookies'
+# keeps them in the cookie itself (no server side state, but a logout cannot revoke a copied cookie)
+SESSION_ENGINE = os.environ.get('DJANGO_SESSION_ENGINE', 'django.contrib.sessions.backends.cached_db')
+
+AUTHENTICATION_BACKENDS = ['homepage.auth.CachedModelBackend']
+
+AUTH_USER_CACHE = {                                     # logged in users read by CachedModelBackend (homepage/auth.py)
+    'MAXSIZE': 256,                                     # max cached keys (pk and username count separately)
+    'TTL': 60,                                          # seconds before a cached user is re-read, 0 turns the cache off
+}
+
+AUDIT = {                                               # change history of stocks, suppliers and bills (audit/log.py)
+    'MAX_BUFFER': 1000,                                 # entries a request or job holds before the overflow policy applies
+    'OVERFLOW': 'flush',                                # 'flush' writes the buffer early, 'drop' discards further entries
+}
+
+PROFILING = {                                           # sampling profiler for live requests (core/sampling.py)
+    'ENABLED': os.environ.get('DJANGO_PROFILING') == '1',   # opt in, the middleware removes itself otherwise
+    'RATE': 0.01,                                       # fraction of requests profiled from their start
+    'SLOW_THRESHOLD': 1.0,                              # seconds after which any request is profiled, None for RATE only
+    'INTERVAL': 0.005,                                  # seconds between two samples of a request's stack
+    'DIR': os.path.join(BASE_DIR, 'cache', 'profiles'), # collapsed stack files, read by 'manage.py profile_report'
+}
+
+DBHEALTH = {                                            # database maintenance and checks, 'manage.py dbhealth' (core/dbhealth.py)
+    'RECORD_SLOW': os.environ.get('DJANGO_SLOW_QUERIES') == '1',    # opt in, the middleware removes itself otherwise
+    'SLOW_QUERY': 0.2,                                  # seconds a query of a request may take before it is recorded
+    'DIR': os.path.join(BASE_DIR, 'cache', 'dbhealth'), # the recorded slow queries, with parameter types but not values
+    'MAX_LOG_BYTES': 5 * 2 ** 20,                       # size at which a worker's log is rotated, one old log is kept
+    'MIN_ROWS': 1000,                                   # tables smaller than this are not worth an index hint
+    'ANALYSIS_LIMIT': 1000,                             # rows of each index ANALYZE looks at on SQLite, 0 for all
+    'VACUUM_FREE_RATIO': 0.2,                           # share of free pages (SQLite) or dead rows (PostgreSQL) that calls for a VACUUM
+    'BATCH_SIZE': 1000,                                 # rows read per integrity check query
+    'PAUSE': 0.05,                                      # seconds between two integrity check queries
+}
+
+STARTUP_BUDGET = 1.0                                    # seconds a cold start may take, reported by 'manage.py startup_profile' (homepage/tests.py guards the lazy imports)
+
+TEMPLATE_WARMUP = False                                 # compile every template when a web worker boots (core/warmup.py), on in prod
+
+
+# Password validation
+# https://docs.djangoproject.com/en/3.0/ref/settings/#auth-password-validators
+
+AUTH_PASSWORD_VALIDATORS = [
+    {
+        'NAME': 'django.contrib.auth.password_validation.UserAttributeSimilarityValidator',
+    },
+    {
+        'NAME': 'django.contrib.auth.password_validation.MinimumLengthValidator',
+    },
+    {
+        'NAME': 'django.contrib.auth.password_validation.CommonPasswordValidator',
+    },
+    {
+        'NAME': 'django.contrib.auth.password_validation.NumericPasswordValidator',
+    },
+]
+
+
+# Internationalization
+# https://docs.djangoproject.com/en/3.0/topics/i18n/
+
+LANGUAGE_CODE = 'en-us'
+
+TIME_ZONE = 'UTC'
+
+USE_I18N = True
+
+USE_L10N = True
+
+USE_TZ = True
+
+
+# Static files (CSS, JavaScript, Images)
+# https://docs.djangoproject.com/en/3.0/howto/static-files/
+
+STATIC_URL = '/static/'
+
+CRISPY_TEMPLATE_PACK = 'bootstrap4'                     # bootstrap template crispy-form uses
+
+LOGIN_REDIRECT_URL = 'home'                             # sets the login redirect to the 'home' page after login
+
+LOGIN_URL = 'login'                                     # sets the 'login' page as default when user tries to illegally access profile or other hidden pages
+
+LOGIN_REQUIRED_IGNORE_VIEW_NAMES = [                    # urls ignored by the login_required. Can be accessed with out logging in
+    'login',
+    'logout',
+    'about',
+    'signup',
+    'pos-sales',                                        # POS terminals authenticate with a token, see SALES_INGEST['TOKENS']
+]
+
+
+# from pathlib import Path
+# BASE_DIR = Path(__file__).resolve().parent.parent
+STATICFILES_DIRS = [
+    os.path.join(BASE_DIR, 'homepage', 'static')
+]
+
+STATICFILES_FINDERS = [
+    'django.contrib.staticfiles.finders.FileSystemFinder',
+    'django.contrib.staticfiles.finders.AppDirectoriesFinder',
+    'homepage.bundles.BundleFinder',
+]
+
+STATIC_ROOT = os.path.join(BASE_DIR, 'staticfiles')
+
+# collectstatic writes content hashed copies (served by whitenoise with immutable, far future cache headers)
+# and precompresses them with gzip, and with brotli when the 'Brotli' package is installed.
+# With DEBUG off every {% static %} needs staticfiles/staticfiles.json: the committed staticfiles/ is the
+# release build, regenerate it after changing a static file with
+#   DJANGO_SETTINGS_MODULE=core.settings.prod python manage.py collectstatic --noinput --clear
+STATICFILES_STORAGE = 'whitenoise.storage.CompressedManifestStaticFilesStorage'
+
+# static files every page loads, concatenated and minified by homepage.bundles into one file per type
+STATIC_BUNDLES = {
+    'bundles/app.css': [
+        'bootstrap/bootstrap.min.css',
+        'css/main.css',
+        'css/sidebar.css',
+        'css/dialogbox.css',
+    ],
+    'bundles/app.js': [
+        'bootstrap/jquery-3.3.1.slim.min.js',
+        'bootstrap/popper.min.js',
+        'bootstrap/bootstrap.min.js',
+        'js/dialogbox.js',
+    ],
+}
+STATIC_BUNDLE_ROOT = os.path.join(BASE_DIR, 'cache', 'bundles')
\ No newline at end of file
@@ -0,0 +1,14 @@
+"""
+Development settings: debug pages, and templates re-read from disk when they change.
+"""
+
+from copy import deepcopy
+
+from .base import *
+
+DEBUG = True
+
+ALLOWED_HOSTS = []
+
+TEMPLATES = deepcopy(TEMPLATES)                         # copied, the base module may be shared with the other profile
+TEMPLATES[0]['OPTIONS']['context_processors'].insert(0, 'django.template.context_processors.debug')
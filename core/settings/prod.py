@@ -0,0 +1,30 @@
+"""
+Production settings.
+
+Templates go through the cached loader, so each one is read and compiled once
+per worker instead of on every request, and TEMPLATE_WARMUP compiles all of
+them when the worker boots (core/warmup.py) so the first requests do not pay
+for it either. Debug-only context processors are left out.
+"""
+
+import os
+from copy import deepcopy
+
+from .base import *
+
+DEBUG = False
+
+SECRET_KEY = os.environ.get('DJANGO_SECRET_KEY', SECRET_KEY)
+
+ALLOWED_HOSTS = os.environ.get('DJANGO_ALLOWED_HOSTS', 'localhost,127.0.0.1').split(',')
+
+TEMPLATES = deepcopy(TEMPLATES)                         # copied, the base module may be shared with the other profile
+TEMPLATES[0]['APP_DIRS'] = False                        # the loaders below include the app directories
+TEMPLATES[0]['OPTIONS']['loaders'] = [
+    ('django.template.loaders.cached.Loader', [
+        'django.template.loaders.filesystem.Loader',
+        'django.template.loaders.app_directories.Loader',
+    ]),
+]
+
+TEMPLATE_WARMUP = True
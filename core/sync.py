@@ -0,0 +1,85 @@
+"""
+Delta sync of catalog models (Stock, Supplier) for clients that mirror them.
+
+The synced models carry an indexed updated_at, written by every save and by
+the bulk updates of their synced fields. Soft deletes are saves of is_deleted,
+so they come through like any other change. A client starts without a token
+and pages through the whole catalog, then keeps the `next` token of its last
+page: asking with it returns only the rows changed since, oldest first, in
+pages of at most SYNC['PAGE_SIZE'] rows, each row a list in the order of
+`fields`.
+
+The token is the (updated_at, id) of the last row sent. A transaction can
+commit after a later one was already read, so the token ending a sync is never
+closer than SYNC['SETTLE'] seconds to now; the rows of those seconds are sent
+again next time, which is harmless as clients apply rows by id. Writers stamp
+updated_at just before they write, never once for a run of transactions: a
+stamp older than SETTLE when it commits can fall behind a token already handed
+out.
+"""
+
+from datetime import datetime, timedelta
+
+from django.conf import settings
+from django.db.models import Q
+from django.http import JsonResponse
+from django.utils import timezone
+from django.views.generic import View
+
+EPOCH = datetime(1970, 1, 1, tzinfo=timezone.utc)
+MICROSECOND = timedelta(microseconds=1)
+
+
+def get_setting(name, default):
+    return getattr(settings, 'SYNC', {}).get(name, default)
+
+
+def encode_token(position):
+    updated_at, pk = position
+    return f"{(updated_at - EPOCH) // MICROSECOND}.{pk}"
+
+
+# raises ValueError for anything encode_token did not make
+def decode_token(token):
+    micros, pk = token.split('.')
+    return EPOCH + int(micros) * MICROSECOND, int(pk)
+
+
+def changed(queryset, fields, since=None, limit=None):
+    if since is not None:
+        updated_at, pk = since
+        queryset = queryset.filter(Q(updated_at__gt=updated_at) | Q(updated_at=updated_at, pk__gt=pk))
+    return list(queryset.order_by('updated_at', 'pk').values_list(*fields)[:limit])
+
+
+class SyncView(View):
+    """
+    GET ?since=<token>&limit=<rows> on a model with updated_at; `fields` must
+    start with 'id' and end with 'updated_at'.
+    """
+    model = None
+    fields = ()
+
+    def get(self, request):
+        page_size = get_setting('PAGE_SIZE', 500)
+        try:
+            since = decode_token(request.GET['since']) if request.GET.get('since') else None
+            limit = min(int(request.GET.get('limit', page_size)), page_size)
+        except ValueError:
+            return JsonResponse({'error': "'since' must be a token from an earlier response and 'limit' a number"}, status=400)
+        if limit < 1:
+            return JsonResponse({'error': "'limit' must be at least 1"}, status=400)
+
+        rows = changed(self.model._default_manager.all(), self.fields, since, limit + 1)
+        more = len(rows) > limit
+        rows = rows[:limit]
+        end = (rows[-1][-1], rows[-1][0]) if rows else since
+        if not more:
+            settled = (timezone.now() - timedelta(seconds=get_setting('SETTLE', 5)), 0)
+            end = min(end, settled) if end else settled
+        return JsonResponse({
+            'fields': list(self.fields),
+            'rows': rows,
+            'next': encode_token(end),
+            'more': more,
+        })
@@ -0,0 +1,85 @@
+"""
+Template render profiler.
+
+While a TemplateProfiler is active every template render is timed and the SQL
+queries run during it are counted, per template name. Templates pulled in by
+{% extends %} and {% include %} get their own entries, and so do {% block %}s,
+named after the template that filled them (Django renders a child's blocks
+from inside its parent). "self" excludes the time and queries of what is
+nested in an entry, "total" includes them. Patching is process wide, so it is
+meant for management commands and benchmarks, not for a server handling
+requests in several threads.
+"""
+
+import time
+from contextlib import ExitStack
+
+from django.db import connections
+from django.template.base import Template
+from django.template.loader_tags import BLOCK_CONTEXT_KEY, BlockNode
+
+OUTSIDE = '(outside templates)'
+
+
+class TemplateProfiler:
+
+    def __init__(self):
+        self.stats = {}                     # template name -> {'calls', 'total', 'self', 'queries', 'total_queries'}
+        self._stack = []                    # [name, started, nested time, nested queries, queries]
+        self._exit_stack = None
+
+    def __enter__(self):
+        profiler = self
+        self._original = original = Template._render
+        self._original_block = original_block = BlockNode.render
+
+        def _render(template, context):
+            profiler._stack.append([template.origin.template_name or template.origin.name, time.perf_counter(), 0.0, 0, 0])
+            try:
+                return original(template, context)
+            finally:
+                profiler._pop()
+
+        def render_block(node, context):
+            block_context = context.render_context.get(BLOCK_CONTEXT_KEY)
+            block = (block_context and block_context.get_block(node.name)) or node
+            profiler._stack.append(['%s {%% block %s %%}' % (block.origin.template_name, node.name), time.perf_counter(), 0.0, 0, 0])
+            try:
+                return original_block(node, context)
+            finally:
+                profiler._pop()
+
+        Template._render = _render
+        BlockNode.render = render_block
+        self._exit_stack = ExitStack()
+        for alias in connections:
+            self._exit_stack.enter_context(connections[alias].execute_wrapper(self._count_query))
+        return self
+
+    def __exit__(self, *exc_info):
+        Template._render = self._original
+        BlockNode.render = self._original_block
+        self._exit_stack.close()
+
+    def _count_query(self, execute, sql, params, many, context):
+        if self._stack:
+            self._stack[-1][4] += 1
+        else:
+            self._entry(OUTSIDE)['queries'] += 1
+        return execute(sql, params, many, context)
+
+    def _entry(self, name):
+        return self.stats.setdefault(name, {'calls': 0, 'total': 0.0, 'self': 0.0, 'queries': 0, 'total_queries': 0})
+
+    def _pop(self):
+        name, started, nested, nested_queries, queries = self._stack.pop()
+        elapsed = time.perf_counter() - started
+        entry = self._entry(name)
+        entry['calls'] += 1
+        entry['total'] += elapsed
+        entry['self'] += elapsed - nested
+        entry['queries'] += queries
+        entry['total_queries'] += queries + nested_queries
+        if self._stack:
+            self._stack[-1][2] += elapsed
+            self._stack[-1][3] += queries + nested_queries
@@ -27,4 +27,6 @@ urlpatterns = [
     path('', include('homepage.urls')),
     path('inventory/', include('inventory.urls')),
     path('transactions/', include('transactions.urls')),
+    path('jobs/', include('jobs.urls')),
+    path('audit/', include('audit.urls')),
 ]
\ No newline at end of file
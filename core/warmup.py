@@ -0,0 +1,47 @@
+"""
+Worker boot warmup.
+
+warm_templates() compiles every template the template engines can find, so
+with the cached loader (the prod profile) they are all in memory before the
+first request. core.wsgi and core.asgi call it when settings.TEMPLATE_WARMUP is
+on. Templates that fail to compile are skipped, they raise again when used.
+"""
+
+import logging
+import os
+import time
+
+from django.forms.renderers import get_default_renderer
+from django.template import TemplateDoesNotExist, TemplateSyntaxError, engines
+
+logger = logging.getLogger(__name__)
+
+
+def template_names(engine):
+    names = set()
+    for loader in engine.template_loaders:
+        for inner in getattr(loader, 'loaders', [loader]):
+            for directory in inner.get_dirs():
+                for root, _, files in os.walk(directory):
+                    for name in files:
+                        names.add(os.path.relpath(os.path.join(root, name), directory).replace(os.sep, '/'))
+    return sorted(names)
+
+
+def warm_templates():
+    started = time.perf_counter()
+    compiled = failed = 0
+    # the project's engines plus the one forms render their widgets with
+    template_engines = [backend.engine for backend in engines.all()]
+    renderer = get_default_renderer()
+    if hasattr(renderer, 'engine'):
+        template_engines.append(renderer.engine.engine)
+    for engine in template_engines:
+        for name in template_names(engine):
+            try:
+                engine.get_template(name)
+                compiled += 1
+            except (TemplateDoesNotExist, TemplateSyntaxError, UnicodeDecodeError):
+                failed += 1
+    logger.info("Compiled %d templates in %.2f s (%d skipped)", compiled, time.perf_counter() - started, failed)
+    return compiled
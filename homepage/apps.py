@@ -3,3 +3,7 @@ from django.apps import AppConfig
 
 class HomepageConfig(AppConfig):
     name = 'homepage'
+
+    def ready(self):
+        # connects the user cache invalidation in every process, not only in those that logged someone in
+        from . import auth  # noqa: F401
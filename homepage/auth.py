@@ -0,0 +1,33 @@
+"""
+Authentication backend reading the logged in user through an LRU cache.
+
+AuthenticationMiddleware loads request.user from the session on every request.
+CachedModelBackend answers that lookup from core/lrucache.py instead of the
+auth_user table. Entries expire after settings.AUTH_USER_CACHE['TTL'] seconds
+and are dropped in every worker as soon as a user is saved or deleted
+(password change, deactivation, permission flags), so a change is never
+served stale for long. A TTL of 0 turns the cache off.
+"""
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.contrib.auth.backends import ModelBackend
+
+from core.lrucache import ModelLRUCache
+
+UserModel = get_user_model()
+
+USER_CACHE = getattr(settings, 'AUTH_USER_CACHE', {})
+user_cache = ModelLRUCache(UserModel, natural_key=(UserModel.USERNAME_FIELD,), maxsize=USER_CACHE.get('MAXSIZE'), ttl=USER_CACHE.get('TTL', 60))
+
+
+class CachedModelBackend(ModelBackend):
+
+    def get_user(self, user_id):
+        if not USER_CACHE.get('TTL', 60):
+            return super().get_user(user_id)
+        try:
+            user = user_cache.get(user_id)
+        except (UserModel.DoesNotExist, ValueError, TypeError):
+            return None
+        return user if self.user_can_authenticate(user) else None
@@ -0,0 +1,68 @@
+import time
+
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections
+from django.test import Client
+from django.test.utils import override_settings
+from django.urls import reverse
+
+# (name, SESSION_ENGINE, authentication backend)
+MODES = [
+    ('db sessions', 'django.contrib.sessions.backends.db', 'django.contrib.auth.backends.ModelBackend'),
+    ('cached_db sessions', 'django.contrib.sessions.backends.cached_db', 'django.contrib.auth.backends.ModelBackend'),
+    ('cached_db sessions + user cache', 'django.contrib.sessions.backends.cached_db', 'homepage.auth.CachedModelBackend'),
+    ('signed cookies + user cache', 'django.contrib.sessions.backends.signed_cookies', 'homepage.auth.CachedModelBackend'),
+]
+
+
+class QueryCounter:
+    def __init__(self):
+        self.session = self.user = self.other = 0
+
+    def __call__(self, execute, sql, params, many, context):
+        if '"django_session"' in sql:
+            self.session += 1
+        elif '"auth_user"' in sql:
+            self.user += 1
+        else:
+            self.other += 1
+        return execute(sql, params, many, context)
+
+
+class Command(BaseCommand):
+    help = "Measures the per request cost of sessions and of loading the logged in user, per session engine and auth backend"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--path', help="page to request, the dashboard by default")
+        parser.add_argument('--repeat', type=int, default=200, help="measured requests per mode, after one warm up request")
+        parser.add_argument('--user', help="user to log in as, the first user that is not a superuser by default")
+
+    def handle(self, *args, **options):
+        users = User.objects.filter(username=options['user']) if options['user'] else User.objects.filter(is_active=True).order_by('is_superuser', 'pk')
+        user = users.first()
+        if user is None:
+            raise CommandError("No user to log in as, create one first")
+        path = options['path'] or reverse('home')
+        repeat = max(options['repeat'], 1)
+
+        self.stdout.write(f"GET {path} as {user.username}, {repeat} requests per mode")
+        self.stdout.write(f"  {'mode':<34} {'ms/request':>10} {'session q':>10} {'user q':>7} {'other q':>8}")
+        for name, engine, backend in MODES:
+            with override_settings(SESSION_ENGINE=engine, AUTHENTICATION_BACKENDS=[backend], ALLOWED_HOSTS=list(settings.ALLOWED_HOSTS) + ['testserver']):
+                # a new client per mode, its handler builds SessionMiddleware with the engine in effect
+                client = Client()
+                client.force_login(user, backend=backend)
+                if client.get(path).status_code != 200:
+                    raise CommandError(f"GET {path} did not answer 200")
+                counter = QueryCounter()
+                with connections['default'].execute_wrapper(counter):
+                    started = time.perf_counter()
+                    for _ in range(repeat):
+                        client.get(path)
+                    elapsed = time.perf_counter() - started
+            self.stdout.write(
+                f"  {name:<34} {elapsed * 1000 / repeat:>10.2f} {counter.session / repeat:>10g} "
+                f"{counter.user / repeat:>7g} {counter.other / repeat:>8g}"
+            )
@@ -0,0 +1,74 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from core import dbhealth
+
+SIZES = 'sizes'
+INDEXES = 'indexes'
+CHECK = 'check'
+MAINTAIN = 'maintain'
+
+
+def megabytes(value):
+    return '-' if value is None else f"{value / 2 ** 20:.2f}"
+
+
+class Command(BaseCommand):
+    help = ("Reports table sizes, index hints from the recorded slow queries and integrity problems; "
+            "'maintain' analyzes and vacuums (also queued daily as the 'db_maintenance' job, see JOBS['SCHEDULE']).")
+
+    def add_arguments(self, parser):
+        parser.add_argument('sections', nargs='*', choices=[SIZES, INDEXES, CHECK, MAINTAIN], help=f"what to run (default: {SIZES} {INDEXES} {CHECK})")
+        vacuum = parser.add_mutually_exclusive_group()
+        vacuum.add_argument('--vacuum', action='store_true', dest='vacuum', default=None, help="with 'maintain', vacuum even when little space is free")
+        vacuum.add_argument('--no-vacuum', action='store_false', dest='vacuum', help="with 'maintain', only analyze")
+        parser.add_argument('--batch-size', type=int, help="rows per integrity check query (default: DBHEALTH['BATCH_SIZE'])")
+        parser.add_argument('--clear-slow', action='store_true', help='deletes the recorded slow queries once the index hints are made')
+
+    def handle(self, *args, **options):
+        sections = options['sections'] or [SIZES, INDEXES, CHECK]
+        if MAINTAIN in sections:
+            began = time.perf_counter()
+            for statement in dbhealth.maintain(options['vacuum']):
+                self.stdout.write(f"Ran {statement}")
+            self.stdout.write(f"Maintenance took {time.perf_counter() - began:.2f} s\n")
+        if SIZES in sections:
+            self.sizes()
+        if INDEXES in sections:
+            self.indexes(options['clear_slow'])
+        if CHECK in sections:
+            self.check_integrity(options['batch_size'])
+
+    def sizes(self):
+        self.stdout.write(f"{'model':36} {'rows':>10} {'deleted':>8} {'table MB':>9} {'index MB':>9} {'bloat MB':>9}")
+        for size in dbhealth.sizes():
+            deleted = '' if size.deleted is None else size.deleted
+            self.stdout.write(
+                f"{size.model:36} {size.rows:>10} {deleted:>8} {megabytes(size.table_bytes):>9} "
+                f"{megabytes(size.index_bytes):>9} {megabytes(size.bloat_bytes):>9}"
+            )
+        space = dbhealth.free_space()
+        if space:
+            file_bytes, free_bytes = space
+            self.stdout.write(f"Database file: {megabytes(file_bytes)} MB, {megabytes(free_bytes)} MB in free pages (reclaimed by VACUUM)")
+        self.stdout.write("")
+
+    def indexes(self, clear):
+        hints = dbhealth.index_hints()
+        if not hints:
+            self.stdout.write("No recorded slow query scans or sorts a large table\n")
+        for hint in hints:
+            columns = f", unindexed columns: {', '.join(hint.columns)}" if hint.columns else ''
+            self.stdout.write(f"{hint.table}: {hint.problem}{columns}")
+            self.stdout.write(f"  {hint.count} slow runs, {hint.seconds:.2f} s in all, from {', '.join(hint.views)}")
+            self.stdout.write(f"  {hint.sql[:300]}\n")
+        if clear:
+            dbhealth.clear_slow_queries()
+
+    def check_integrity(self, batch_size):
+        for result in dbhealth.check(batch_size):
+            if result.count:
+                self.stdout.write(self.style.ERROR(f"{result.count} {result.name}, e.g. ids {', '.join(map(str, result.sample))}"))
+            else:
+                self.stdout.write(f"No {result.name}")
@@ -0,0 +1,152 @@
+import gzip
+import json
+import os
+import re
+from html.parser import HTMLParser
+
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.contrib.staticfiles import finders
+from django.core.management.base import BaseCommand, CommandError
+from django.test import Client
+from django.test.utils import override_settings
+from django.urls import reverse
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+# the file name pattern ManifestStaticFilesStorage gives hashed copies, these are served as immutable
+HASHED = re.compile(r'\.[0-9a-f]{12}\.\w+$')
+
+
+class AssetParser(HTMLParser):
+    def __init__(self):
+        super().__init__()
+        self.assets = []
+
+    def handle_starttag(self, tag, attrs):
+        attrs = dict(attrs)
+        if tag == 'link' and 'stylesheet' in (attrs.get('rel') or '') and attrs.get('href'):
+            self.assets.append(attrs['href'])
+        elif tag in ('script', 'img') and attrs.get('src'):
+            self.assets.append(attrs['src'])
+
+
+def sizes(content):
+    return {
+        'raw': len(content),
+        'gzip': len(gzip.compress(content, 9)),
+        'br': len(brotli.compress(content)) if brotli else None,
+    }
+
+
+# the file a static url is served from: the collected copy when there is one, else the source
+def static_file(url):
+    name = url[len(settings.STATIC_URL):].split('?')[0]
+    collected = os.path.join(settings.STATIC_ROOT, name) if settings.STATIC_ROOT else None
+    if collected and os.path.isfile(collected):
+        return collected
+    return finders.find(name)
+
+
+def measure(client, path):
+    response = client.get(path)
+    if response.status_code != 200:
+        raise CommandError(f"GET {path} answered {response.status_code}")
+    parser = AssetParser()
+    parser.feed(response.content.decode())
+
+    page = {'html': sizes(response.content), 'assets': {}, 'external': []}
+    for url in parser.assets:
+        if url.startswith(settings.STATIC_URL):
+            found = static_file(url)
+            if not found:
+                raise CommandError(f"{path} links {url}, which is not a static file")
+            with open(found, 'rb') as file:
+                page['assets'][url] = dict(sizes(file.read()), immutable=bool(HASHED.search(url)))
+        else:
+            page['external'].append(url)
+    return page
+
+
+def totals(page):
+    assets = page['assets'].values()
+    total = {
+        'requests': 1 + len(page['assets']) + len(page['external']),
+        'external': len(page['external']),
+        'immutable': sum(asset['immutable'] for asset in assets),
+    }
+    for encoding in ('raw', 'gzip', 'br'):
+        values = [page['html'][encoding]] + [asset[encoding] for asset in assets]
+        total[encoding] = None if None in values else sum(values)
+    return total
+
+
+def kilobytes(value):
+    return '-' if value is None else f"{value / 1024:.1f}"
+
+
+class Command(BaseCommand):
+    help = "Measures page weight (HTML plus linked static files) and request count of rendered pages"
+
+    def add_arguments(self, parser):
+        parser.add_argument('paths', nargs='*', help="pages to measure, the home, new sale and new purchase pages by default")
+        parser.add_argument('--user', help="user to log in as, the first superuser by default")
+        parser.add_argument('--save', metavar='FILE', help="writes the measurements to a JSON file")
+        parser.add_argument('--compare', metavar='FILE', help="shows the change against a file written with --save")
+
+    def default_paths(self):
+        from transactions.models import Supplier
+
+        paths = [reverse('home'), reverse('new-sale')]
+        supplier = Supplier.objects.filter(is_deleted=False).values_list('pk', flat=True).first()
+        if supplier is not None:
+            paths.append(reverse('new-purchase', args=[supplier]))
+        return paths
+
+    def handle(self, *args, **options):
+        users = User.objects.filter(username=options['user']) if options['user'] else User.objects.order_by('-is_superuser', 'pk')
+        user = users.first()
+        if user is None:
+            raise CommandError("No user to log in as, create one first")
+
+        client = Client()
+        client.force_login(user)
+        with override_settings(ALLOWED_HOSTS=list(settings.ALLOWED_HOSTS) + ['testserver']):
+            report = {path: measure(client, path) for path in options['paths'] or self.default_paths()}
+
+        baseline = {}
+        if options['compare']:
+            with open(options['compare']) as file:
+                baseline = json.load(file)
+
+        self.stdout.write(f"{'page':<32} {'requests':>8} {'raw KB':>8} {'gzip KB':>8} {'br KB':>8} {'immutable':>9}")
+        for path, page in report.items():
+            total = totals(page)
+            self.stdout.write(
+                f"{path:<32} {total['requests']:>8} {kilobytes(total['raw']):>8} {kilobytes(total['gzip']):>8} "
+                f"{kilobytes(total['br']):>8} {total['immutable']:>4}/{len(page['assets'])}"
+            )
+            if path in baseline:
+                before = totals(baseline[path])
+                self.stdout.write(
+                    f"{'  before':<32} {before['requests']:>8} {kilobytes(before['raw']):>8} {kilobytes(before['gzip']):>8} "
+                    f"{kilobytes(before['br']):>8} {before['immutable']:>4}/{len(baseline[path]['assets'])}"
+                )
+            for url, asset in page['assets'].items():
+                self.stdout.write(f"    {url:<60} {kilobytes(asset['raw']):>8} {kilobytes(asset['gzip']):>8} {kilobytes(asset['br']):>8}")
+            for url in page['external']:
+                self.stdout.write(f"    {url[:60]:<60} (external)")
+
+        # what a visitor downloads for all the pages when shared files are fetched once
+        unique = {}
+        for page in report.values():
+            unique.update(page['assets'])
+        shared = sum(asset['gzip'] for asset in unique.values()) + sum(page['html']['gzip'] for page in report.values())
+        self.stdout.write(f"All pages, shared files fetched once: {len(unique)} static files, {kilobytes(shared)} KB gzip")
+
+        if options['save']:
+            with open(options['save'], 'w') as file:
+                json.dump(report, file, indent=2)
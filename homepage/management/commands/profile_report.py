@@ -0,0 +1,83 @@
+import glob
+import os
+from collections import Counter, defaultdict
+
+from django.core.management.base import BaseCommand, CommandError
+
+from core.sampling import COLLAPSED, get_setting
+
+
+class Command(BaseCommand):
+    help = "Merges the stacks sampled by the profiling middleware (core/sampling.py) into a hot path report per URL name"
+
+    def add_arguments(self, parser):
+        parser.add_argument('url_names', nargs='*', help="URL names to report on (default: all that were sampled)")
+        parser.add_argument('--dir', help="directory of the collapsed stack files (default: PROFILING['DIR'])")
+        parser.add_argument('--top', type=int, default=15, help="functions listed per URL name")
+        parser.add_argument('--merge', metavar='FILE', help="also writes the merged stacks to one collapsed file, for flamegraph.pl or speedscope")
+        parser.add_argument('--clear', action='store_true', help="deletes the files reported on")
+
+    def handle(self, *args, **options):
+        directory = options['dir'] or get_setting('DIR', None)
+        if not directory or not os.path.isdir(directory):
+            raise CommandError(f"No profiles in {directory}, set PROFILING['ENABLED'] (DJANGO_PROFILING=1) and serve some requests")
+
+        stacks = defaultdict(Counter)           # url name -> stack -> samples
+        paths = []
+        for path in sorted(glob.glob(os.path.join(directory, '*' + COLLAPSED))):
+            url_name = os.path.basename(path)[:-len(COLLAPSED)].rsplit('.', 1)[0]
+            if options['url_names'] and url_name not in options['url_names']:
+                continue
+            paths.append(path)
+            with open(path) as file:
+                for line in file:
+                    stack, _, count = line.rstrip('\n').rpartition(' ')
+                    if stack and count.isdigit():
+                        stacks[url_name][stack] += int(count)
+        if not stacks:
+            raise CommandError("No samples found")
+
+        interval = get_setting('INTERVAL', 0.005)
+        for url_name, counts in sorted(stacks.items(), key=lambda item: -sum(item[1].values())):
+            self.report(url_name, counts, interval, options['top'])
+
+        if options['merge']:
+            with open(options['merge'], 'w') as file:
+                for counts in stacks.values():
+                    file.writelines(f"{stack} {count}\n" for stack, count in counts.most_common())
+            self.stdout.write(f"Merged stacks written to {options['merge']}")
+        if options['clear']:
+            for path in paths:
+                os.remove(path)
+
+    def report(self, url_name, counts, interval, top):
+        samples = sum(counts.values())
+        self.stdout.write(f"{url_name}: {samples} samples, about {samples * interval:.2f} s of request time")
+
+        # total: samples with the function anywhere on the stack, self: samples with it running
+        total, own = Counter(), Counter()
+        for stack, count in counts.items():
+            frames = stack.split(';')[1:]
+            own[frames[-1] if frames else '(middleware)'] += count
+            for name in set(frames):
+                total[name] += count
+        self.stdout.write(f"  {'self %':>7} {'total %':>7}  function")
+        for name, count in own.most_common(top):
+            self.stdout.write(f"  {count * 100 / samples:>7.1f} {total[name] * 100 / samples:>7.1f}  {name}")
+
+        # the hot path: from the root, always into the callee with the most samples
+        self.stdout.write("  hot path:")
+        prefix, depth = [], 0
+        while True:
+            children = Counter()
+            for stack, count in counts.items():
+                frames = stack.split(';')[1:]
+                if len(frames) > depth and frames[:depth] == prefix:
+                    children[frames[depth]] += count
+            if not children:
+                break
+            name, count = children.most_common(1)[0]
+            prefix.append(name)
+            depth += 1
+            self.stdout.write(f"  {count * 100 / samples:>7.1f}%  {'  ' * min(depth, 20)}{name}")
+        self.stdout.write("")
@@ -0,0 +1,72 @@
+import json
+import time
+
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from django.test import Client
+from django.test.utils import override_settings
+from django.urls import reverse
+
+from core.templateprofile import OUTSIDE, TemplateProfiler
+
+
+class Command(BaseCommand):
+    help = "Renders pages repeatedly and shows the time and SQL queries spent per template and {% include %}"
+
+    def add_arguments(self, parser):
+        parser.add_argument('paths', nargs='*', help="pages to render, the dashboard and the list pages by default")
+        parser.add_argument('--repeat', type=int, default=20, help="measured requests per page, after one warm up request")
+        parser.add_argument('--user', help="user to log in as, the first superuser by default")
+        parser.add_argument('--save', metavar='FILE', help="writes the per page results to a JSON file")
+        parser.add_argument('--compare', metavar='FILE', help="shows the change against a file written with --save")
+
+    def handle(self, *args, **options):
+        users = User.objects.filter(username=options['user']) if options['user'] else User.objects.order_by('-is_superuser', 'pk')
+        user = users.first()
+        if user is None:
+            raise CommandError("No user to log in as, create one first")
+        paths = options['paths'] or [reverse(name) for name in ('home', 'inventory', 'purchases-list', 'sales-list', 'suppliers-list')]
+        repeat = max(options['repeat'], 1)
+
+        baseline = {}
+        if options['compare']:
+            with open(options['compare']) as file:
+                baseline = json.load(file)
+
+        client = Client()
+        client.force_login(user)
+        results = {}
+        with override_settings(ALLOWED_HOSTS=list(settings.ALLOWED_HOSTS) + ['testserver']):
+            for path in paths:
+                # the warm up request fills the fragment caches, so the measured ones show the steady state
+                if client.get(path).status_code != 200:
+                    raise CommandError(f"GET {path} did not answer 200")
+                with TemplateProfiler() as profiler:
+                    started = time.perf_counter()
+                    for _ in range(repeat):
+                        client.get(path)
+                    elapsed = time.perf_counter() - started
+                queries = sum(entry['queries'] for entry in profiler.stats.values())
+                results[path] = {'ms': elapsed * 1000 / repeat, 'queries': queries / repeat}
+                self.report(path, results[path], baseline.get(path), profiler.stats, repeat)
+
+        if options['save']:
+            with open(options['save'], 'w') as file:
+                json.dump(results, file, indent=2)
+
+    def report(self, path, result, before, stats, repeat):
+        line = f"{path}: {result['ms']:.2f} ms, {result['queries']:g} queries per request"
+        if before:
+            line += f" (before: {before['ms']:.2f} ms, {before['queries']:g} queries)"
+        self.stdout.write(line)
+        self.stdout.write(f"  {'template':<56} {'calls':>6} {'total ms':>9} {'self ms':>9} {'queries':>8} {'incl.':>6}")
+        for name, entry in sorted(stats.items(), key=lambda item: -item[1]['total']):
+            if name == OUTSIDE:
+                continue
+            self.stdout.write(
+                f"  {name:<56} {entry['calls'] / repeat:>6g} {entry['total'] * 1000 / repeat:>9.2f} {entry['self'] * 1000 / repeat:>9.2f} "
+                f"{entry['queries'] / repeat:>8g} {entry['total_queries'] / repeat:>6g}"
+            )
+        if OUTSIDE in stats:
+            self.stdout.write(f"  {OUTSIDE:<56} {'':>6} {'':>9} {'':>9} {stats[OUTSIDE]['queries'] / repeat:>8g}")
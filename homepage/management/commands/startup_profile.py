@@ -0,0 +1,124 @@
+import json
+import os
+import subprocess
+import sys
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+# runs in a fresh interpreter, so every number is a real cold start
+PROBE = r'''
+import json, time
+start = time.perf_counter()
+phases, apps = {}, {}
+import django
+phases['import django'] = time.perf_counter() - start
+
+from django.apps import config
+from django.conf import settings
+
+mark = time.perf_counter()
+settings.INSTALLED_APPS
+phases['settings'] = time.perf_counter() - mark
+
+create = config.AppConfig.create.__func__
+
+def timed_create(cls, entry):
+    app = create(cls, entry)
+    for step in ('import_models', 'ready'):
+        def timed(func=getattr(app, step), step=step, label=app.label):
+            mark = time.perf_counter()
+            func()
+            apps.setdefault(label, {})[step] = time.perf_counter() - mark
+        setattr(app, step, timed)
+    return app
+
+config.AppConfig.create = classmethod(timed_create)
+mark = time.perf_counter()
+django.setup()
+phases['app registry'] = time.perf_counter() - mark
+
+mark = time.perf_counter()
+from django.urls import get_resolver
+get_resolver().url_patterns
+phases['urlconf'] = time.perf_counter() - mark
+
+mark = time.perf_counter()
+from django.core.wsgi import get_wsgi_application
+get_wsgi_application()
+phases['wsgi handler'] = time.perf_counter() - mark
+
+print(json.dumps({'phases': phases, 'apps': apps}))
+'''
+
+
+def run_probe(importtime=False):
+    command = [sys.executable] + (['-X', 'importtime'] if importtime else []) + ['-c', PROBE]
+    env = dict(os.environ, DJANGO_SETTINGS_MODULE=settings.SETTINGS_MODULE)
+    start = time.perf_counter()
+    done = subprocess.run(command, env=env, cwd=settings.BASE_DIR, capture_output=True, text=True)
+    elapsed = time.perf_counter() - start
+    if done.returncode:
+        raise CommandError(done.stderr.strip().splitlines()[-1] if done.stderr.strip() else 'startup probe failed')
+    report = json.loads(done.stdout.strip().splitlines()[-1])
+    report['total'] = elapsed
+    return report, done.stderr
+
+
+# "import time: self [us] | cumulative | imported package" lines, nesting shown by indentation
+def parse_importtime(output):
+    modules = []
+    for line in output.splitlines():
+        if not line.startswith('import time:') or 'imported package' in line:
+            continue
+        self_us, cumulative_us, name = line[len('import time:'):].split('|')
+        depth = (len(name) - len(name.lstrip()) - 1) // 2
+        modules.append((name.strip(), int(self_us), int(cumulative_us), depth))
+    return modules
+
+
+class Command(BaseCommand):
+    help = 'Measures a cold start (imports, app registry, URLconf, WSGI handler) in a fresh interpreter and reports it against a budget.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--repeat', type=int, default=3, help='cold starts to run, the fastest one is reported')
+        parser.add_argument('--top', type=int, default=15, help='number of modules to list')
+        parser.add_argument('--budget', type=float, default=getattr(settings, 'STARTUP_BUDGET', None),
+                            help='seconds a cold start may take (default: settings.STARTUP_BUDGET)')
+        parser.add_argument('--fail-over-budget', action='store_true',
+                            help='exit with an error when over the budget, for a dedicated benchmark job (timings on shared CI are too noisy for the unit tests)')
+
+    def handle(self, *args, **options):
+        report = min((run_probe()[0] for _ in range(max(options['repeat'], 1))), key=lambda run: run['total'])
+        modules = parse_importtime(run_probe(importtime=True)[1])
+
+        self.stdout.write(f"Cold start: {report['total']:.3f} s (interpreter included)")
+        for phase, seconds in report['phases'].items():
+            self.stdout.write(f"  {phase:<16} {seconds * 1000:8.1f} ms")
+        self.stdout.write('App registry, per app:')
+        for label, steps in sorted(report['apps'].items(), key=lambda item: -sum(item[1].values())):
+            self.stdout.write(f"  {label:<16} models {steps.get('import_models', 0) * 1000:7.1f} ms   ready {steps.get('ready', 0) * 1000:7.1f} ms")
+
+        top_level = sorted((module for module in modules if module[3] == 0), key=lambda module: -module[2])
+        self.stdout.write("Slowest top level imports (cumulative):")
+        for name, _, cumulative, _ in top_level[:options['top']]:
+            self.stdout.write(f"  {cumulative / 1000:8.1f} ms  {name}")
+        apps = {config.split('.')[0] for config in settings.INSTALLED_APPS if not config.startswith('django.')}
+        own = sorted((module for module in modules if module[0].split('.')[0] in apps | {'core'}), key=lambda module: -module[2])
+        self.stdout.write("Slowest project modules (cumulative):")
+        for name, _, cumulative, _ in own[:options['top']]:
+            self.stdout.write(f"  {cumulative / 1000:8.1f} ms  {name}")
+
+        if any(module[0] == 'pkg_resources' for module in modules):
+            # Django 3.0 imports distutils, which setuptools' shim serves by loading all of pkg_resources
+            self.stdout.write("Hint: distutils comes from setuptools' shim here, starting Python with SETUPTOOLS_USE_DISTUTILS=stdlib avoids it")
+
+        budget = options['budget']
+        if budget is not None and report['total'] > budget:
+            message = f"Cold start took {report['total']:.3f} s, over the budget of {budget:.3f} s"
+            if options['fail_over_budget']:
+                raise CommandError(message)
+            self.stdout.write(self.style.WARNING(message))
+        elif budget is not None:
+            self.stdout.write(f"Within the budget of {budget:.3f} s")
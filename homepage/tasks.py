@@ -0,0 +1,34 @@
+from audit.log import suppressed
+from core import dbhealth
+from audit.models import AuditEntry
+from jobs.registry import task
+from inventory.models import Stock, StockChange
+from transactions.models import (
+    SaleBill, PurchaseBill, Supplier, Customer, PurchaseBillDetails, PurchaseItem, SaleBillDetails, SaleItem,
+    ArchivedSaleBill, ArchivedPurchaseBill, ArchivedSaleItem, ArchivedPurchaseItem, SaleDraft, SaleDraftLine,
+)
+
+
+# Delete all data from the backend, children first so every delete is a plain one-table delete
+@task('clear_data', queue='heavy', max_attempts=1)
+def clear_data(job):
+    models = [
+        SaleDraftLine, SaleDraft, SaleItem, PurchaseItem, SaleBillDetails, PurchaseBillDetails, SaleBill, PurchaseBill,
+        ArchivedSaleItem, ArchivedPurchaseItem, ArchivedSaleBill, ArchivedPurchaseBill, Customer, Supplier, StockChange, Stock, AuditEntry,
+    ]
+    deleted = {}
+    # the history goes too, rather than filling up with a delete entry per row
+    with suppressed():
+        for step, model in enumerate(models, start=1):
+            deleted[model.__name__] = model.objects.all().delete()[0]
+            job.set_progress(step * 100 / len(models), f"Deleted {model.__name__} rows")
+    return deleted
+
+
+# planner statistics, space and integrity checks, queued every JOBS['SCHEDULE']['db_maintenance'] seconds
+@task('db_maintenance', queue='heavy', max_attempts=1)
+def db_maintenance(job, vacuum=None):
+    statements = dbhealth.maintain(vacuum)
+    job.set_progress(20, f"Ran {', '.join(statements)}")
+    checks = dbhealth.check(progress=lambda done, total: job.set_progress(20 + done * 80 / total, f"Ran {done} of {total} integrity checks"))
+    return {'maintenance': statements, 'problems': {result.name: result.count for result in checks if result.count}}
@@ -0,0 +1,11 @@
+from django import template
+
+from core.fragments import get_version
+
+register = template.Library()
+
+
+# {% fragment_version "inventory.Stock" "transactions.Supplier" as versions %} for the key of a {% cache %} fragment
+@register.simple_tag
+def fragment_version(*labels):
+    return '.'.join(str(get_version(label)) for label in labels)
@@ -1,3 +1,279 @@
-from django.test import TestCase
+import gzip
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+from decimal import Decimal
+from io import StringIO
+from unittest import mock
 
-# Create your tests here.
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.exceptions import MiddlewareNotUsed
+from django.core.management import call_command
+from django.db import connection
+from django.template import Context, Engine, engines
+from django.http import HttpResponse
+from django.test import RequestFactory, SimpleTestCase, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from core import dbhealth, sampling, warmup
+from inventory.models import Stock
+from transactions.models import Customer, SaleBill, SaleItem
+from core.templateprofile import TemplateProfiler
+from . import bundles
+from .auth import CachedModelBackend, user_cache
+
+# loads what a web worker loads when it boots and prints the modules of LAZY it pulled in
+BOOT = r'''
+import json, sys
+import django
+django.setup()
+from django.urls import get_resolver
+get_resolver().url_patterns
+from django.core.wsgi import get_wsgi_application
+get_wsgi_application()
+print(json.dumps(sorted(name for name in sys.modules if name.split('.')[0] in LAZY or name in LAZY)))
+'''
+
+
+class ColdStartImportsTest(SimpleTestCase):
+    # imported by the tasks, views and batches that need them, not when a worker boots (see 'manage.py startup_profile');
+    # concurrent.futures itself comes with asgiref, so the process pool module stands for the project's own use
+    LAZY = ['numpy', 'zipfile', 'concurrent.futures.process']
+
+    def test_boot_does_not_import_heavy_modules(self):
+        env = dict(
+            os.environ,
+            DJANGO_SETTINGS_MODULE=settings.SETTINGS_MODULE,
+            # setuptools' distutils shim imports zipfile on its own, outside the project
+            SETUPTOOLS_USE_DISTUTILS='stdlib',
+        )
+        done = subprocess.run(
+            [sys.executable, '-W', 'ignore', '-c', f"LAZY = {self.LAZY!r}\n{BOOT}"],
+            env=env, cwd=settings.BASE_DIR, capture_output=True, text=True,
+        )
+        self.assertEqual(done.returncode, 0, done.stderr)
+        self.assertEqual(json.loads(done.stdout.splitlines()[-1]), [])
+
+
+class BundleTest(SimpleTestCase):
+    def test_css_is_minified(self):
+        css = "/* gone */ /*! kept */\na :hover ,\nb > i {\n  color: red;\n  margin: 0 ;\n}\n"
+        self.assertEqual(bundles.minify_css(css), "/*! kept */ a :hover,b>i{color:red;margin:0}")
+
+    def test_js_keeps_its_line_breaks(self):
+        js = "// header\nvar a = 1\n\n    var b = 2  // trailing stays\n"
+        self.assertEqual(bundles.minify_js(js), "var a = 1\nvar b = 2  // trailing stays")
+
+    def test_bundle_is_built_from_its_sources_and_rebuilt_when_one_changes(self):
+        with tempfile.TemporaryDirectory() as root:
+            sources = {}
+            for name, text in [('a.js', 'var a = 1\n//# sourceMappingURL=a.js.map\n'), ('b.min.js', '// kept as is\nvar b=2')]:
+                sources[name] = os.path.join(root, name)
+                with open(sources[name], 'w') as file:
+                    file.write(text)
+            target = os.path.join(root, 'out', 'app.js')
+            with mock.patch.object(bundles, 'source_path', sources.get):
+                self.assertTrue(bundles.is_stale(list(sources), target))
+                bundles.build('app.js', list(sources), target)
+                with open(target) as file:
+                    self.assertEqual(file.read(), 'var a = 1;\n// kept as is\nvar b=2\n')
+                self.assertFalse(bundles.is_stale(list(sources), target))
+                later = time.time() + 10
+                os.utime(sources['a.js'], (later, later))
+                self.assertTrue(bundles.is_stale(list(sources), target))
+
+    # the committed staticfiles/ is what production serves, it must hold the bundles the sources build today
+    def test_release_build_is_current(self):
+        with open(os.path.join(settings.STATIC_ROOT, 'staticfiles.json')) as file:
+            manifest = json.load(file)['paths']
+        with tempfile.TemporaryDirectory() as root:
+            for name, sources in settings.STATIC_BUNDLES.items():
+                target = os.path.join(root, name)
+                bundles.build(name, sources, target)
+                with open(target, 'rb') as file:
+                    built = file.read()
+                released = os.path.join(settings.STATIC_ROOT, manifest[name])
+                with open(released, 'rb') as file:
+                    self.assertEqual(file.read(), built, f"{name} changed, run collectstatic (see STATICFILES_STORAGE)")
+                with gzip.open(released + '.gz') as file:
+                    self.assertEqual(file.read(), built)
+
+
+class TemplateProfilerTest(SimpleTestCase):
+    def test_includes_and_blocks_get_their_own_entries(self):
+        engine = Engine(loaders=[('django.template.loaders.locmem.Loader', {
+            'base.html': "<{% block body %}{% endblock %}>",
+            'page.html': "{% extends 'base.html' %}{% block body %}{% include 'row.html' %}{% include 'row.html' %}{% endblock %}",
+            'row.html': "row",
+        })])
+        with TemplateProfiler() as profiler:
+            self.assertEqual(engine.get_template('page.html').render(Context()), '<rowrow>')
+        calls = {name: entry['calls'] for name, entry in profiler.stats.items()}
+        self.assertEqual(calls, {'page.html': 1, 'base.html': 1, 'page.html {% block body %}': 1, 'row.html': 2})
+        page = profiler.stats['page.html']
+        self.assertGreaterEqual(page['total'], sum(entry['self'] for entry in profiler.stats.values()) * 0.99)
+
+
+class WarmupTest(SimpleTestCase):
+    def test_project_templates_are_found(self):
+        names = warmup.template_names(engines['django'].engine)
+        self.assertIn('base.html', names)
+        self.assertIn('bill/sale_bill.html', names)
+
+    def test_templates_are_compiled_into_the_cached_loader(self):
+        with tempfile.TemporaryDirectory() as directory:
+            for name, text in [('good.html', '{{ value }}'), ('broken.html', '{% if %}')]:
+                with open(os.path.join(directory, name), 'w') as file:
+                    file.write(text)
+            templates = [{
+                'BACKEND': 'django.template.backends.django.DjangoTemplates',
+                'DIRS': [directory],
+                'OPTIONS': {'loaders': [('django.template.loaders.cached.Loader', ['django.template.loaders.filesystem.Loader'])]},
+            }]
+            with override_settings(TEMPLATES=templates):
+                engine = engines['django'].engine
+                self.assertEqual(warmup.template_names(engine), ['broken.html', 'good.html'])
+                with mock.patch.object(warmup, 'get_default_renderer', return_value=None):
+                    compiled = warmup.warm_templates()
+                self.assertEqual(compiled, 1)
+                with mock.patch('django.template.loaders.filesystem.Loader.get_contents') as read:
+                    self.assertEqual(engine.get_template('good.html').render(Context({'value': 'x'})), 'x')
+                read.assert_not_called()
+
+
+class CachedAuthTest(TestCase):
+    def setUp(self):
+        user_cache.clear()
+        self.user = User.objects.create_user('clerk', password='secret')
+        self.backend = CachedModelBackend()
+
+    def test_user_is_read_once(self):
+        self.assertEqual(self.backend.get_user(self.user.pk), self.user)
+        with self.assertNumQueries(0):
+            self.assertEqual(self.backend.get_user(self.user.pk), self.user)
+
+    def test_deactivated_or_deleted_user_is_not_served_from_the_cache(self):
+        self.backend.get_user(self.user.pk)
+        self.user.is_active = False
+        self.user.save()
+        self.assertIsNone(self.backend.get_user(self.user.pk))
+        self.user.delete()
+        self.assertIsNone(self.backend.get_user(self.user.pk))
+
+    def test_logged_in_request_reads_neither_session_nor_user_rows(self):
+        self.client.login(username='clerk', password='secret')
+        self.client.get(reverse('home'))
+        with CaptureQueriesContext(connection) as queries:
+            self.assertEqual(self.client.get(reverse('home')).status_code, 200)
+        tables = [query['sql'] for query in queries if 'django_session' in query['sql'] or 'auth_user' in query['sql']]
+        self.assertEqual(tables, [])
+
+    def test_anonymous_request_is_sent_to_login(self):
+        self.assertRedirects(self.client.get(reverse('home')), f"{reverse('login')}?next={reverse('home')}", fetch_redirect_response=False)
+
+
+def busy_view(request):
+    deadline = time.perf_counter() + 0.1
+    while time.perf_counter() < deadline:
+        pass
+    return HttpResponse()
+
+
+class SamplingProfilerTest(SimpleTestCase):
+    @override_settings(PROFILING={'ENABLED': False})
+    def test_off_unless_enabled(self):
+        with self.assertRaises(MiddlewareNotUsed):
+            sampling.SamplingProfilerMiddleware(busy_view)
+
+    def test_stack_is_recorded_from_the_root_down(self):
+        def inner():
+            recording.add(sys._getframe())
+
+        recording = sampling.Recording(sys._getframe())
+        inner()
+        [stack] = recording.stacks
+        self.assertTrue(stack.endswith('SamplingProfilerTest.test_stack_is_recorded_from_the_root_down.<locals>.inner'))
+        # frames outside the request are not counted
+        sampling.Recording(None).add(sys._getframe())
+
+    def test_sampled_request_is_written_and_reported(self):
+        with tempfile.TemporaryDirectory() as directory:
+            with self.settings(PROFILING={'ENABLED': True, 'RATE': 1.0, 'INTERVAL': 0.001, 'DIR': directory}):
+                sampling.SamplingProfilerMiddleware(busy_view)(RequestFactory().get('/'))
+                [name] = os.listdir(directory)
+                self.assertEqual(name, f"unresolved.{os.getpid()}.collapsed")
+                with open(os.path.join(directory, name)) as file:
+                    self.assertIn('homepage.tests:busy_view', file.read())
+
+                out = StringIO()
+                merged = os.path.join(directory, 'merged.txt')
+                call_command('profile_report', '--merge', merged, '--clear', stdout=out)
+                self.assertIn('unresolved:', out.getvalue())
+                self.assertIn('homepage.tests:busy_view', out.getvalue())
+                self.assertEqual(os.listdir(directory), ['merged.txt'])
+
+    @override_settings(PROFILING={'ENABLED': True, 'RATE': 0.0, 'SLOW_THRESHOLD': 5, 'INTERVAL': 0.001})
+    def test_fast_request_below_the_threshold_writes_nothing(self):
+        with tempfile.TemporaryDirectory() as directory, self.settings(PROFILING={**settings.PROFILING, 'DIR': directory}):
+            sampling.SamplingProfilerMiddleware(busy_view)(RequestFactory().get('/'))
+            self.assertEqual(os.listdir(directory), [])
+
+
+@override_settings(DBHEALTH={'BATCH_SIZE': 2, 'PAUSE': 0})
+class DbHealthTest(TestCase):
+    def setUp(self):
+        self.stocks = [Stock.objects.create(name=f"Part {number}", quantity=10, cost=Decimal('2.00')) for number in range(5)]
+        customer = Customer.objects.create(name='Ann', phone='9876543210', address='Road', email='ann@example.com')
+        self.bill = SaleBill.objects.create(customer=customer)
+
+    def results(self, **kwargs):
+        return {result.name: (result.count, result.sample) for result in dbhealth.check(**kwargs)}
+
+    def test_clean_database_has_no_findings(self):
+        self.assertEqual({count for count, sample in self.results().values()}, {0})
+
+    def test_problems_are_found_across_batches(self):
+        items = [SaleItem.objects.create(billno=self.bill, stock=stock, quantity=1, perprice=5, totalprice=5) for stock in self.stocks]
+        # the foreign keys are only checked at commit, the orphan is removed before the test's transaction ends
+        SaleItem.objects.filter(pk=items[3].pk).update(billno_id=self.bill.pk + 100)
+        self.addCleanup(SaleItem.objects.filter(pk=items[3].pk).delete)
+        Stock.objects.filter(pk__in=[self.stocks[0].pk, self.stocks[4].pk]).update(quantity=-2)
+
+        results = self.results()
+        self.assertEqual(results['sale items without their bill'], (1, [items[3].pk]))
+        self.assertEqual(results['stocks with a negative quantity'], (2, [self.stocks[0].pk, self.stocks[4].pk]))
+        self.assertEqual(results['sale items without their stock'], (0, []))
+        self.assertEqual(self.results(batch_size=100, sample=1)['stocks with a negative quantity'], (2, [self.stocks[0].pk]))
+
+    def test_command_reports_the_findings(self):
+        Stock.objects.filter(pk=self.stocks[1].pk).update(quantity=-1)
+        out = StringIO()
+        call_command('dbhealth', 'check', stdout=out)
+        self.assertIn(f"1 stocks with a negative quantity, e.g. ids {self.stocks[1].pk}", out.getvalue())
+        self.assertIn('No sale items without their bill', out.getvalue())
+
+    def test_maintenance_without_vacuum_only_analyzes(self):
+        self.assertEqual(dbhealth.maintain(vacuum=False), ['PRAGMA analysis_limit = 1000', 'ANALYZE'])
+
+    def test_slow_queries_are_recorded_with_parameter_types_only(self):
+        def view(request):
+            list(Customer.objects.filter(phone='9876543210'))
+            return HttpResponse()
+
+        with tempfile.TemporaryDirectory() as directory:
+            with self.settings(DBHEALTH={'RECORD_SLOW': True, 'SLOW_QUERY': 0, 'DIR': directory, 'MAX_LOG_BYTES': 0}):
+                middleware = dbhealth.SlowQueryMiddleware(view)
+                middleware(RequestFactory().get('/'))
+                [query] = dbhealth.slow_queries(directory)
+                self.assertEqual((query['view'], query['types']), ('unresolved', ['str']))
+                self.assertNotIn('9876543210', json.dumps(query))
+                # past MAX_LOG_BYTES the log is moved aside and a new one begun
+                middleware(RequestFactory().get('/'))
+                self.assertEqual(sorted(os.listdir(directory)), [f"slow.{os.getpid()}.1.jsonl", f"slow.{os.getpid()}.jsonl"])
+                dbhealth.clear_slow_queries(directory)
+                self.assertEqual(os.listdir(directory), [])
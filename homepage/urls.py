@@ -6,4 +6,5 @@ urlpatterns = [
     path('', views.HomeView.as_view(), name='home'),
     path('about/', views.AboutView.as_view(), name='about'),
     path('signup/', views.signup, name='signup'),
+    path('cache-stats/', views.cache_stats, name='cache-stats'),
 ]
\ No newline at end of file
@@ -1,7 +1,7 @@
 from django.shortcuts import render
 from django.views.generic import View, TemplateView
 from inventory.models import Stock
-from transactions.models import SaleBill, PurchaseBill,  Supplier, PurchaseBillDetails, PurchaseItem, SaleBillDetails, SaleItem
+from transactions.models import SaleBill, PurchaseBill,  Supplier, Customer, PurchaseBillDetails, PurchaseItem, SaleBillDetails, SaleItem
 
 class HomeView(View):
     template_name = "home.html"
@@ -11,6 +11,7 @@ class HomeView(View):
         selected_data = request.GET.get('data', 'quantity')  # Default to 'quantity' if not specified
 
         labels = []
+        stock_ids = []
         quantity_data = []
         cost_data = []  # Add this line for cost data
         sales_data = []
@@ -22,6 +23,7 @@ class HomeView(View):
 
         for item in stock_queryset:
             labels.append(f"{item.name} ({item.sub_category})" if item.sub_category else item.name)
+            stock_ids.append(item.pk)
             quantity_data.append(float(item.quantity) if selected_data == 'quantity' else 0)  # Convert Decimal to float
             cost_data.append(float(item.cost) if selected_data == 'quantity' else 0)  # Convert Decimal to float
             sales_data.append(float(item.total_sales_value) if selected_data == 'quantity' else 0)
@@ -31,6 +33,7 @@ class HomeView(View):
 
         context = {
             'labels': labels,
+            'stock_ids': stock_ids,
             'data': quantity_data,
             'cost_data': cost_data,  # Add this line for cost data
             'sales_data': sales_data,
@@ -65,25 +68,28 @@ def signup(request):
 
 from django.contrib.auth.decorators import login_required
 from django.http import JsonResponse
+from django.urls import reverse
+from jobs.registry import enqueue
 # from .models import YourModel
 
 @login_required
 def clear_data(request):
     if request.method == 'POST':
-        try:
-            # Delete all data from the backend
-            Stock.objects.all().delete()
-            SaleBill.objects.all().delete()
-            PurchaseBill.objects.all().delete()
-            Supplier.objects.all().delete()
-            PurchaseItem.objects.all().delete()
-            PurchaseBillDetails.objects.all().delete()
-            SaleBillDetails.objects.all().delete()
-            SaleItem.objects.all().delete()
-            return JsonResponse({"success": True})
-        except Exception as e:
-            return JsonResponse({"error": str(e)}, status=500)
+        # Deleting everything can take a while, it runs as the 'clear_data' background job (homepage/tasks.py)
+        job = enqueue('clear_data', key='clear-data')
+        return JsonResponse({"success": True, "job": job.id, "status_url": reverse('job-status', args=[job.id])}, status=202)
     else:
         # Handle GET request or other methods if needed
         return JsonResponse({"error": "Method not allowed."}, status=405)
 
+
+from inventory.cache import stock_cache
+from transactions.cache import supplier_cache
+
+# hit-rate counters of the lookup caches in the worker that serves this request
+@login_required
+def cache_stats(request):
+    return JsonResponse({
+        'stock': stock_cache.stats(),
+        'supplier': supplier_cache.stats(),
+    })
@@ -0,0 +1,213 @@
+"""
+Inventory analytics: ABC classification, turnover, days of supply and dead stock.
+
+Sale and purchase items are folded into StockMonthlyRollup rows incrementally:
+each item is flagged rolled_up in the transaction that counts it, so an item
+whose transaction commits after later ones were rolled up is simply taken by
+the next refresh, and deleted bills subtract the items that were counted.
+Refreshes and forgets of a table first update its RollupLock row, so they run
+one at a time and an item is counted and subtracted at most once. Reports read
+the small rollup table with one grouped query and do the per-stock maths on
+NumPy arrays.
+"""
+
+from datetime import date, timedelta
+
+import numpy as np
+from django.db import transaction
+from django.db.models import Max, OuterRef, Q, Subquery, Sum
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+
+from .models import Stock, StockMonthlyRollup, RollupLock
+
+SALE = 'sale'
+PURCHASE = 'purchase'
+
+
+def _source(name):
+    from transactions.models import SaleBill, SaleItem, PurchaseBill, PurchaseItem
+
+    if name == SALE:
+        return SaleItem, SaleBill, 'sold_quantity', 'sold_value'
+    return PurchaseItem, PurchaseBill, 'purchased_quantity', 'purchased_value'
+
+
+# first day of the month of a date or (local) time
+def month_start(value):
+    if hasattr(value, 'tzinfo') and timezone.is_aware(value):
+        value = timezone.localtime(value)
+    return date(value.year, value.month, 1)
+
+
+# rolls up items added since the last refresh, at most `limit` per table; returns the number of items rolled up
+def refresh(batch_size=20000, limit=None):
+    done = 0
+    for name in (SALE, PURCHASE):
+        while limit is None or done < limit:
+            count = _refresh_batch(name, batch_size if limit is None else min(batch_size, limit - done))
+            if not count:
+                break
+            done += count
+    return done
+
+
+def pending():
+    return sum(_source(name)[0].objects.filter(rolled_up=False).count() for name in (SALE, PURCHASE))
+
+
+# takes the table's lock row until the end of the transaction (the row on PostgreSQL, the database on SQLite)
+def _lock(name):
+    RollupLock.objects.filter(name=name).update(refreshed_at=timezone.now())
+
+
+def _refresh_batch(name, batch_size, chunk_size=900):
+    model, bill_model, quantity_field, value_field = _source(name)
+    # unlocked first look, so idle refreshes write nothing
+    if not model.objects.filter(rolled_up=False).exists():
+        return 0
+    RollupLock.objects.get_or_create(name=name)
+
+    with transaction.atomic():
+        _lock(name)
+        rows = np.array(
+            model.objects.filter(rolled_up=False).order_by('id').values_list('id', 'stock_id', 'billno_id', 'quantity', 'totalprice')[:batch_size],
+            dtype=np.int64,
+        ).reshape(-1, 5)
+        if not len(rows):
+            return 0
+        ids, items = rows[:, 0].tolist(), rows[:, 1:]
+        for start in range(0, len(ids), chunk_size):
+            model.objects.filter(id__in=ids[start:start + chunk_size]).update(rolled_up=True)
+        # the month of each bill is worked out once per bill rather than once per item in SQL
+        bills = bill_model.objects.filter(billno__gte=items[:, 1].min(), billno__lte=items[:, 1].max()).order_by('billno').values_list('billno', 'time')
+        bill_ids = np.array([billno for billno, time in bills], dtype=np.int64)
+        bill_months = np.array([month_start(time).toordinal() for billno, time in bills], dtype=np.int64)
+        months = bill_months[np.searchsorted(bill_ids, items[:, 1])]
+
+        keys, index = np.unique(np.stack([items[:, 0], months], axis=1), axis=0, return_inverse=True)
+        index = index.reshape(-1)
+        quantities = np.bincount(index, weights=items[:, 2], minlength=len(keys))
+        values = np.bincount(index, weights=items[:, 3], minlength=len(keys))
+        totals = {
+            (int(stock_id), date.fromordinal(int(month))): (int(quantity), int(value))
+            for (stock_id, month), quantity, value in zip(keys, quantities, values)
+        }
+        _apply(totals, quantity_field, value_field)
+    return len(ids)
+
+
+# subtracts the items of a bill being deleted from the rollups they were already counted in; call it in the
+# transaction that deletes them and before it changes any stock, so the locks are taken in the order refresh takes them
+def forget_items(name, bill, items):
+    model, bill_model, quantity_field, value_field = _source(name)
+    RollupLock.objects.get_or_create(name=name)
+    month = month_start(bill.time)
+    totals = {}
+    with transaction.atomic():
+        _lock(name)
+        # the flags are read under the lock, a refresh running meanwhile has either counted the items or will not see them
+        counted = model.objects.filter(pk__in=[item.pk for item in items], rolled_up=True).values_list('stock_id', 'quantity', 'totalprice')
+        for stock_id, item_quantity, item_value in counted:
+            quantity, value = totals.get((stock_id, month), (0, 0))
+            totals[(stock_id, month)] = (quantity - item_quantity, value - item_value)
+        if totals:
+            _apply(totals, quantity_field, value_field)
+
+
+ROLLUP_FIELDS = ('sold_quantity', 'sold_value', 'purchased_quantity', 'purchased_value')
+
+
+def _apply(totals, quantity_field, value_field, chunk_size=900):
+    stock_ids = sorted({stock_id for stock_id, month in totals})
+    months = {month for stock_id, month in totals}
+    existing = {}
+    for start in range(0, len(stock_ids), chunk_size):
+        rows = StockMonthlyRollup.objects.filter(stock_id__in=stock_ids[start:start + chunk_size], month__in=months)
+        for row in rows.values_list('id', 'stock_id', 'month', *ROLLUP_FIELDS):
+            if (row[1], row[2]) in totals:
+                existing[(row[1], row[2])] = row
+
+    # touched rows are rewritten (delete + insert), which is much cheaper than a CASE per row in bulk_update
+    rollups = []
+    for key, (quantity, value) in totals.items():
+        row = existing.get(key)
+        rollup = StockMonthlyRollup(stock_id=key[0], month=key[1], **dict(zip(ROLLUP_FIELDS, row[3:] if row else (0, 0, 0, 0))))
+        setattr(rollup, quantity_field, getattr(rollup, quantity_field) + quantity)
+        setattr(rollup, value_field, getattr(rollup, value_field) + value)
+        rollups.append(rollup)
+    stale = [row[0] for row in existing.values()]
+    for start in range(0, len(stale), chunk_size):
+        StockMonthlyRollup.objects.filter(id__in=stale[start:start + chunk_size]).delete()
+    StockMonthlyRollup.objects.bulk_create(rollups)
+
+    if quantity_field == 'sold_quantity':
+        # keeps Stock.total_sales_value (shown on the home chart) in line with the rollups
+        lifetime = StockMonthlyRollup.objects.filter(stock=OuterRef('pk')).values('stock').annotate(total=Sum('sold_value')).values('total')
+        for start in range(0, len(stock_ids), chunk_size):
+            Stock.objects.filter(pk__in=stock_ids[start:start + chunk_size]).update(total_sales_value=Coalesce(Subquery(lifetime), 0))
+        from .cache import stock_cache
+        stock_cache.invalidate_all()
+
+
+# per stock analytics for every live stock, as NumPy arrays aligned on `ids`
+def stock_analytics(today=None, months=12, recent_days=90, dead_after_days=180):
+    today = today or timezone.now().date()
+    year_start = month_start(today - timedelta(days=months * 365 // 12))
+    recent_start = month_start(today - timedelta(days=recent_days))
+    dead_cutoff = month_start(today - timedelta(days=dead_after_days))
+
+    stocks = list(Stock.objects.filter(is_deleted=False).order_by('id').values_list('id', 'name', 'sub_category', 'quantity'))
+    ids = np.array([stock[0] for stock in stocks], dtype=np.int64)
+    quantity = np.array([stock[3] for stock in stocks], dtype=float)
+    revenue = np.zeros(len(ids))
+    sold_year = np.zeros(len(ids))
+    sold_recent = np.zeros(len(ids))
+    sold_ever = np.zeros(len(ids), dtype=bool)
+    sold_lately = np.zeros(len(ids), dtype=bool)
+
+    rows = np.array(
+        StockMonthlyRollup.objects.filter(stock__is_deleted=False).values('stock_id').annotate(
+            revenue=Coalesce(Sum('sold_value', filter=Q(month__gte=year_start)), 0),
+            sold_year=Coalesce(Sum('sold_quantity', filter=Q(month__gte=year_start)), 0),
+            sold_recent=Coalesce(Sum('sold_quantity', filter=Q(month__gte=recent_start)), 0),
+            sold_lately=Coalesce(Max('sold_quantity', filter=Q(month__gte=dead_cutoff)), 0),
+            sold_ever=Coalesce(Max('sold_quantity'), 0),
+        ).values_list('stock_id', 'revenue', 'sold_year', 'sold_recent', 'sold_lately', 'sold_ever').order_by(),
+        dtype=np.int64,
+    ).reshape(-1, 6)
+    if len(ids) and len(rows):
+        index = np.minimum(np.searchsorted(ids, rows[:, 0]), len(ids) - 1)
+        known = ids[index] == rows[:, 0]
+        index, rows = index[known], rows[known]
+        revenue[index] = rows[:, 1]
+        sold_year[index] = rows[:, 2]
+        sold_recent[index] = rows[:, 3]
+        sold_lately[index] = rows[:, 4] > 0
+        sold_ever[index] = rows[:, 5] > 0
+
+    # ABC: A covers the first 80% of revenue, B the next 15%, C the rest and everything unsold
+    order = np.argsort(-revenue, kind='stable')
+    total = revenue.sum()
+    share_before = np.empty(len(ids))
+    share_before[order] = (np.cumsum(revenue[order]) - revenue[order]) / total if total else 1
+    abc = np.where(share_before < 0.8, 'A', np.where(share_before < 0.95, 'B', 'C'))
+    abc[revenue <= 0] = 'C'
+
+    with np.errstate(divide='ignore', invalid='ignore'):
+        turnover = np.where(quantity > 0, sold_year / quantity, np.nan)
+        daily_demand = sold_recent / recent_days
+        days_of_supply = np.where(daily_demand > 0, quantity / daily_demand, np.nan)
+
+    return {
+        'ids': ids,
+        'labels': [f"{name} ({sub_category})" if sub_category else name for _, name, sub_category, _ in stocks],
+        'quantity': quantity,
+        'revenue': revenue,
+        'abc': abc,
+        'turnover': turnover,
+        'days_of_supply': days_of_supply,
+        'dead': (quantity > 0) & ~sold_lately,
+        'never_sold': ~sold_ever,
+        'order': order,
+    }
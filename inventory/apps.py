@@ -3,3 +3,9 @@ from django.apps import AppConfig
 
 class InventoryConfig(AppConfig):
     name = 'inventory'
+
+    def ready(self):
+        # every worker must see SKU changes, not only those that served a scan
+        from . import scan  # noqa: F401
+        # stock changes are recorded by every worker, the feed is only served by the ASGI one
+        from . import feed  # noqa: F401
@@ -0,0 +1,9 @@
+from core.fragments import FragmentVersion
+from core.lrucache import ModelLRUCache
+from .models import Stock
+
+# read-through cache for Stock rows, looked up by pk or by (name, sub_category)
+stock_cache = ModelLRUCache(Stock, natural_key=('name', 'sub_category'))
+
+# version of the stock names shown in cached bill fragments, quantity changes leave it alone
+stock_fragments = FragmentVersion(Stock, fields=('name', 'sub_category', 'is_deleted'))
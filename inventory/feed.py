@@ -0,0 +1,228 @@
+"""
+Stock feed: quantity changes pushed to open pages with Server-Sent Events.
+
+Every change of a stock's quantity (bills through Stock.adjust_quantity, the
+sales ingestion, stock edits) adds a StockChange row in the transaction that
+made it. The rows are the feed: ids only grow, so a page's position in it is
+the last id it has seen, rendered into the page ({% stock_feed %}) and sent
+back as Last-Event-ID when the EventSource reconnects.
+
+The endpoint is served by StockFeedApp on the ASGI application (core/asgi.py),
+not by a Django view, so an open page holds no worker. Each ASGI process runs
+one poller, which reads new rows every STOCK_FEED['POLL'] seconds however many
+pages are open and hands them to its clients. A client keeps only the latest
+quantity per stock until it is sent (several changes to one stock go out as
+one), for at most MAX_PENDING stocks; a client further behind than that gets a
+'reset' event and reloads the page. The poller keeps the last BUFFER changes,
+so reconnecting pages catch up without reading the table.
+"""
+
+import asyncio
+import json
+import logging
+from collections import deque
+from importlib import import_module
+from urllib.parse import parse_qs
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.contrib.auth import get_user
+from django.db import close_old_connections
+from django.db.models import Max
+from django.db.models.signals import post_save
+from django.http import HttpRequest
+from django.http.cookie import parse_cookie
+
+from .models import Stock, StockChange
+
+logger = logging.getLogger(__name__)
+
+
+def get_setting(name, default):
+    return getattr(settings, 'STOCK_FEED', {}).get(name, default)
+
+
+# recording
+
+def _changed(sender, instance, created, update_fields=None, raw=False, **kwargs):
+    if raw or (update_fields is not None and 'quantity' not in update_fields):
+        return
+    change = StockChange.objects.create(stock_id=instance.pk, quantity=instance.quantity)
+    keep = get_setting('KEEP_ROWS', 10000)
+    if change.pk % 1000 == 0 and change.pk > keep:
+        # pages further behind than this reload anyway
+        StockChange.objects.filter(pk__lte=change.pk - keep).delete()
+
+
+post_save.connect(_changed, sender=Stock, weak=False)
+
+
+def position():
+    return StockChange.objects.aggregate(last=Max('id'))['last'] or 0
+
+
+def changes_since(since, limit):
+    return list(StockChange.objects.filter(pk__gt=since).order_by('pk').values_list('pk', 'stock_id', 'quantity')[:limit])
+
+
+# database access from the event loop, in a thread, with connections handled as around a request
+def _database(function):
+    def wrapper(*args):
+        close_old_connections()
+        try:
+            return function(*args)
+        finally:
+            close_old_connections()
+    return sync_to_async(wrapper)
+
+
+def _authenticated(cookies):
+    request = HttpRequest()
+    request.COOKIES = cookies
+    request.session = import_module(settings.SESSION_ENGINE).SessionStore(cookies.get(settings.SESSION_COOKIE_NAME))
+    return get_user(request).is_authenticated
+
+
+# fan-out
+
+class FeedClient:
+
+    def __init__(self, since):
+        self.last_id = since
+        self.pending = {}
+        self.max_pending = get_setting('MAX_PENDING', 500)
+        self.overflowed = False
+        self.ready = asyncio.Event()
+
+    def push(self, change_id, stock_id, quantity):
+        if change_id <= self.last_id:
+            return
+        if stock_id not in self.pending and len(self.pending) >= self.max_pending:
+            self.overflowed = True
+        self.pending[stock_id] = quantity
+        self.last_id = change_id
+        self.ready.set()
+
+    # the next event to send, all pending changes in one
+    def take(self):
+        self.ready.clear()
+        if self.overflowed:
+            return b'event: reset\ndata: {}\n\n'
+        pending, self.pending = self.pending, {}
+        return f'id: {self.last_id}\nevent: stock\ndata: {json.dumps(pending)}\n\n'.encode()
+
+
+class StockFeed:
+
+    def __init__(self):
+        self.clients = set()
+        self.recent = deque(maxlen=get_setting('BUFFER', 1000))
+        self.last_id = 0
+        self._poller = None
+
+    async def subscribe(self, since):
+        if not self.clients:
+            # the poller stopped with the last client, start again from the end
+            self.last_id = await _database(position)()
+            self.recent.clear()
+        # no position, or one from before the table was cleared: from now on
+        since = self.last_id if since is None or since > self.last_id else since
+        client = FeedClient(since)
+        if since < self.last_id and not (self.recent and self.recent[0][0] <= since + 1):
+            limit = client.max_pending
+            backlog = await _database(changes_since)(since, limit)
+            for change in backlog:
+                client.push(*change)
+            if len(backlog) == limit:
+                client.overflowed = True
+        # whatever the poller read meanwhile, older changes are skipped by push()
+        for change in self.recent:
+            client.push(*change)
+        self.clients.add(client)
+        if self._poller is None or self._poller.done():
+            self._poller = asyncio.ensure_future(self._poll())
+        return client
+
+    def unsubscribe(self, client):
+        self.clients.discard(client)
+
+    async def _poll(self):
+        interval = get_setting('POLL', 1.0)
+        limit = self.recent.maxlen
+        while self.clients:
+            try:
+                changes = await _database(changes_since)(self.last_id, limit)
+            except Exception:
+                logger.exception("Could not read the stock feed")
+                changes = []
+            for change in changes:
+                self.recent.append(change)
+                for client in self.clients:
+                    client.push(*change)
+            if changes:
+                self.last_id = changes[-1][0]
+            if len(changes) < limit:
+                await asyncio.sleep(interval)
+
+
+class StockFeedApp:
+    """
+    ASGI application serving the stock feed at STOCK_FEED['PATH'] to logged
+    in users, and passing every other request on to `application`.
+    """
+
+    def __init__(self, application):
+        self.application = application
+        self.path = get_setting('PATH', '/inventory/feed')
+        self.keepalive = get_setting('KEEPALIVE', 15)
+        self.feed = StockFeed()
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] != 'http' or scope['path'] != self.path:
+            return await self.application(scope, receive, send)
+
+        headers = dict(scope['headers'])
+        if not await _database(_authenticated)(parse_cookie(headers.get(b'cookie', b'').decode('latin-1'))):
+            await send({'type': 'http.response.start', 'status': 403, 'headers': [(b'content-type', b'text/plain')]})
+            await send({'type': 'http.response.body', 'body': b'Forbidden'})
+            return
+
+        await send({'type': 'http.response.start', 'status': 200, 'headers': [
+            (b'content-type', b'text/event-stream'),
+            (b'cache-control', b'no-cache'),
+            (b'x-accel-buffering', b'no'),
+        ]})
+        client = await self.feed.subscribe(self._since(scope, headers))
+        disconnected = asyncio.ensure_future(self._disconnected(receive))
+        try:
+            while True:
+                ready = asyncio.ensure_future(client.ready.wait())
+                done, _ = await asyncio.wait({disconnected, ready}, timeout=self.keepalive, return_when=asyncio.FIRST_COMPLETED)
+                if disconnected in done:
+                    ready.cancel()
+                    break
+                if ready in done:
+                    await send({'type': 'http.response.body', 'body': client.take(), 'more_body': True})
+                    if client.overflowed:
+                        break
+                else:
+                    ready.cancel()
+                    # a comment line keeps proxies from closing an idle stream
+                    await send({'type': 'http.response.body', 'body': b': keepalive\n\n', 'more_body': True})
+            if not disconnected.done():
+                await send({'type': 'http.response.body', 'body': b''})
+        finally:
+            disconnected.cancel()
+            self.feed.unsubscribe(client)
+
+    # Last-Event-ID when the EventSource reconnects, else ?since= from the page
+    @staticmethod
+    def _since(scope, headers):
+        value = headers.get(b'last-event-id', b'').decode('latin-1')
+        value = value or parse_qs(scope['query_string'].decode('latin-1')).get('since', [''])[0]
+        return int(value) if value.isdigit() else None
+
+    @staticmethod
+    async def _disconnected(receive):
+        while (await receive())['type'] != 'http.disconnect':
+            pass
@@ -0,0 +1,87 @@
+"""
+Demand forecasting for reorder points.
+
+Daily sold quantities of every stock are read in bulk and laid out as a
+(stocks x days) NumPy matrix, so the demand rate, its variability and the
+resulting reorder point are computed for all stocks at once. Changed reorder
+points are written back with one UPDATE per distinct value.
+"""
+
+from datetime import timedelta
+from statistics import NormalDist
+
+import numpy as np
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+
+from .cache import stock_cache
+from .models import Stock
+
+MOVING_AVERAGE = 'ma'
+EXPONENTIAL = 'ema'
+
+
+def daily_sales_matrix(stock_ids, days, end=None):
+    from transactions.models import SaleBill, SaleItem
+
+    end = (end or timezone.now()).replace(hour=0, minute=0, second=0, microsecond=0) + timedelta(days=1)
+    start = end - timedelta(days=days)
+
+    # the day of each bill is worked out once per bill, the items are then read as plain integers
+    bills = list(SaleBill.objects.filter(time__gte=start, time__lt=end).order_by('billno').values_list('billno', 'time'))
+    matrix = np.zeros((len(stock_ids), days))
+    if not bills:
+        return matrix
+    bill_ids = np.array([billno for billno, time in bills], dtype=np.int64)
+    bill_days = np.array([(time - start).days for billno, time in bills], dtype=np.int64)
+
+    items = np.array(
+        SaleItem.objects.filter(billno__time__gte=start, billno__time__lt=end).values_list('stock_id', 'billno_id', 'quantity'),
+        dtype=np.int64,
+    ).reshape(-1, 3)
+    row_index = np.minimum(np.searchsorted(stock_ids, items[:, 0]), len(stock_ids) - 1)
+    bill_index = np.minimum(np.searchsorted(bill_ids, items[:, 1]), len(bill_ids) - 1)
+    # skips deleted stocks and rows written after the bills were read
+    known = (stock_ids[row_index] == items[:, 0]) & (bill_ids[bill_index] == items[:, 1])
+    np.add.at(matrix, (row_index[known], bill_days[bill_index[known]]), items[known, 2])
+    return matrix
+
+
+def forecast_daily_demand(matrix, method=MOVING_AVERAGE, alpha=0.2):
+    if method == EXPONENTIAL:
+        # exponential smoothing written as a weighted sum over the window, the newest day weighs alpha
+        ages = np.arange(matrix.shape[1])[::-1]
+        weights = alpha * (1 - alpha) ** ages
+        return matrix @ (weights / weights.sum())
+    return matrix.mean(axis=1)
+
+
+def reorder_points(matrix, lead_time=7, service_level=0.95, method=MOVING_AVERAGE, alpha=0.2):
+    demand = forecast_daily_demand(matrix, method, alpha)
+    deviation = matrix.std(axis=1)
+    z = NormalDist().inv_cdf(service_level)
+    safety_stock = z * deviation * np.sqrt(lead_time)
+    return np.ceil(demand * lead_time + safety_stock).astype(np.int64), demand, safety_stock
+
+
+# recomputes and stores Stock.reorder_point for every stock, returns the number of stocks that changed
+def update_reorder_points(days=90, lead_time=7, service_level=0.95, method=MOVING_AVERAGE, alpha=0.2, batch_size=900):
+    # -1 for stocks never forecast, which no computed point equals
+    current = np.array(
+        Stock.objects.filter(is_deleted=False).order_by('id').values_list('id', Coalesce('reorder_point', -1)), dtype=np.int64,
+    ).reshape(-1, 2)
+    if not len(current):
+        return 0
+    stock_ids = current[:, 0]
+    matrix = daily_sales_matrix(stock_ids, days)
+    points = reorder_points(matrix, lead_time, service_level, method, alpha)[0]
+
+    changed = np.nonzero(points != current[:, 1])[0]
+    # reorder points take few distinct values, so one UPDATE per value (and id chunk) beats a CASE per row;
+    # each commits on its own, so each is stamped when it runs, for the sync clients (core/sync.py)
+    for point in np.unique(points[changed]):
+        ids = stock_ids[changed][points[changed] == point].tolist()
+        for start in range(0, len(ids), batch_size):
+            Stock.objects.filter(id__in=ids[start:start + batch_size]).update(reorder_point=int(point), updated_at=timezone.now())
+    stock_cache.invalidate_all()
+    return len(changed)
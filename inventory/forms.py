@@ -1,12 +1,19 @@
 from django import forms
+from django.db import transaction
+from django.db.models import F
+from django.db.models.signals import post_save
+from django.forms import BaseModelFormSet, modelformset_factory
+from django.utils import timezone
+from core.concurrency import ConflictError, VersionedFormMixin
 from .models import Stock
 
-class StockForm(forms.ModelForm):
+class StockForm(VersionedFormMixin, forms.ModelForm):
     def __init__(self, *args, **kwargs):
         super().__init__(*args, **kwargs)
         self.fields['name'].widget.attrs.update({'class': 'textinput form-control'})
         self.fields['quantity'].widget.attrs.update({'class': 'textinput form-control', 'min': '0'})
         self.fields['cost'].widget.attrs.update({'class': 'textinput form-control', 'min': '0'})
+        self.fields['sku'].widget.attrs.update({'class': 'textinput form-control'})
 
         # If you want to exclude reorder_point from the form, you can do:
         if 'reorder_point' in self.fields:
@@ -14,4 +21,112 @@ class StockForm(forms.ModelForm):
 
     class Meta:
         model = Stock
-        fields = ['name', 'quantity', 'cost', 'sub_category']
+        fields = ['name', 'quantity', 'cost', 'sub_category', 'sku', 'version']
+
+    # a blank SKU is stored as NULL, the unique index only covers stocks that have one
+    def clean_sku(self):
+        return self.cleaned_data.get('sku') or None
+
+
+# one variant (sub category) of a product on the editable table
+class VariantForm(VersionedFormMixin, forms.ModelForm):
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.fields['sub_category'].widget.attrs.update({'class': 'textinput form-control'})
+        for name in ('quantity', 'cost', 'reorder_point'):
+            self.fields[name].widget.attrs.update({'class': 'textinput form-control', 'min': '0'})
+
+    class Meta:
+        model = Stock
+        fields = ['sub_category', 'quantity', 'cost', 'reorder_point', 'version']
+
+
+class BaseVariantFormSet(BaseModelFormSet):
+    """
+    All variants of a product (the stocks sharing its name) edited at once, plus
+    a blank row for a new one. save() writes the changed variants with one
+    bulk_update and the new ones with one bulk_create, in one transaction.
+    """
+
+    def __init__(self, *args, product, **kwargs):
+        self.product = product
+        self.conflicts = []
+        kwargs.setdefault('queryset', Stock.objects.filter(name=product.name, is_deleted=False).order_by('sub_category', 'id'))
+        super().__init__(*args, **kwargs)
+
+    def _construct_form(self, i, **kwargs):
+        form = super()._construct_form(i, **kwargs)
+        form.instance.name = self.product.name
+        return form
+
+    # the id fields find their row among the variants read by the formset, not with a query each
+    def add_fields(self, form, index):
+        super().add_fields(form, index)
+        field = form.fields[self.model._meta.pk.name]
+
+        def to_python(value):
+            if value in field.empty_values:
+                return None
+            instance = self._existing_object(self.model._meta.pk.to_python(value))
+            if instance is None:
+                raise forms.ValidationError(field.error_messages['invalid_choice'], code='invalid_choice')
+            return instance
+        field.to_python = to_python
+
+    def changed_forms(self):
+        return [form for form in self.initial_forms if set(form.changed_data) - {'version'}]
+
+    def new_forms(self):
+        return [form for form in self.extra_forms if form.has_changed()]
+
+    # (name, sub_category) is unique, deleted variants included, but the forms do not have the name
+    def clean(self):
+        super().clean()
+        if any(self.errors):
+            return
+        kept = [form for form in self.initial_forms if form not in self.changed_forms()]
+        taken = set(
+            Stock.objects.filter(name=self.product.name).exclude(pk__in=[form.instance.pk for form in self.initial_forms])
+            .values_list('sub_category', flat=True)
+        ) | {form.instance.sub_category for form in kept}
+        for form in self.changed_forms() + self.new_forms():
+            sub_category = form.cleaned_data['sub_category']
+            if sub_category in taken:
+                raise forms.ValidationError(f"{self.product.name} already has a variant '{sub_category}' (it may have been deleted)")
+            taken.add(sub_category)
+
+    def save(self, commit=True):
+        changed, new = self.changed_forms(), self.new_forms()
+        now = timezone.now()
+        fields = sorted({name for form in changed for name in form.changed_data} - {'version'})
+        with transaction.atomic():
+            if changed:
+                expected = {form.instance.pk: form.cleaned_data['version'] for form in changed}
+                for form in changed:
+                    form.instance.version = F('version') + 1
+                    form.instance.updated_at = now
+                Stock.objects.bulk_update([form.instance for form in changed], fields + ['version', 'updated_at'])
+                # checked after the update rather than before, so on SQLite the transaction starts with a write
+                versions = dict(Stock.objects.filter(pk__in=list(expected)).values_list('pk', 'version'))
+                for form in changed:
+                    form.instance.version = versions.get(form.instance.pk)
+                self.conflicts = [form for form in changed if form.instance.version != expected[form.instance.pk] + 1]
+                if self.conflicts:
+                    raise ConflictError(f"{len(self.conflicts)} variants of {self.product.name} were changed by someone else")
+
+            created = []
+            if new:
+                Stock.objects.bulk_create([form.instance for form in new])
+                # SQLite does not return the ids of bulk inserted rows
+                created = list(Stock.objects.filter(name=self.product.name, sub_category__in=[form.instance.sub_category for form in new]))
+
+            # bulk writes send no signals: the caches, the audit trail, the stock feed and the reorder check get them here
+            for form in changed:
+                update_fields = frozenset(form.changed_data) | {'version', 'updated_at'}
+                post_save.send(sender=Stock, instance=form.instance, created=False, update_fields=update_fields, raw=False, using='default')
+            for stock in created:
+                post_save.send(sender=Stock, instance=stock, created=True, update_fields=None, raw=False, using='default')
+        return [form.instance for form in changed] + created
+
+
+VariantFormset = modelformset_factory(Stock, form=VariantForm, formset=BaseVariantFormSet, extra=1)
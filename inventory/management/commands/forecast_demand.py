@@ -0,0 +1,27 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from inventory import forecasting
+
+
+class Command(BaseCommand):
+    help = 'Forecasts daily demand from recent sales and stores a reorder point for every stock. Meant to run nightly.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--days', type=int, default=90, help='days of sales history to use')
+        parser.add_argument('--lead-time', type=int, default=7, help='days between ordering and receiving stock')
+        parser.add_argument('--service-level', type=float, default=0.95, help='chance of not running out during the lead time')
+        parser.add_argument('--method', choices=[forecasting.MOVING_AVERAGE, forecasting.EXPONENTIAL], default=forecasting.MOVING_AVERAGE)
+        parser.add_argument('--alpha', type=float, default=0.2, help='smoothing factor for --method ema')
+
+    def handle(self, *args, **options):
+        start = time.perf_counter()
+        changed = forecasting.update_reorder_points(
+            days=options['days'],
+            lead_time=options['lead_time'],
+            service_level=options['service_level'],
+            method=options['method'],
+            alpha=options['alpha'],
+        )
+        self.stdout.write(f"Updated {changed} reorder points in {time.perf_counter() - start:.2f} s")
@@ -0,0 +1,17 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from inventory import analytics
+
+
+class Command(BaseCommand):
+    help = 'Rolls up sale and purchase items added since the last run into the monthly analytics tables.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=20000, help='items rolled up per transaction')
+
+    def handle(self, *args, **options):
+        start = time.perf_counter()
+        count = analytics.refresh(batch_size=options['batch_size'])
+        self.stdout.write(f"Rolled up {count} items in {time.perf_counter() - start:.2f} s")
@@ -0,0 +1,41 @@
+from datetime import datetime, time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+
+from inventory import valuation
+
+
+def parse_date(value, end_of_day=False):
+    try:
+        day = datetime.strptime(value, '%Y-%m-%d').date()
+    except ValueError:
+        raise CommandError(f"Dates must look like YYYY-MM-DD, got '{value}'")
+    return timezone.make_aware(datetime.combine(day, time.max if end_of_day else time.min))
+
+
+class Command(BaseCommand):
+    help = 'Reports the inventory value and cost of goods sold, or rebuilds the valuation from the bill history.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--as-of', help='value the inventory at the end of this day (YYYY-MM-DD), default now')
+        parser.add_argument('--cogs-from', help='start of the cost of goods sold period (YYYY-MM-DD)')
+        parser.add_argument('--cogs-to', help='end of the cost of goods sold period (YYYY-MM-DD)')
+        parser.add_argument('--rebuild', action='store_true', help='drop all cost layers and movements and replay every purchase and sale')
+        parser.add_argument('--per-stock', action='store_true', help='list the value of every stock')
+
+    def handle(self, *args, **options):
+        if options['rebuild']:
+            count = valuation.rebuild()
+            self.stdout.write(f"Replayed {count} purchase and sale items ({valuation.get_method()})")
+
+        as_of = parse_date(options['as_of'], end_of_day=True) if options['as_of'] else None
+        if options['per_stock']:
+            for stock in valuation.valuation(as_of).exclude(balance_quantity=None).order_by('name', 'sub_category'):
+                self.stdout.write(f"{str(stock):40} {stock.balance_quantity:>10} {stock.balance_value:>14}")
+        self.stdout.write(f"Inventory value: {valuation.inventory_value(as_of)}")
+
+        if options['cogs_from'] or options['cogs_to']:
+            start = parse_date(options['cogs_from']) if options['cogs_from'] else None
+            end = parse_date(options['cogs_to'], end_of_day=True) if options['cogs_to'] else None
+            self.stdout.write(f"Cost of goods sold: {valuation.cost_of_goods_sold(start, end)}")
@@ -0,0 +1,87 @@
+import random
+import time
+from datetime import timedelta
+from decimal import Decimal
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.utils import timezone
+
+from inventory import valuation
+from inventory.models import Stock, StockMovement
+
+
+class Rollback(Exception):
+    pass
+
+
+class Command(BaseCommand):
+    help = 'Benchmarks the valuation engine on synthetic data. Everything runs in a transaction that is rolled back.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--stocks', type=int, default=1000)
+        parser.add_argument('--movements', type=int, default=1000000, help='historical movements bulk loaded before timing')
+        parser.add_argument('--incremental', type=int, default=2000, help='purchases and sales recorded through the engine')
+        parser.add_argument('--seed', type=int, default=42)
+
+    def handle(self, *args, **options):
+        random.seed(options['seed'])
+        try:
+            with transaction.atomic():
+                self.run(options)
+                raise Rollback
+        except Rollback:
+            pass
+
+    def timed(self, label, func, repeat=1):
+        start = time.perf_counter()
+        for _ in range(repeat):
+            result = func()
+        elapsed = (time.perf_counter() - start) / repeat
+        self.stdout.write(f"{label:45} {elapsed * 1000:10.2f} ms")
+        return result
+
+    def run(self, options):
+        stocks = [Stock(name=f'bench-{i}', sub_category='', quantity=0, cost=Decimal('10.00')) for i in range(options['stocks'])]
+        Stock.objects.bulk_create(stocks, batch_size=1000)
+        stock_ids = list(Stock.objects.filter(name__startswith='bench-').values_list('id', flat=True))
+
+        # history with precomputed running balances, spread over two years
+        start = time.perf_counter()
+        now = timezone.now()
+        balances = {stock_id: (0, Decimal('0')) for stock_id in stock_ids}
+        step = timedelta(days=730) / max(options['movements'], 1)
+        batch = []
+        for n in range(options['movements']):
+            stock_id = random.choice(stock_ids)
+            quantity, value = balances[stock_id]
+            if quantity > 5 and random.random() < 0.6:
+                moved = -random.randint(1, min(quantity, 20))
+                moved_value = (value / quantity * moved).quantize(valuation.CENT)
+                kind = StockMovement.SALE
+            else:
+                moved = random.randint(1, 50)
+                moved_value = Decimal(random.randint(500, 2000)) / 100 * moved
+                kind = StockMovement.PURCHASE
+            balances[stock_id] = (quantity + moved, value + moved_value)
+            batch.append(StockMovement(
+                stock_id=stock_id, time=now - timedelta(days=730) + step * n, kind=kind, quantity=moved, value=moved_value,
+                balance_quantity=quantity + moved, balance_value=value + moved_value,
+            ))
+            if len(batch) == 10000:
+                StockMovement.objects.bulk_create(batch)
+                batch = []
+        StockMovement.objects.bulk_create(batch)
+        self.stdout.write(f"{'loaded %d movements' % options['movements']:45} {(time.perf_counter() - start):10.2f} s")
+
+        # incremental path, one purchase and one sale per iteration
+        def record():
+            stock_id = random.choice(stock_ids)
+            valuation.record_receipt(stock_id, 10, Decimal('12.50'))
+            valuation.record_issue(stock_id, 5)
+        self.timed(f"record purchase + sale ({valuation.get_method()})", record, repeat=max(options['incremental'] // 2, 1))
+
+        # snapshots
+        self.timed('inventory value now', valuation.inventory_value, repeat=5)
+        self.timed('inventory value one year ago', lambda: valuation.inventory_value(now - timedelta(days=365)), repeat=5)
+        self.timed('cost of goods sold, last 90 days', lambda: valuation.cost_of_goods_sold(now - timedelta(days=90), now), repeat=5)
@@ -0,0 +1,31 @@
+# Generated by Django 3.0.7 on 2026-10-19 16:12
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    initial = True
+
+    dependencies = [
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Stock',
+            fields=[
+                ('id', models.AutoField(primary_key=True, serialize=False)),
+                ('name', models.CharField(max_length=30)),
+                ('sub_category', models.CharField(blank=True, max_length=30)),
+                ('quantity', models.IntegerField(default=1)),
+                ('cost', models.DecimalField(decimal_places=2, max_digits=10)),
+                ('is_deleted', models.BooleanField(default=False)),
+                ('is_selected', models.BooleanField(default=False)),
+                ('total_sales_value', models.IntegerField(default=0)),
+                ('reorder_point', models.IntegerField(default=0)),
+            ],
+            options={
+                'unique_together': {('name', 'sub_category')},
+            },
+        ),
+    ]
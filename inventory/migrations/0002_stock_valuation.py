@@ -0,0 +1,55 @@
+# Generated by Django 3.0.7 on 2026-10-19 16:18
+
+from django.db import migrations, models
+import django.db.models.deletion
+import django.utils.timezone
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('transactions', '0006_billdetails_one_to_one'),
+        ('inventory', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='StockMovement',
+            fields=[
+                ('id', models.AutoField(primary_key=True, serialize=False)),
+                ('time', models.DateTimeField(default=django.utils.timezone.now)),
+                ('kind', models.CharField(choices=[('purchase', 'Purchase'), ('sale', 'Sale'), ('purchase_reversal', 'Purchase deleted'), ('sale_reversal', 'Sale deleted')], max_length=20)),
+                ('quantity', models.IntegerField()),
+                ('value', models.DecimalField(decimal_places=2, max_digits=16)),
+                ('balance_quantity', models.IntegerField()),
+                ('balance_value', models.DecimalField(decimal_places=2, max_digits=16)),
+                ('purchase_item', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='movements', to='transactions.PurchaseItem')),
+                ('sale_item', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='movements', to='transactions.SaleItem')),
+                ('stock', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='movements', to='inventory.Stock')),
+            ],
+        ),
+        migrations.CreateModel(
+            name='CostLayer',
+            fields=[
+                ('id', models.AutoField(primary_key=True, serialize=False)),
+                ('time', models.DateTimeField(default=django.utils.timezone.now)),
+                ('quantity', models.IntegerField()),
+                ('remaining', models.IntegerField()),
+                ('unit_cost', models.DecimalField(decimal_places=4, max_digits=14)),
+                ('purchase_item', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='costlayers', to='transactions.PurchaseItem')),
+                ('stock', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='costlayers', to='inventory.Stock')),
+            ],
+        ),
+        migrations.AddIndex(
+            model_name='stockmovement',
+            index=models.Index(fields=['stock', 'time', 'id'], name='inventory_s_stock_i_d07d0c_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='stockmovement',
+            index=models.Index(fields=['kind', 'time'], name='inventory_s_kind_706a5f_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='costlayer',
+            index=models.Index(fields=['stock', 'remaining', 'time'], name='inventory_c_stock_i_84b0c6_idx'),
+        ),
+    ]
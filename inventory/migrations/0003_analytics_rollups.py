@@ -0,0 +1,41 @@
+# Generated by Django 3.0.7 on 2026-10-19 16:23
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('inventory', '0002_stock_valuation'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='RollupWatermark',
+            fields=[
+                ('name', models.CharField(max_length=20, primary_key=True, serialize=False)),
+                ('last_id', models.IntegerField(default=0)),
+            ],
+        ),
+        migrations.CreateModel(
+            name='StockMonthlyRollup',
+            fields=[
+                ('id', models.AutoField(primary_key=True, serialize=False)),
+                ('month', models.DateField()),
+                ('sold_quantity', models.IntegerField(default=0)),
+                ('sold_value', models.IntegerField(default=0)),
+                ('purchased_quantity', models.IntegerField(default=0)),
+                ('purchased_value', models.IntegerField(default=0)),
+                ('stock', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='rollups', to='inventory.Stock')),
+            ],
+        ),
+        migrations.AddIndex(
+            model_name='stockmonthlyrollup',
+            index=models.Index(fields=['month', 'stock'], name='inventory_s_month_456eca_idx'),
+        ),
+        migrations.AlterUniqueTogether(
+            name='stockmonthlyrollup',
+            unique_together={('stock', 'month')},
+        ),
+    ]
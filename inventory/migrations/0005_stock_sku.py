@@ -0,0 +1,18 @@
+# Generated by Django 3.0.7 on 2026-10-19 17:07
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('inventory', '0004_stock_version'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='stock',
+            name='sku',
+            field=models.CharField(blank=True, max_length=32, null=True, unique=True, verbose_name='SKU / barcode'),
+        ),
+    ]
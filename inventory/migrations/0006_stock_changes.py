@@ -0,0 +1,24 @@
+# Generated by Django 3.0.7 on 2026-10-19 17:15
+
+from django.db import migrations, models
+import django.db.models.deletion
+import django.utils.timezone
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('inventory', '0005_stock_sku'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='StockChange',
+            fields=[
+                ('id', models.AutoField(primary_key=True, serialize=False)),
+                ('quantity', models.IntegerField()),
+                ('time', models.DateTimeField(default=django.utils.timezone.now)),
+                ('stock', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='changes', to='inventory.Stock')),
+            ],
+        ),
+    ]
@@ -0,0 +1,28 @@
+from django.db import migrations, models
+
+
+def unset_zero_reorder_points(apps, schema_editor):
+    Stock = apps.get_model('inventory', 'Stock')
+    # 0 used to stand for "not forecast", forecast_demand now stores a real 0 for stocks without demand
+    Stock.objects.filter(reorder_point=0).update(reorder_point=None)
+
+
+def zero_unset_reorder_points(apps, schema_editor):
+    Stock = apps.get_model('inventory', 'Stock')
+    Stock.objects.filter(reorder_point__isnull=True).update(reorder_point=0)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('inventory', '0007_stock_updated_at'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='stock',
+            name='reorder_point',
+            field=models.IntegerField(blank=True, null=True),
+        ),
+        migrations.RunPython(unset_zero_reorder_points, zero_unset_reorder_points),
+    ]
@@ -0,0 +1,43 @@
+from django.db import migrations, models
+
+
+def flag_rolled_up_items(apps, schema_editor):
+    RollupWatermark = apps.get_model('inventory', 'RollupWatermark')
+    for name, model in (('sale', 'SaleItem'), ('purchase', 'PurchaseItem')):
+        last_id = RollupWatermark.objects.filter(name=name).values_list('last_id', flat=True).first() or 0
+        apps.get_model('transactions', model).objects.filter(id__lte=last_id).update(rolled_up=True)
+
+
+def watermark_from_flags(apps, schema_editor):
+    RollupWatermark = apps.get_model('inventory', 'RollupWatermark')
+    for name, model in (('sale', 'SaleItem'), ('purchase', 'PurchaseItem')):
+        # the watermark can only stand for the items before the first one not rolled up
+        items = apps.get_model('transactions', model).objects
+        first_pending = items.filter(rolled_up=False).order_by('id').values_list('id', flat=True).first()
+        last_id = first_pending - 1 if first_pending is not None else items.order_by('-id').values_list('id', flat=True).first() or 0
+        RollupWatermark.objects.update_or_create(name=name, defaults={'last_id': last_id})
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('inventory', '0008_stock_reorder_point_null'),
+        ('transactions', '0013_items_rolled_up'),
+    ]
+
+    operations = [
+        migrations.RunPython(flag_rolled_up_items, watermark_from_flags),
+        migrations.RemoveField(
+            model_name='rollupwatermark',
+            name='last_id',
+        ),
+        migrations.AddField(
+            model_name='rollupwatermark',
+            name='refreshed_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.RenameModel(
+            old_name='RollupWatermark',
+            new_name='RollupLock',
+        ),
+    ]
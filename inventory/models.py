@@ -1,6 +1,11 @@
 from django.db import models
+from django.db.models import F
+from django.db.models.signals import post_save
+from django.utils import timezone
 
-class Stock(models.Model):
+from core.concurrency import VersionedModel
+
+class Stock(VersionedModel):
     id = models.AutoField(primary_key=True)
     name = models.CharField(max_length=30)
     sub_category = models.CharField(max_length=30, blank=True)  # Allow blank for non-mandatory sub_category
@@ -10,10 +15,112 @@ class Stock(models.Model):
     is_selected = models.BooleanField(default=False)
     total_sales_value = models.IntegerField(default=0) 
 
-    reorder_point = models.IntegerField(default=0)
+    reorder_point = models.IntegerField(blank=True, null=True)     # set by forecast_demand, NULL until then (a fixed threshold applies)
+    sku = models.CharField('SKU / barcode', max_length=32, unique=True, blank=True, null=True)   # what the till scanner reads, see inventory/scan.py
+    updated_at = models.DateTimeField(auto_now=True)    # read by delta sync (core/sync.py), bulk updates set it themselves
 
     class Meta:
         unique_together = ('name', 'sub_category')
+        indexes = [
+            models.Index(fields=['updated_at', 'id']),
+        ]
 
     def __str__(self):
         return f"{self.name} - {self.sub_category}" if self.sub_category else self.name
+
+    # stock movements from bills are applied in the database, so concurrent bills never lose an update;
+    # post_save is still sent for the stock cache and the reorder check
+    def adjust_quantity(self, delta):
+        Stock.objects.filter(pk=self.pk).update(quantity=F('quantity') + delta, version=F('version') + 1, updated_at=timezone.now())
+        self.refresh_from_db(fields=['quantity', 'version'])
+        post_save.send(sender=Stock, instance=self, created=False, update_fields=frozenset(['quantity', 'version']), raw=False, using='default')
+
+
+# cost layers and movements kept by the valuation engine (inventory/valuation.py)
+class CostLayer(models.Model):
+    id = models.AutoField(primary_key=True)
+    stock = models.ForeignKey(Stock, on_delete=models.CASCADE, related_name='costlayers')
+    time = models.DateTimeField(default=timezone.now)
+    purchase_item = models.ForeignKey('transactions.PurchaseItem', on_delete=models.SET_NULL, blank=True, null=True, related_name='costlayers')
+    quantity = models.IntegerField()
+    remaining = models.IntegerField()                   # units of this layer not yet sold, FIFO consumes the oldest first
+    unit_cost = models.DecimalField(max_digits=14, decimal_places=4)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['stock', 'remaining', 'time']),
+        ]
+
+    def __str__(self):
+        return f"{self.stock} - {self.remaining}/{self.quantity} @ {self.unit_cost}"
+
+class StockMovement(models.Model):
+    PURCHASE = 'purchase'
+    SALE = 'sale'
+    PURCHASE_REVERSAL = 'purchase_reversal'
+    SALE_REVERSAL = 'sale_reversal'
+    KIND_CHOICES = [
+        (PURCHASE, 'Purchase'),
+        (SALE, 'Sale'),
+        (PURCHASE_REVERSAL, 'Purchase deleted'),
+        (SALE_REVERSAL, 'Sale deleted'),
+    ]
+
+    id = models.AutoField(primary_key=True)
+    stock = models.ForeignKey(Stock, on_delete=models.CASCADE, related_name='movements')
+    time = models.DateTimeField(default=timezone.now)
+    kind = models.CharField(max_length=20, choices=KIND_CHOICES)
+    quantity = models.IntegerField()                                                # signed, negative for stock going out
+    value = models.DecimalField(max_digits=16, decimal_places=2)                    # signed, for sales this is minus the cost of goods sold
+    balance_quantity = models.IntegerField()                                        # quantity on hand after this movement
+    balance_value = models.DecimalField(max_digits=16, decimal_places=2)            # inventory value after this movement
+    purchase_item = models.ForeignKey('transactions.PurchaseItem', on_delete=models.SET_NULL, blank=True, null=True, related_name='movements')
+    sale_item = models.ForeignKey('transactions.SaleItem', on_delete=models.SET_NULL, blank=True, null=True, related_name='movements')
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['stock', 'time', 'id']),
+            models.Index(fields=['kind', 'time']),
+        ]
+
+    def __str__(self):
+        return f"{self.kind} {self.quantity} x {self.stock}"
+
+
+# per stock and month totals of sales and purchases, kept up to date by inventory/analytics.py
+class StockMonthlyRollup(models.Model):
+    id = models.AutoField(primary_key=True)
+    stock = models.ForeignKey(Stock, on_delete=models.CASCADE, related_name='rollups')
+    month = models.DateField()                          # first day of the month
+    sold_quantity = models.IntegerField(default=0)
+    sold_value = models.IntegerField(default=0)
+    purchased_quantity = models.IntegerField(default=0)
+    purchased_value = models.IntegerField(default=0)
+
+    class Meta:
+        unique_together = ('stock', 'month')
+        indexes = [
+            models.Index(fields=['month', 'stock']),
+        ]
+
+    def __str__(self):
+        return f"{self.stock} - {self.month:%b %Y}"
+
+# one row per item table (sale, purchase), updated first by a refresh or a forget of its rollups so they run one at a time
+class RollupLock(models.Model):
+    name = models.CharField(max_length=20, primary_key=True)
+    refreshed_at = models.DateTimeField(blank=True, null=True)
+
+    def __str__(self):
+        return self.name
+
+
+# quantity changes of stocks in the order they were made, the feed pushed to open pages (inventory/feed.py)
+class StockChange(models.Model):
+    id = models.AutoField(primary_key=True)
+    stock = models.ForeignKey(Stock, on_delete=models.CASCADE, related_name='changes')
+    quantity = models.IntegerField()                    # the quantity after the change
+    time = models.DateTimeField(default=timezone.now)
+
+    def __str__(self):
+        return f"{self.stock}: {self.quantity}"
@@ -0,0 +1,58 @@
+"""
+Scan index: SKU / barcode -> stock, held in memory by every worker.
+
+The whole map is read with one query and then answers scans from a dict. It
+is only reloaded when a stock's SKU, name, cost or deleted flag changes, which
+writes a new version token (never expiring, see core/lrucache.py) to the shared
+'default' cache; the quantity changes every sale makes leave it alone, unlike
+the stock LRU cache.
+"""
+
+import threading
+import uuid
+from collections import namedtuple
+
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models.signals import post_save, post_delete
+
+from .models import Stock
+
+ScannedStock = namedtuple('ScannedStock', 'id name sub_category cost sku')
+
+
+class ScanIndex:
+    fields = frozenset(['sku', 'name', 'sub_category', 'cost', 'is_deleted'])
+    version_key = 'scan-index-version'
+
+    def __init__(self):
+        self._map = {}
+        self._version = None
+        self._lock = threading.Lock()
+        post_save.connect(self._changed, sender=Stock, weak=False)
+        post_delete.connect(self._changed, sender=Stock, weak=False)
+
+    def lookup(self, code):
+        version = cache.get(self.version_key, 0)
+        if version != self._version:
+            self._load(version)
+        return self._map.get(code)
+
+    def _load(self, version):
+        with self._lock:
+            if version == self._version:
+                return
+            rows = Stock.objects.filter(is_deleted=False, sku__isnull=False).values_list('id', 'name', 'sub_category', 'cost', 'sku')
+            self._map = {row[4]: ScannedStock(*row) for row in rows}
+            self._version = version
+
+    def _changed(self, sender, instance, update_fields=None, **kwargs):
+        if update_fields is None or self.fields & set(update_fields):
+            # after the commit, so no worker reloads the map before the change is visible to it
+            transaction.on_commit(self._bump)
+
+    def _bump(self):
+        cache.set(self.version_key, uuid.uuid4().hex, None)
+
+
+scan_index = ScanIndex()
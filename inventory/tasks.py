@@ -0,0 +1,15 @@
+from jobs.registry import task
+
+
+@task('forecast_demand', queue='heavy', max_attempts=1)
+def forecast_demand(job, **options):
+    from . import forecasting
+
+    return {'changed': forecasting.update_reorder_points(**options)}
+
+
+@task('refresh_analytics', queue='heavy', max_attempts=1)
+def refresh_analytics(job):
+    from . import analytics
+
+    return {'rolled_up': analytics.refresh()}
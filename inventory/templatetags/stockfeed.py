@@ -0,0 +1,17 @@
+from django import template
+from django.templatetags.static import static
+from django.utils.html import format_html
+
+from inventory.feed import get_setting, position
+
+register = template.Library()
+
+
+# {% stock_feed %} keeps the elements marked data-stock-quantity="<stock id>" up to date (inventory/feed.py),
+# a 'stockchange' event on document carries each batch of {stock id: quantity}
+@register.simple_tag
+def stock_feed():
+    return format_html(
+        '<script src="{}" data-url="{}" data-since="{}"></script>',
+        static('js/stockfeed.js'), get_setting('PATH', '/inventory/feed'), position(),
+    )
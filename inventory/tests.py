@@ -1,3 +1,504 @@
-from django.test import TestCase
+import asyncio
+import json
+from datetime import timedelta
+from decimal import Decimal
+from unittest import mock
 
-# Create your tests here.
+import numpy as np
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.db import transaction
+from django.test import TestCase, TransactionTestCase, override_settings
+from django.urls import reverse
+from django.utils import timezone
+
+from core.concurrency import VersionedModel
+
+from . import analytics, feed, forecasting, valuation
+from .cache import stock_cache
+from .scan import scan_index
+from .models import CostLayer, Stock, StockChange, StockMonthlyRollup, StockMovement
+
+
+class ValuationTestMixin:
+    def setUp(self):
+        self.stock = Stock.objects.create(name='Widget', quantity=0, cost=Decimal('9.00'))
+        self.start = timezone.now() - timedelta(days=1)
+
+    def receive(self, *lots):
+        # (quantity, unit cost) lots received a minute apart, oldest first
+        for minute, (quantity, unit_cost) in enumerate(lots):
+            valuation.record_receipt(self.stock.pk, quantity, Decimal(unit_cost), time=self.start + timedelta(minutes=minute))
+
+    def issue(self, quantity):
+        return -valuation.record_issue(self.stock.pk, quantity).value
+
+
+@override_settings(INVENTORY_VALUATION_METHOD=valuation.FIFO)
+class FifoValuationTest(ValuationTestMixin, TestCase):
+    def test_sale_consumes_oldest_layers_first(self):
+        self.receive((10, '1.00'), (10, '2.00'), (10, '3.00'))
+        self.assertEqual(self.issue(15), Decimal('20.00'))
+        remaining = list(CostLayer.objects.filter(stock=self.stock).order_by('time').values_list('remaining', flat=True))
+        self.assertEqual(remaining, [0, 5, 10])
+        self.assertEqual(valuation.get_balance(self.stock.pk), (15, Decimal('40.00')))
+
+    def test_sale_past_the_last_layer_uses_the_list_cost(self):
+        self.receive((2, '1.00'))
+        self.assertEqual(self.issue(5), Decimal('29.00'))
+        self.assertEqual(valuation.get_balance(self.stock.pk), (-3, Decimal('-27.00')))
+
+    def test_sale_reads_further_layer_windows(self):
+        CostLayer.objects.bulk_create([
+            CostLayer(stock=self.stock, time=self.start + timedelta(seconds=i), quantity=1, remaining=1, unit_cost=Decimal(1 + i % 2))
+            for i in range(1201)
+        ])
+        self.assertEqual(self.issue(1203), Decimal('1801.00') + Decimal('18.00'))
+        self.assertFalse(CostLayer.objects.filter(stock=self.stock, remaining__gt=0).exists())
+
+    def test_batched_sale_issues_match_single_issues(self):
+        from transactions.models import Customer, SaleBill, SaleItem
+
+        self.receive((3, '1.00'), (3, '2.00'))
+        bill = SaleBill.objects.create(customer=Customer.objects.create(name='A', phone='1'))
+        items = [SaleItem.objects.create(billno=bill, stock=self.stock, quantity=quantity) for quantity in (2, 2, 2)]
+        movements = valuation.record_sale_issues(items)
+        self.assertEqual([-movement.value for movement in movements], [Decimal('2.00'), Decimal('3.00'), Decimal('4.00')])
+        self.assertEqual(valuation.cost_of_goods_sold(), Decimal('9.00'))
+
+    def test_deleted_purchase_takes_its_own_layer_out(self):
+        from transactions.models import PurchaseBill, PurchaseItem, Supplier
+
+        self.receive((10, '1.00'))
+        bill = PurchaseBill.objects.create(supplier=Supplier.objects.create(name='S', phone='1'))
+        item = PurchaseItem.objects.create(billno=bill, stock=self.stock, quantity=4, perprice=5)
+        valuation.record_receipt(self.stock.pk, 4, Decimal('5.00'), purchase_item=item)
+        movement = valuation.reverse_purchase_item(item)
+        self.assertEqual(movement.value, Decimal('-20.00'))
+        self.assertEqual(valuation.inventory_value(), Decimal('10.00'))
+
+
+@override_settings(INVENTORY_VALUATION_METHOD=valuation.AVERAGE)
+class AverageValuationTest(ValuationTestMixin, TestCase):
+    def test_sale_costs_the_average_of_the_layers(self):
+        self.receive((10, '1.00'), (10, '3.00'))
+        self.assertEqual(self.issue(5), Decimal('10.00'))
+        self.assertFalse(CostLayer.objects.exists())
+
+    def test_selling_out_leaves_no_residue(self):
+        self.receive((1, '1.00'), (2, '1.00'))
+        self.issue(1)
+        self.issue(2)
+        self.assertEqual(valuation.get_balance(self.stock.pk), (0, Decimal('0.00')))
+
+    def test_value_as_of_a_date(self):
+        self.receive((10, '2.00'))
+        valuation.record_issue(self.stock.pk, 4, time=self.start + timedelta(hours=1))
+        self.assertEqual(valuation.inventory_value(self.start + timedelta(minutes=30)), Decimal('20.00'))
+        self.assertEqual(valuation.inventory_value(), Decimal('12.00'))
+        self.assertEqual(
+            valuation.cost_of_goods_sold(start=self.start + timedelta(minutes=30)), Decimal('8.00'),
+        )
+        self.assertEqual(StockMovement.objects.filter(kind=StockMovement.SALE).count(), 1)
+
+
+class StockCacheTest(TransactionTestCase):
+    def setUp(self):
+        stock_cache.clear()
+        stock_cache._version_checked = None
+        self.stock = Stock.objects.create(name='Widget', quantity=5, cost=Decimal('2.00'))
+
+    def test_size_is_bounded(self):
+        stocks = [Stock.objects.create(name=f"Part {number}", quantity=1, cost=Decimal('2.00')) for number in range(3)]
+        with mock.patch.object(stock_cache, 'maxsize', 4):
+            evictions = stock_cache.evictions
+            for stock in stocks:
+                stock_cache.get(stock.pk)
+            # every row is kept under its pk and its natural key, the oldest row went first
+            self.assertEqual(stock_cache.stats()['size'], 4)
+            self.assertEqual(stock_cache.evictions - evictions, 2)
+            with self.assertNumQueries(0):
+                stock_cache.get(stocks[2].pk)
+                stock_cache.get_by_key('Part 2', stocks[2].sub_category)
+            with self.assertNumQueries(1):
+                stock_cache.get(stocks[0].pk)
+
+    def test_change_is_seen_once_committed(self):
+        stock_cache.get(self.stock.pk)
+        version = cache.get(stock_cache.version_key)
+        with transaction.atomic():
+            self.stock.name = 'Gadget'
+            self.stock.save()
+            self.assertEqual(cache.get(stock_cache.version_key), version)
+        self.assertNotEqual(cache.get(stock_cache.version_key), version)
+        self.assertEqual(stock_cache.get(self.stock.pk).name, 'Gadget')
+
+    def test_version_token_is_read_at_most_once_per_interval(self):
+        stock_cache.get(self.stock.pk)
+        # another worker renames the stock and replaces the token
+        Stock.objects.filter(pk=self.stock.pk).update(name='Gadget')
+        cache.set(stock_cache.version_key, 'other-worker', None)
+        with mock.patch('core.lrucache.cache.get') as read, self.assertNumQueries(0):
+            self.assertEqual(stock_cache.get(self.stock.pk).name, 'Widget')
+        read.assert_not_called()
+
+        stock_cache._version_checked -= stock_cache.version_check
+        self.assertEqual(stock_cache.get(self.stock.pk).name, 'Gadget')
+
+
+class FeedClientTest(TestCase):
+    def event(self, client):
+        lines = dict(line.split(': ', 1) for line in client.take().decode().strip().split('\n'))
+        return lines['event'], lines.get('id'), json.loads(lines['data'])
+
+    def test_changes_to_a_stock_go_out_as_one(self):
+        client = feed.FeedClient(since=10)
+        client.push(10, 1, 99)                          # already seen
+        client.push(11, 1, 5)
+        client.push(12, 2, 9)
+        client.push(13, 1, 4)
+        self.assertTrue(client.ready.is_set())
+        self.assertEqual(self.event(client), ('stock', '13', {'1': 4, '2': 9}))
+        self.assertFalse(client.ready.is_set())
+        client.push(14, 2, 8)
+        self.assertEqual(self.event(client), ('stock', '14', {'2': 8}))
+
+    @override_settings(STOCK_FEED={'MAX_PENDING': 2})
+    def test_client_too_far_behind_is_reset(self):
+        client = feed.FeedClient(since=0)
+        client.push(1, 1, 5)
+        client.push(2, 2, 5)
+        client.push(3, 1, 6)
+        self.assertFalse(client.overflowed)
+        client.push(4, 3, 5)
+        self.assertTrue(client.overflowed)
+        self.assertEqual(self.event(client), ('reset', None, {}))
+
+
+class FeedTest(TransactionTestCase):
+    def setUp(self):
+        self.stock = Stock.objects.create(name='Widget', quantity=5, cost=Decimal('2.00'))
+
+    def test_quantity_changes_are_recorded(self):
+        self.stock.adjust_quantity(-2)
+        self.stock.name = 'Gadget'
+        self.stock.save(update_fields=['name'])
+        self.assertEqual(list(StockChange.objects.order_by('id').values_list('stock_id', 'quantity')), [(self.stock.pk, 5), (self.stock.pk, 3)])
+
+    def test_reconnecting_page_catches_up_from_the_table(self):
+        since = feed.position()
+        self.stock.adjust_quantity(-2)
+        self.stock.adjust_quantity(-1)
+
+        async def subscribe():
+            stock_feed = feed.StockFeed()
+            client = await stock_feed.subscribe(since)
+            stock_feed.unsubscribe(client)
+            return client
+
+        client = asyncio.run(subscribe())
+        self.assertEqual(client.pending, {self.stock.pk: 2})
+        self.assertEqual(client.last_id, feed.position())
+
+
+class ScanIndexTest(TransactionTestCase):
+    def setUp(self):
+        scan_index._version = None
+        self.stock = Stock.objects.create(name='Widget', sub_category='Blue', sku='4006381333931', quantity=5, cost=Decimal('7.00'))
+
+    def test_code_is_looked_up_in_memory(self):
+        self.assertEqual(scan_index.lookup('4006381333931').id, self.stock.pk)
+        with self.assertNumQueries(0):
+            self.assertEqual(scan_index.lookup('4006381333931').name, 'Widget')
+            self.assertIsNone(scan_index.lookup('0000000000000'))
+
+    def test_quantity_changes_keep_the_index(self):
+        scan_index.lookup('4006381333931')
+        self.stock.adjust_quantity(-2)
+        with self.assertNumQueries(0):
+            scan_index.lookup('4006381333931')
+
+    def test_index_is_reloaded_after_a_committed_code_change(self):
+        scan_index.lookup('4006381333931')
+        with transaction.atomic():
+            self.stock.sku = '9780201379624'
+            self.stock.save()
+            self.assertIsNotNone(scan_index.lookup('4006381333931'))
+        self.assertIsNone(scan_index.lookup('4006381333931'))
+        self.assertEqual(scan_index.lookup('9780201379624').id, self.stock.pk)
+
+        self.stock.is_deleted = True
+        self.stock.save()
+        self.assertIsNone(scan_index.lookup('9780201379624'))
+
+    def test_scans_add_up_on_the_till_draft(self):
+        self.client.force_login(User.objects.create_user('clerk'))
+        scan = lambda **data: self.client.post(reverse('pos-scan'), data, content_type='application/json')
+        self.assertEqual(scan(code='4006381333931', till='1').json()['quantity'], 1)
+        response = scan(code='4006381333931', quantity=2, till='1').json()
+        self.assertEqual((response['name'], response['quantity'], response['perprice']), ('Widget (Blue)', 3, 7))
+        self.assertEqual(scan(code='nope', till='1').status_code, 404)
+        self.assertEqual(scan(code='4006381333931', quantity=0).status_code, 400)
+
+
+@override_settings(SYNC={'PAGE_SIZE': 2, 'SETTLE': 0})
+class StockSyncTest(TestCase):
+    def setUp(self):
+        self.client.force_login(User.objects.create_user('clerk'))
+        self.stocks = [Stock.objects.create(name=f"Part {number}", quantity=1, cost=Decimal('2.00')) for number in range(3)]
+
+    def sync(self, since=None):
+        return self.client.get(reverse('stock-sync'), {'since': since} if since else {}).json()
+
+    def test_catalog_is_paged_by_token(self):
+        first = self.sync()
+        self.assertTrue(first['more'])
+        second = self.sync(first['next'])
+        self.assertFalse(second['more'])
+        self.assertEqual([row[0] for row in first['rows'] + second['rows']], [stock.pk for stock in self.stocks])
+        self.assertEqual(self.sync(second['next'])['rows'], [])
+
+        self.stocks[0].quantity = 7
+        self.stocks[0].save()
+        rows = self.sync(second['next'])['rows']
+        self.assertEqual([(row[0], row[4]) for row in rows], [(self.stocks[0].pk, 7)])
+
+    def test_soft_delete_is_sent(self):
+        token = self.sync(self.sync()['next'])['next']
+        self.stocks[1].is_deleted = True
+        self.stocks[1].save()
+        fields = self.sync()['fields']
+        [row] = self.sync(token)['rows']
+        self.assertEqual((row[0], row[fields.index('is_deleted')]), (self.stocks[1].pk, True))
+
+    def test_unsettled_changes_are_sent_again(self):
+        with self.settings(SYNC={'PAGE_SIZE': 10, 'SETTLE': 60}):
+            page = self.sync()
+            self.assertEqual(len(page['rows']), 3)
+            self.assertEqual(len(self.sync(page['next'])['rows']), 3)
+
+    def test_bad_token_is_refused(self):
+        response = self.client.get(reverse('stock-sync'), {'since': 'nonsense'})
+        self.assertEqual(response.status_code, 400)
+
+    def test_reorder_point_updates_are_stamped_when_they_run(self):
+        from transactions.models import Customer, SaleBill, SaleItem
+
+        customer = Customer.objects.create(name='Ann', phone='9876543210', address='Road', email='ann@example.com')
+        bill = SaleBill.objects.create(customer=customer)
+        SaleItem.objects.create(billno=bill, stock=self.stocks[0], quantity=30, perprice=5, totalprice=150)
+        before = timezone.now()
+        self.assertEqual(forecasting.update_reorder_points(), 3)
+        selling, idle, _ = Stock.objects.order_by('id')
+        self.assertGreater(selling.reorder_point, idle.reorder_point)
+        self.assertGreater(min(selling.updated_at, idle.updated_at), before)
+        self.assertNotEqual(selling.updated_at, idle.updated_at)
+
+
+class ForecastTest(TestCase):
+    def setUp(self):
+        from transactions.models import Customer
+
+        self.customer = Customer.objects.create(name='Ann', phone='9876543210', address='Road', email='ann@example.com')
+        self.selling = Stock.objects.create(name='Widget', quantity=50, cost=Decimal('2.00'))
+        self.idle = Stock.objects.create(name='Gadget', quantity=1, cost=Decimal('2.00'))
+
+    def sell(self, stock, quantity, days_ago):
+        from transactions.models import SaleBill, SaleItem
+
+        bill = SaleBill.objects.create(customer=self.customer)
+        SaleItem.objects.create(billno=bill, stock=stock, quantity=quantity, perprice=5, totalprice=5 * quantity)
+        SaleBill.objects.filter(pk=bill.pk).update(time=timezone.now() - timedelta(days=days_ago))
+
+    def test_steady_demand_needs_no_safety_stock(self):
+        points, demand, safety = forecasting.reorder_points(np.full((1, 30), 2.0), lead_time=7)
+        self.assertEqual((points[0], demand[0], safety[0]), (14, 2.0, 0.0))
+
+    def test_exponential_smoothing_weighs_recent_days_more(self):
+        matrix = np.zeros((2, 30))
+        matrix[0, -1] = matrix[1, 0] = 10
+        recent, old = forecasting.forecast_daily_demand(matrix, forecasting.EXPONENTIAL)
+        self.assertGreater(recent, old)
+        self.assertAlmostEqual(forecasting.forecast_daily_demand(np.full((1, 30), 3.0), forecasting.EXPONENTIAL)[0], 3.0)
+
+    def test_sales_are_laid_out_by_day(self):
+        self.sell(self.selling, 4, days_ago=2)
+        self.sell(self.selling, 3, days_ago=2)
+        self.sell(self.idle, 1, days_ago=40)
+        matrix = forecasting.daily_sales_matrix(np.array([self.selling.pk, self.idle.pk]), days=30)
+        self.assertEqual(matrix.shape, (2, 30))
+        self.assertEqual(matrix[0].sum(), 7)
+        self.assertEqual(matrix[0, -3], 7)
+        self.assertEqual(matrix[1].sum(), 0)
+
+    def test_stock_without_demand_gets_zero_not_none(self):
+        self.sell(self.selling, 30, days_ago=1)
+        self.assertEqual(forecasting.update_reorder_points(), 2)
+        self.selling.refresh_from_db()
+        self.idle.refresh_from_db()
+        self.assertGreater(self.selling.reorder_point, 0)
+        self.assertEqual(self.idle.reorder_point, 0)
+        # a second run finds nothing to change, a forecast 0 is not taken for a missing one
+        self.assertEqual(forecasting.update_reorder_points(), 0)
+
+    def test_reorder_list_uses_the_fixed_threshold_only_without_a_forecast(self):
+        self.client.force_login(User.objects.create_user('clerk'))
+        listed = lambda: [stock.pk for stock in self.client.get(reverse('reorder-products')).context['reorder_products']]
+        self.assertEqual(listed(), [self.idle.pk])
+        Stock.objects.filter(pk=self.idle.pk).update(reorder_point=0)
+        self.assertEqual(listed(), [])
+        Stock.objects.filter(pk=self.selling.pk).update(reorder_point=60)
+        self.assertEqual(listed(), [self.selling.pk])
+
+
+class StockConflictTest(TestCase):
+    def setUp(self):
+        self.client.force_login(User.objects.create_user('clerk'))
+        self.stock = Stock.objects.create(name='Widget', sub_category='Red', quantity=5, cost=Decimal('2.00'))
+        self.url = reverse('edit-stock', args=[self.stock.pk])
+
+    def edit(self, version, **changes):
+        data = {'name': 'Widget', 'sub_category': 'Red', 'quantity': 5, 'cost': '2.00', 'sku': '', 'version': version}
+        data.update(changes)
+        return self.client.post(self.url, data)
+
+    def test_current_version_saves(self):
+        response = self.edit(0, quantity=7)
+        self.assertRedirects(response, '/inventory', fetch_redirect_response=False)
+        self.stock.refresh_from_db()
+        self.assertEqual((self.stock.quantity, self.stock.version), (7, 1))
+
+    def test_stale_version_is_refused_with_409(self):
+        self.edit(0, quantity=7)
+        response = self.edit(0, quantity=9)
+        self.assertEqual(response.status_code, 409)
+        self.assertContains(response, 'Someone else changed this record', status_code=409)
+        # the form is re-armed with the current version, so posting it again applies the change
+        self.assertEqual(response.context['form'].data['version'], 1)
+        self.stock.refresh_from_db()
+        self.assertEqual(self.stock.quantity, 7)
+        self.assertEqual(self.edit(1, quantity=9).status_code, 302)
+
+    def test_conflicting_delete_redirects_with_a_message(self):
+        save = VersionedModel.save
+
+        def racing_save(instance, *args, **kwargs):
+            Stock.objects.filter(pk=instance.pk).update(version=instance.version + 1)
+            return save(instance, *args, **kwargs)
+
+        with mock.patch.object(VersionedModel, 'save', racing_save):
+            response = self.client.post(reverse('delete-stock', args=[self.stock.pk]))
+        self.assertRedirects(response, reverse('delete-stock', args=[self.stock.pk]), fetch_redirect_response=False)
+        self.assertFalse(Stock.objects.get(pk=self.stock.pk).is_deleted)
+
+
+class VariantTableTest(TestCase):
+    def setUp(self):
+        self.client.force_login(User.objects.create_user('clerk'))
+        self.red = Stock.objects.create(name='Shirt', sub_category='Red', quantity=5, cost=Decimal('2.00'))
+        self.blue = Stock.objects.create(name='Shirt', sub_category='Blue', quantity=3, cost=Decimal('2.00'))
+        self.url = reverse('editable-table', args=[self.red.pk])
+
+    # the table as rendered (Blue, Red, then the blank row), with `changes` applied per sub category or 'new'
+    def post(self, **changes):
+        rows = [self.blue, self.red]
+        data = {'form-TOTAL_FORMS': 3, 'form-INITIAL_FORMS': 2, 'form-MIN_NUM_FORMS': 0, 'form-MAX_NUM_FORMS': 1000}
+        for index, stock in enumerate(rows):
+            values = {'id': stock.pk, 'sub_category': stock.sub_category, 'quantity': stock.quantity, 'cost': stock.cost,
+                      'reorder_point': '', 'version': stock.version}
+            values.update(changes.get(stock.sub_category, {}))
+            data.update({f"form-{index}-{name}": value for name, value in values.items()})
+        # the blank row is rendered with the model's defaults
+        new = {'id': '', 'sub_category': '', 'quantity': 1, 'cost': '', 'reorder_point': '', 'version': 0}
+        new.update(changes.get('new', {}))
+        data.update({f"form-2-{name}": value for name, value in new.items()})
+        return self.client.post(self.url, data)
+
+    def test_changed_and_new_variants_are_saved_together(self):
+        response = self.post(Red={'quantity': 8}, Blue={'cost': '2.50'}, new={'sub_category': 'Green', 'quantity': 4, 'cost': '3.00'})
+        self.assertRedirects(response, self.url, fetch_redirect_response=False)
+        self.red.refresh_from_db()
+        self.blue.refresh_from_db()
+        self.assertEqual((self.red.quantity, self.red.version), (8, 1))
+        self.assertEqual((self.blue.cost, self.blue.version), (Decimal('2.50'), 1))
+        green = Stock.objects.get(name='Shirt', sub_category='Green')
+        self.assertEqual((green.quantity, green.cost), (4, Decimal('3.00')))
+
+    def test_unchanged_table_writes_nothing(self):
+        self.assertEqual(self.post().status_code, 302)
+        self.assertEqual(list(Stock.objects.order_by('id').values_list('version', flat=True)), [0, 0])
+
+    def test_conflict_saves_no_variant(self):
+        Stock.objects.filter(pk=self.red.pk).update(quantity=6, version=1)
+        response = self.post(Red={'quantity': 8}, Blue={'quantity': 9})
+        self.assertEqual(response.status_code, 409)
+        self.assertContains(response, 'Someone else changed this record', status_code=409)
+        self.assertEqual(list(Stock.objects.order_by('id').values_list('quantity', 'version')), [(6, 1), (3, 0)])
+        # the conflicting row is re-armed with the current version
+        self.assertEqual(response.context['formset'].conflicts[0].data['form-1-version'], 1)
+
+    def test_new_variant_may_not_repeat_a_sub_category(self):
+        response = self.post(new={'sub_category': 'Red', 'quantity': 1, 'cost': '1.00'})
+        self.assertEqual(response.status_code, 200)
+        self.assertIn("Shirt already has a variant 'Red'", response.context['formset'].non_form_errors()[0])
+        self.assertEqual(Stock.objects.count(), 2)
+
+
+class RollupTest(TestCase):
+    def setUp(self):
+        from transactions.models import Customer
+
+        self.stock = Stock.objects.create(name='Widget', quantity=100, cost=Decimal('2.00'))
+        self.customer = Customer.objects.create(name='Ann', phone='9876543210', address='Road', email='ann@example.com')
+
+    def sale(self, quantity):
+        from transactions.models import SaleBill, SaleItem
+
+        bill = SaleBill.objects.create(customer=self.customer)
+        return bill, SaleItem.objects.create(billno=bill, stock=self.stock, quantity=quantity, perprice=5, totalprice=5 * quantity)
+
+    def sold(self):
+        rollup = StockMonthlyRollup.objects.filter(stock=self.stock).values_list('sold_quantity', 'sold_value').first()
+        return rollup or (0, 0)
+
+    def test_refresh_counts_each_item_once(self):
+        self.sale(2)
+        self.sale(3)
+        self.assertEqual(analytics.pending(), 2)
+        self.assertEqual(analytics.refresh(batch_size=1), 2)
+        self.assertEqual(analytics.pending(), 0)
+        self.assertEqual(analytics.refresh(), 0)
+        self.assertEqual(self.sold(), (5, 25))
+        self.assertEqual(Stock.objects.get(pk=self.stock.pk).total_sales_value, 25)
+
+    def test_item_committed_late_is_still_counted(self):
+        from transactions.models import SaleItem
+
+        bill, early = self.sale(2)
+        self.sale(3)
+        # the lower id was not visible (its transaction had not committed) when the later item was rolled up
+        SaleItem.objects.filter(pk=early.pk).update(rolled_up=True)
+        analytics.refresh()
+        SaleItem.objects.filter(pk=early.pk).update(rolled_up=False)
+        self.assertEqual(analytics.pending(), 1)
+        analytics.refresh()
+        self.assertEqual(self.sold(), (5, 25))
+
+    def test_forget_subtracts_only_counted_items(self):
+        bill, counted = self.sale(2)
+        analytics.refresh()
+        self.assertEqual(self.sold(), (2, 10))
+        other_bill, uncounted = self.sale(4)
+        analytics.forget_items(analytics.SALE, other_bill, [uncounted])
+        self.assertEqual(self.sold(), (2, 10))
+        analytics.forget_items(analytics.SALE, bill, [counted])
+        self.assertEqual(self.sold(), (0, 0))
+
+    def test_deleted_bill_leaves_rollups_as_if_it_never_was(self):
+        bill, item = self.sale(2)
+        self.sale(1)
+        analytics.refresh()
+        self.client.force_login(User.objects.create_user('clerk'))
+        self.client.post(reverse('delete-sale', args=[bill.pk]))
+        analytics.refresh()
+        self.assertEqual(self.sold(), (1, 5))
@@ -6,7 +6,9 @@ urlpatterns = [
     path('new', views.StockCreateView.as_view(), name='new-stock'),
     path('stock/<pk>/edit', views.StockUpdateView.as_view(), name='edit-stock'),
     path('stock/<pk>/delete', views.StockDeleteView.as_view(), name='delete-stock'),
+    path('sync', views.StockSyncView.as_view(), name='stock-sync'),
     path('reorder-products/', views.ReorderProductsView.as_view(), name='reorder-products'),
+    path('analytics/', views.AnalyticsView.as_view(), name='analytics'),
     path('editable-table/', views.EditableTableView.as_view(), name='editable-table'),
     path('product-table/<int:product_id>/', views.ProductTableView.as_view(), name='product-table'),
      path('editable-table/<int:pk>/', views.EditableTableView.as_view(), name='editable-table'),
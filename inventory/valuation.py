@@ -0,0 +1,262 @@
+"""
+Stock valuation and cost of goods sold.
+
+Every purchase adds a movement (and, for FIFO, a cost layer) and every sale
+consumes stock at its cost, so the running quantity and value of each stock are
+kept on its latest movement. Nothing replays history at report time: the value
+of the inventory as of any date is one query reading the latest movement per
+stock before that date. INVENTORY_VALUATION_METHOD selects 'fifo' or 'average'.
+"""
+
+import heapq
+from collections import defaultdict
+from itertools import chain
+from decimal import Decimal
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import OuterRef, Q, Subquery, Sum
+from django.utils import timezone
+
+from .models import Stock, CostLayer, StockMovement
+
+CENT = Decimal('0.01')
+FIFO = 'fifo'
+AVERAGE = 'average'
+
+
+def get_method():
+    return getattr(settings, 'INVENTORY_VALUATION_METHOD', FIFO)
+
+
+def get_balance(stock_id):
+    last = StockMovement.objects.filter(stock_id=stock_id).order_by('-time', '-id').values_list('balance_quantity', 'balance_value').first()
+    return last or (0, Decimal('0'))
+
+
+def _lock(stock_id):
+    # serialises valuation updates per stock (a no-op on SQLite, which locks the whole database anyway)
+    return Stock.objects.select_for_update().only('id', 'cost').get(pk=stock_id)
+
+
+# stock coming in at a known unit cost: purchases and deleted sales
+def record_receipt(stock_id, quantity, unit_cost, kind=StockMovement.PURCHASE, purchase_item=None, sale_item=None, time=None):
+    time = time or timezone.now()
+    unit_cost = Decimal(unit_cost)
+    with transaction.atomic():
+        _lock(stock_id)
+        balance_quantity, balance_value = get_balance(stock_id)
+        value = (unit_cost * quantity).quantize(CENT)
+        if get_method() == FIFO:
+            CostLayer.objects.create(stock_id=stock_id, time=time, purchase_item=purchase_item, quantity=quantity, remaining=quantity, unit_cost=unit_cost)
+        return StockMovement.objects.create(
+            stock_id=stock_id, time=time, kind=kind, quantity=quantity, value=value,
+            balance_quantity=balance_quantity + quantity, balance_value=balance_value + value,
+            purchase_item=purchase_item, sale_item=sale_item,
+        )
+
+
+# stock going out: sales and deleted purchases, returns the movement whose value is minus the cost of the goods
+def record_issue(stock_id, quantity, kind=StockMovement.SALE, sale_item=None, purchase_item=None, time=None):
+    time = time or timezone.now()
+    with transaction.atomic():
+        stock = _lock(stock_id)
+        balance_quantity, balance_value = get_balance(stock_id)
+        if get_method() == FIFO:
+            cost = _consume_layers(stock, quantity, balance_quantity, balance_value, purchase_item)
+        elif kind == StockMovement.PURCHASE_REVERSAL and purchase_item is not None:
+            cost = (Decimal(purchase_item.perprice) * quantity).quantize(CENT)
+        else:
+            cost = _average_cost(stock, quantity, balance_quantity, balance_value)
+        cost = cost.quantize(CENT)
+        return StockMovement.objects.create(
+            stock_id=stock_id, time=time, kind=kind, quantity=-quantity, value=-cost,
+            balance_quantity=balance_quantity - quantity, balance_value=balance_value - cost,
+            purchase_item=purchase_item, sale_item=sale_item,
+        )
+
+
+# record_issue for many sale items at once (transactions/ingest.py): the balances are read with one query,
+# the open layers with one per stock, and the layers and movements are written with one query each
+def record_sale_issues(items, time=None):
+    time = time or timezone.now()
+    by_stock = defaultdict(list)
+    for item in items:
+        by_stock[item.stock_id].append(item)
+    with transaction.atomic():
+        stocks = Stock.objects.select_for_update().only('id', 'cost').in_bulk(list(by_stock))
+        balances = {
+            stock.pk: (stock.balance_quantity or 0, stock.balance_value or Decimal('0'))
+            for stock in valuation().filter(pk__in=list(by_stock)).only('id')
+        }
+        touched = {}
+        movements = []
+        for stock_id, stock_items in by_stock.items():
+            stock = stocks[stock_id]
+            balance_quantity, balance_value = balances[stock_id]
+            if get_method() == FIFO:
+                needed = sum(item.quantity for item in stock_items)
+                layers = _open_layers(stock_id, needed)
+            for item in stock_items:
+                if get_method() == FIFO:
+                    cost, used = _take_layers(stock, layers, item.quantity)
+                    touched.update((layer.pk, layer) for layer in used)
+                else:
+                    cost = _average_cost(stock, item.quantity, balance_quantity, balance_value)
+                cost = cost.quantize(CENT)
+                balance_quantity, balance_value = balance_quantity - item.quantity, balance_value - cost
+                movements.append(StockMovement(
+                    stock_id=stock_id, time=time, kind=StockMovement.SALE, quantity=-item.quantity, value=-cost,
+                    balance_quantity=balance_quantity, balance_value=balance_value, sale_item=item,
+                ))
+        CostLayer.objects.bulk_update(list(touched.values()), ['remaining'])
+        return StockMovement.objects.bulk_create(movements)
+
+
+def _average_cost(stock, quantity, balance_quantity, balance_value):
+    if quantity >= balance_quantity > 0:
+        # selling everything left, take the whole value so no rounding residue stays behind
+        return balance_value + _fallback_cost(stock, balance_quantity, balance_value) * (quantity - balance_quantity)
+    return _fallback_cost(stock, balance_quantity, balance_value) * quantity
+
+
+def _fallback_cost(stock, balance_quantity, balance_value):
+    # average cost while there is stock on hand, the stock's list cost when selling into negative stock
+    if balance_quantity > 0:
+        return balance_value / balance_quantity
+    return Decimal(stock.cost)
+
+
+def _consume_layers(stock, quantity, balance_quantity, balance_value, purchase_item=None):
+    ordered = []
+    if purchase_item is not None:
+        # a deleted purchase takes its own layer out first
+        ordered.extend(CostLayer.objects.select_for_update().filter(stock_id=stock.pk, remaining__gt=0, purchase_item=purchase_item).order_by('time', 'id'))
+    needed = quantity - sum(layer.remaining for layer in ordered)
+    if needed > 0:
+        ordered.extend(_open_layers(stock.pk, needed, exclude=[layer.pk for layer in ordered]))
+
+    cost, touched = _take_layers(stock, ordered, quantity)
+    CostLayer.objects.bulk_update(touched, ['remaining'])
+    return cost
+
+
+# takes `quantity` from the layers in order, returns the cost and the layers changed (not saved yet)
+def _take_layers(stock, layers, quantity):
+    cost = Decimal('0')
+    left = quantity
+    touched = []
+    for layer in layers:
+        if left == 0:
+            break
+        if not layer.remaining:
+            continue
+        taken = min(left, layer.remaining)
+        layer.remaining -= taken
+        cost += layer.unit_cost * taken
+        left -= taken
+        touched.append(layer)
+    if left:
+        # no layers left, the rest is sold into negative stock at the list cost
+        cost += Decimal(stock.cost) * left
+    return cost, touched
+
+
+# the open layers of a stock, oldest first, read in windows until they hold `needed` units or there are no more
+def _open_layers(stock_id, needed, exclude=()):
+    layers = CostLayer.objects.select_for_update().filter(stock_id=stock_id, remaining__gt=0).exclude(pk__in=list(exclude)).order_by('time', 'id')
+    found, held = [], 0
+    while held < needed:
+        window = layers
+        if found:
+            last = found[-1]
+            window = layers.filter(Q(time__gt=last.time) | Q(time=last.time, id__gt=last.id))
+        size = _layer_window(needed - held)
+        batch = list(window[:size])
+        found.extend(batch)
+        held += sum(layer.remaining for layer in batch)
+        if len(batch) < size:
+            break
+    return found
+
+
+def _layer_window(needed):
+    # typical sales are covered by the first window, big ones read further windows
+    return max(50, min(needed, 1000))
+
+
+# reverses a sale item being deleted, the goods come back at the cost they left with
+def reverse_sale_item(item):
+    cost = -(StockMovement.objects.filter(sale_item=item, kind=StockMovement.SALE).aggregate(total=Sum('value'))['total'] or 0)
+    if cost:
+        unit_cost = Decimal(cost) / item.quantity
+    else:
+        unit_cost = Stock.objects.values_list('cost', flat=True).get(pk=item.stock_id)
+    return record_receipt(item.stock_id, item.quantity, unit_cost, kind=StockMovement.SALE_REVERSAL)
+
+
+def reverse_purchase_item(item):
+    return record_issue(item.stock_id, item.quantity, kind=StockMovement.PURCHASE_REVERSAL, purchase_item=item)
+
+
+# reports
+
+# stocks annotated with their quantity and value as of a date (or now), one query for all stocks
+def valuation(as_of=None):
+    movements = StockMovement.objects.filter(stock=OuterRef('pk'))
+    if as_of is not None:
+        movements = movements.filter(time__lte=as_of)
+    latest = movements.order_by('-time', '-id')
+    return Stock.objects.annotate(
+        balance_quantity=Subquery(latest.values('balance_quantity')[:1]),
+        balance_value=Subquery(latest.values('balance_value')[:1]),
+    )
+
+
+def inventory_value(as_of=None):
+    total = valuation(as_of).aggregate(total=Sum('balance_value'))['total'] or 0
+    return Decimal(total).quantize(CENT)
+
+
+def cost_of_goods_sold(start=None, end=None):
+    movements = StockMovement.objects.filter(kind__in=[StockMovement.SALE, StockMovement.SALE_REVERSAL])
+    if start is not None:
+        movements = movements.filter(time__gte=start)
+    if end is not None:
+        movements = movements.filter(time__lte=end)
+    total = movements.aggregate(total=Sum('value'))['total'] or 0
+    return -Decimal(total).quantize(CENT)
+
+
+# replays all purchase and sale items in bill order, used once to value the history recorded before the engine existed
+def rebuild():
+    from transactions.models import PurchaseItem, SaleItem, ArchivedPurchaseItem, ArchivedSaleItem
+
+    # archived bills are all older than the current ones (transactions/archive.py), so each pair chains in time order
+    purchases = chain(
+        ArchivedPurchaseItem.objects.select_related('billno').order_by('billno__time', 'id').iterator(),
+        PurchaseItem.objects.select_related('billno').order_by('billno__time', 'id').iterator(),
+    )
+    sales = chain(
+        ArchivedSaleItem.objects.select_related('billno').order_by('billno__time', 'id').iterator(),
+        SaleItem.objects.select_related('billno').order_by('billno__time', 'id').iterator(),
+    )
+    events = heapq.merge(
+        ((item.billno.time, 0, item.id, item) for item in purchases),
+        ((item.billno.time, 1, item.id, item) for item in sales),
+        key=lambda event: event[:3],
+    )
+
+    with transaction.atomic():
+        StockMovement.objects.all().delete()
+        CostLayer.objects.all().delete()
+        count = 0
+        for time, is_sale, _, item in events:
+            # movements of archived items are recorded unlinked, as archiving leaves them
+            link = None if item.billno.archived else item
+            if is_sale:
+                record_issue(item.stock_id, item.quantity, sale_item=link, time=time)
+            else:
+                record_receipt(item.stock_id, item.quantity, item.perprice, purchase_item=link, time=time)
+            count += 1
+    return count
@@ -9,8 +9,12 @@ from django.views.generic import (
 )
 from django.contrib.messages.views import SuccessMessageMixin
 from django.contrib import messages
+from django.db.models import F, Q
+from core.concurrency import ConflictError, ConflictMixin
+from core.sync import SyncView
+from jobs.registry import enqueue
 from .models import Stock
-from .forms import StockForm
+from .forms import StockForm, VariantFormset
 from django_filters.views import FilterView
 from .filters import StockFilter
 from django.views.generic import ListView
@@ -33,17 +37,22 @@ class ProductTableView(TemplateView):
         return context
 
 
+# the stock catalog changed since a client's last sync (core/sync.py)
+class StockSyncView(SyncView):
+    model = Stock
+    fields = ('id', 'name', 'sub_category', 'sku', 'quantity', 'cost', 'reorder_point', 'is_deleted', 'updated_at')
+
+
 class ReorderProductsView(ListView):
     template_name = 'reorder.html'
     model = Stock
     context_object_name = 'reorder_products'
-    REORDER_POINT = 5
+    REORDER_POINT = 5                                   # used for stocks without a forecast reorder point
 
     def get_queryset(self):
         # Filter out deleted items and items above the reorder point
-        return Stock.objects.filter(
-            is_deleted=False,
-            quantity__lt=self.REORDER_POINT
+        return Stock.objects.filter(is_deleted=False).filter(
+            Q(reorder_point__isnull=True, quantity__lt=self.REORDER_POINT) | Q(quantity__lt=F('reorder_point'))
         )
     
     def get_context_data(self, **kwargs):
@@ -52,6 +61,56 @@ class ReorderProductsView(ListView):
         return context
     
 
+class AnalyticsView(View):
+    template_name = 'analytics.html'
+    TOP = 100
+
+    def get(self, request):
+        from . import analytics                         # NumPy is only loaded once the page is used
+
+        # the page shows the last rollup, new items are rolled up by the job queue and not in the request
+        pending = analytics.pending()
+        if pending:
+            enqueue('refresh_analytics', key='refresh_analytics')
+        result = analytics.stock_analytics()
+        abc, revenue = result['abc'], result['revenue']
+        total = revenue.sum()
+
+        classes = []
+        for name in 'ABC':
+            selected = abc == name
+            classes.append({
+                'name': name,
+                'count': int(selected.sum()),
+                'revenue': int(revenue[selected].sum()),
+                'share': round(100 * revenue[selected].sum() / total, 1) if total else 0,
+            })
+        dead = result['dead'].nonzero()[0]
+        dead = dead[(-result['quantity'][dead]).argsort(kind='stable')][:self.TOP]
+
+        context = {
+            'classes': classes,
+            'top': [self.row(result, i) for i in result['order'][:self.TOP] if revenue[i] > 0],
+            'dead': [self.row(result, i) for i in dead],
+            'dead_count': int(result['dead'].sum()),
+            'pending': pending,
+        }
+        return render(request, self.template_name, context)
+
+    @staticmethod
+    def row(result, i):
+        turnover, days = result['turnover'][i], result['days_of_supply'][i]
+        return {
+            'id': int(result['ids'][i]),
+            'name': result['labels'][i],
+            'quantity': int(result['quantity'][i]),
+            'revenue': int(result['revenue'][i]),
+            'abc': result['abc'][i],
+            'turnover': None if turnover != turnover else round(float(turnover), 2),
+            'days_of_supply': None if days != days else int(days),
+        }
+
+
 class StockCreateView(SuccessMessageMixin, CreateView):
     model = Stock
     form_class = StockForm
@@ -66,13 +125,11 @@ class StockCreateView(SuccessMessageMixin, CreateView):
         return context
 
     def form_valid(self, form):
-        # Set the ReorderPoint to a default value or handle it in your model's save method
-        form.instance.reorder_point = 0  # Change the value accordingly
         response = super().form_valid(form)
         messages.success(self.request, self.success_message)
         return response      
 
-class StockUpdateView(SuccessMessageMixin, UpdateView):
+class StockUpdateView(ConflictMixin, SuccessMessageMixin, UpdateView):
     model = Stock
     form_class = StockForm
     template_name = "edit_stock.html"
@@ -86,14 +143,10 @@ class StockUpdateView(SuccessMessageMixin, UpdateView):
         context["delbtn"] = 'Delete Stock'
         return context
 
-    def form_valid(self, form):
-        response = super().form_valid(form)
-        messages.success(self.request, self.success_message)
-        return response
-
 class StockDeleteView(View):
     template_name = "delete_stock.html"
     success_message = "Stock has been deleted successfully"
+    conflict_message = "Someone else changed this stock while it was being deleted. Check it and delete it again."
 
     def get(self, request, pk):
         stock = get_object_or_404(Stock, pk=pk)
@@ -102,24 +155,42 @@ class StockDeleteView(View):
     def post(self, request, pk):  
         stock = get_object_or_404(Stock, pk=pk)
         stock.is_deleted = True
-        stock.save()                                               
+        try:
+            stock.save(update_fields=['is_deleted'])
+        except ConflictError:
+            messages.error(request, self.conflict_message)
+            return redirect('delete-stock', pk=pk)
         messages.success(request, self.success_message)
         return redirect('inventory')
 
 # views.py
 
+# all variants of a product in one table, edited and added to with one POST (VariantFormset)
 class EditableTableView(View):
     template_name = 'editable_table.html'
 
-    def get(self, request, pk):
-        # Assuming pk is the primary key of the product
-        product = Stock.objects.get(pk=pk)
-
-        related_products = Stock.objects.filter(name=product.name)
-
+    def render_table(self, product, formset, status=200):
         context = {
             'product': product,
-            'related_products': related_products,
+            'formset': formset,
+            'related_products': formset.get_queryset(),
         }
+        return render(self.request, self.template_name, context, status=status)
 
-        return render(request, self.template_name, context)
+    def get(self, request, pk):
+        product = get_object_or_404(Stock, pk=pk)
+        return self.render_table(product, VariantFormset(product=product))
+
+    def post(self, request, pk):
+        product = get_object_or_404(Stock, pk=pk)
+        formset = VariantFormset(request.POST, product=product)
+        if not formset.is_valid():
+            return self.render_table(product, formset)
+        try:
+            saved = formset.save()
+        except ConflictError:
+            for form in formset.conflicts:
+                form.add_conflict_error()
+            return self.render_table(product, formset, status=409)
+        messages.success(request, f"{len(saved)} variants of {product.name} have been saved" if saved else "Nothing was changed")
+        return redirect('editable-table', pk=pk)
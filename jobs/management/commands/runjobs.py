@@ -0,0 +1,36 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from jobs.registry import claim_next, enqueue_scheduled, run_job, requeue_stale, worker_name, get_setting
+
+
+class Command(BaseCommand):
+    help = 'Runs queued background jobs. Start several workers for more throughput; per-queue limits are set in JOBS["QUEUES"].'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--queue', action='append', dest='queues', help='queue to work on, can be repeated (default: all configured queues)')
+        parser.add_argument('--once', action='store_true', help='exit when no job is runnable instead of polling')
+
+    def handle(self, *args, **options):
+        queues = options['queues'] or list(get_setting('QUEUES', {'default': 2}))
+        interval = get_setting('POLL_INTERVAL', 1)
+        worker = worker_name()
+        self.stdout.write(f"Worker {worker} listening on {', '.join(queues)}")
+
+        scheduled_at = 0
+        while True:
+            requeue_stale()
+            if time.monotonic() - scheduled_at >= 60:
+                # the schedule is checked once a minute, the job key keeps several workers from queueing a task twice
+                enqueue_scheduled()
+                scheduled_at = time.monotonic()
+            job = claim_next(worker, queues)
+            if job is None:
+                if options['once']:
+                    return
+                time.sleep(interval)
+                continue
+            self.stdout.write(f"Running {job}")
+            job = run_job(job)
+            self.stdout.write(f"Finished {job}")
@@ -0,0 +1,28 @@
+from django.db import migrations, models
+
+
+def fail_duplicate_active_keys(apps, schema_editor):
+    Job = apps.get_model('jobs', 'Job')
+    # queued twice by the race the constraint closes: the oldest active job of a key stays, the others are failed
+    seen = set()
+    duplicates = []
+    for pk, key in Job.objects.filter(status__in=['queued', 'running']).exclude(key='').order_by('id').values_list('id', 'key'):
+        if key in seen:
+            duplicates.append(pk)
+        seen.add(key)
+    Job.objects.filter(pk__in=duplicates).update(status='failed', error='Duplicate of an active job with the same key')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('jobs', '0002_queue_lock'),
+    ]
+
+    operations = [
+        migrations.RunPython(fail_duplicate_active_keys, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name='job',
+            constraint=models.UniqueConstraint(condition=models.Q(('status__in', ['queued', 'running']), models.Q(_negated=True, key='')), fields=('key',), name='jobs_job_one_active_per_key'),
+        ),
+    ]
@@ -0,0 +1,91 @@
+import json
+
+from django.db import models
+from django.utils import timezone
+
+
+# raised by set_progress() in a task whose job was requeued as stale and so no longer belongs to its worker
+class JobLost(Exception):
+    pass
+
+
+class Job(models.Model):
+    QUEUED = 'queued'
+    RUNNING = 'running'
+    DONE = 'done'
+    FAILED = 'failed'
+    STATUS_CHOICES = [
+        (QUEUED, 'Queued'),
+        (RUNNING, 'Running'),
+        (DONE, 'Done'),
+        (FAILED, 'Failed'),
+    ]
+
+    id = models.AutoField(primary_key=True)
+    name = models.CharField(max_length=100)                             # registered task name, see jobs/registry.py
+    queue = models.CharField(max_length=30, default='default')
+    key = models.CharField(max_length=100, blank=True, db_index=True)   # optional dedupe key, one active job per key
+    args = models.TextField(default='{}')                               # json encoded keyword arguments
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default=QUEUED)
+    progress = models.IntegerField(default=0)                           # percent complete
+    message = models.CharField(max_length=200, blank=True)
+    result = models.TextField(blank=True)
+    error = models.TextField(blank=True)
+    attempts = models.IntegerField(default=0)
+    max_attempts = models.IntegerField(default=3)
+    worker = models.CharField(max_length=100, blank=True)
+    run_after = models.DateTimeField(default=timezone.now)
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+    started_at = models.DateTimeField(blank=True, null=True)
+    finished_at = models.DateTimeField(blank=True, null=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['status', 'queue', 'run_after']),
+        ]
+        constraints = [
+            # one active job per key, see enqueue() in jobs/registry.py
+            models.UniqueConstraint(
+                fields=['key'], condition=models.Q(status__in=['queued', 'running']) & ~models.Q(key=''), name='jobs_job_one_active_per_key',
+            ),
+        ]
+
+    def __str__(self):
+        return f"Job {self.id}: {self.name} ({self.status})"
+
+    def get_args(self):
+        return json.loads(self.args)
+
+    def set_progress(self, progress, message=''):
+        # called by running tasks, also serves as the worker's heartbeat
+        self.progress = max(0, min(100, int(progress)))
+        self.message = message[:200]
+        owned = Job.objects.filter(pk=self.pk, status=Job.RUNNING, worker=self.worker).update(
+            progress=self.progress, message=self.message, updated_at=timezone.now(),
+        )
+        if not owned:
+            raise JobLost(f"{self} was requeued or failed as stale, stopping this run")
+
+    def as_dict(self):
+        return {
+            'id': self.id,
+            'name': self.name,
+            'status': self.status,
+            'progress': self.progress,
+            'message': self.message,
+            'result': json.loads(self.result) if self.result else None,
+            'error': self.error,
+            'attempts': self.attempts,
+            'created_at': self.created_at,
+            'finished_at': self.finished_at,
+        }
+
+
+# one row per queue, updated at the start of a claim so claims on a queue run one at a time (jobs/registry.py)
+class QueueLock(models.Model):
+    name = models.CharField(max_length=30, primary_key=True)
+    claimed_at = models.DateTimeField(blank=True, null=True)
+
+    def __str__(self):
+        return self.name
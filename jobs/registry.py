@@ -0,0 +1,139 @@
+import json
+import os
+import socket
+import traceback
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import IntegrityError, close_old_connections, transaction
+from django.db.models import F
+from django.utils import timezone
+
+from audit.log import buffered
+from .models import Job, JobLost, QueueLock
+
+TASKS = {}
+
+
+def get_setting(name, default):
+    return getattr(settings, 'JOBS', {}).get(name, default)
+
+
+# decorator used in an app's tasks.py to register a function as a background task
+# the function is called as func(job, **kwargs) and may report progress through job.set_progress()
+def task(name, queue='default', max_attempts=3):
+    def register(func):
+        TASKS[name] = {'func': func, 'queue': queue, 'max_attempts': max_attempts}
+        return func
+    return register
+
+
+# adds a job to the queue, a job with the same active key is reused instead of queued twice
+def enqueue(name, key='', **kwargs):
+    options = TASKS[name]
+    for attempt in range(3):
+        if key:
+            active = Job.objects.filter(key=key, status__in=[Job.QUEUED, Job.RUNNING]).first()
+            if active is not None:
+                return active
+        try:
+            # the unique constraint on active keys settles a race with another process queueing the same key
+            with transaction.atomic():
+                return Job.objects.create(
+                    name=name,
+                    queue=options['queue'],
+                    key=key,
+                    args=json.dumps(kwargs),
+                    max_attempts=options['max_attempts'],
+                )
+        except IntegrityError:
+            if not key or attempt == 2:
+                raise
+
+
+def worker_name():
+    return f"{socket.gethostname()}:{os.getpid()}"
+
+
+# marks the oldest runnable job of a queue with a free slot as running, returns None when nothing is claimable
+def claim_next(worker, queues):
+    limits = get_setting('QUEUES', {'default': 2})
+    now = timezone.now()
+    for queue in queues:
+        runnable = Job.objects.filter(queue=queue, status=Job.QUEUED, run_after__lte=now).order_by('run_after', 'id')
+        # unlocked first look, so idle polls write nothing
+        if not runnable.exists() or Job.objects.filter(queue=queue, status=Job.RUNNING).count() >= limits.get(queue, 1):
+            continue
+        QueueLock.objects.get_or_create(name=queue)
+        with transaction.atomic():
+            # the update takes the queue's lock (the row on PostgreSQL, the database on SQLite) until the commit,
+            # so the count and the claim below cannot interleave with another worker's
+            QueueLock.objects.filter(name=queue).update(claimed_at=now)
+            if Job.objects.filter(queue=queue, status=Job.RUNNING).count() >= limits.get(queue, 1):
+                continue
+            job_id = runnable.values_list('id', flat=True).first()
+            if job_id is None:
+                continue
+            # the attempt counts from here, so a run that takes its worker down is counted too
+            Job.objects.filter(pk=job_id).update(
+                status=Job.RUNNING, worker=worker, started_at=now, updated_at=now, progress=0, attempts=F('attempts') + 1,
+            )
+        return Job.objects.get(pk=job_id)
+    return None
+
+
+def run_job(job):
+    options = TASKS.get(job.name)
+    try:
+        if options is None:
+            raise LookupError(f"No task registered as '{job.name}'")
+        # the task's audit entries are written in one insert when it ends
+        with buffered():
+            result = options['func'](job, **job.get_args())
+    except JobLost:
+        # requeued as stale meanwhile, the job is someone else's now
+        close_old_connections()
+        return job
+    except Exception:
+        job.error = traceback.format_exc()
+        if job.attempts < job.max_attempts:
+            # retry with an exponential backoff: 10s, 20s, 40s...
+            job.status = Job.QUEUED
+            job.run_after = timezone.now() + timedelta(seconds=10 * 2 ** (job.attempts - 1))
+        else:
+            job.status = Job.FAILED
+            job.finished_at = timezone.now()
+    else:
+        job.status = Job.DONE
+        job.progress = 100
+        job.result = json.dumps(result, default=str) if result is not None else ''
+        job.finished_at = timezone.now()
+    # only while the job is still this worker's, a stale requeue meanwhile wins
+    Job.objects.filter(pk=job.pk, status=Job.RUNNING, worker=job.worker).update(
+        status=job.status, progress=job.progress, result=job.result, error=job.error,
+        run_after=job.run_after, finished_at=job.finished_at, updated_at=timezone.now(),
+    )
+    close_old_connections()
+    return job
+
+
+# queues the tasks of JOBS['SCHEDULE'] that did not run for their interval, returns the jobs queued
+def enqueue_scheduled():
+    now = timezone.now()
+    queued = []
+    for name, interval in get_setting('SCHEDULE', {}).items():
+        if name in TASKS and not Job.objects.filter(name=name, created_at__gte=now - timedelta(seconds=interval)).exists():
+            queued.append(enqueue(name, key=f"schedule:{name}"))
+    return queued
+
+
+# jobs whose worker stopped sending progress for too long are put back in the queue, or failed once they used
+# up their attempts (the stale run was one); a run that is only slow stops at its next set_progress()
+def requeue_stale():
+    stale_after = get_setting('STALE_AFTER', 600)
+    now = timezone.now()
+    stale = Job.objects.filter(status=Job.RUNNING, updated_at__lt=now - timedelta(seconds=stale_after))
+    failed = stale.filter(attempts__gte=F('max_attempts')).update(
+        status=Job.FAILED, worker='', error=f"No progress for {stale_after} s, the worker was lost", finished_at=now, updated_at=now,
+    )
+    return failed + stale.update(status=Job.QUEUED, worker='', updated_at=now)
@@ -0,0 +1,127 @@
+from datetime import timedelta
+
+from django.db import IntegrityError, transaction
+from django.test import TestCase, override_settings
+from django.utils import timezone
+
+from .models import Job, JobLost
+from .registry import claim_next, enqueue, requeue_stale, run_job, task
+
+
+@task('test_echo', queue='test')
+def echo(job, value=None):
+    return {'value': value}
+
+
+@task('test_broken', queue='test', max_attempts=2)
+def broken(job):
+    raise ValueError("broken")
+
+
+@task('test_progress', queue='test')
+def progress(job):
+    job.set_progress(50, 'halfway')
+    return 'done'
+
+
+@override_settings(JOBS={'QUEUES': {'test': 2}, 'STALE_AFTER': 60})
+class ClaimTest(TestCase):
+    def test_claims_oldest_runnable_job(self):
+        first = enqueue('test_echo', value=1)
+        enqueue('test_echo', value=2)
+        job = claim_next('w1', ['test'])
+        self.assertEqual(job.pk, first.pk)
+        self.assertEqual(job.status, Job.RUNNING)
+        self.assertEqual(job.worker, 'w1')
+        self.assertEqual(job.attempts, 1)
+
+    def test_skips_jobs_not_yet_due(self):
+        job = enqueue('test_echo')
+        Job.objects.filter(pk=job.pk).update(run_after=timezone.now() + timedelta(minutes=1))
+        self.assertIsNone(claim_next('w1', ['test']))
+
+    def test_respects_queue_limit(self):
+        for value in range(3):
+            enqueue('test_echo', value=value)
+        self.assertIsNotNone(claim_next('w1', ['test']))
+        self.assertIsNotNone(claim_next('w2', ['test']))
+        self.assertIsNone(claim_next('w3', ['test']))
+        self.assertEqual(Job.objects.filter(status=Job.RUNNING).count(), 2)
+
+    def test_runs_job_and_stores_result(self):
+        enqueue('test_echo', value=7)
+        job = run_job(claim_next('w1', ['test']))
+        job.refresh_from_db()
+        self.assertEqual(job.status, Job.DONE)
+        self.assertEqual(job.progress, 100)
+        self.assertEqual(job.as_dict()['result'], {'value': 7})
+
+
+@override_settings(JOBS={'QUEUES': {'test': 2}, 'STALE_AFTER': 60})
+class RetryTest(TestCase):
+    def test_failed_run_is_retried_with_backoff(self):
+        enqueue('test_broken')
+        job = run_job(claim_next('w1', ['test']))
+        job.refresh_from_db()
+        self.assertEqual(job.status, Job.QUEUED)
+        self.assertEqual(job.attempts, 1)
+        self.assertIn('ValueError', job.error)
+        self.assertGreater(job.run_after, timezone.now())
+
+    def test_fails_after_max_attempts(self):
+        job = enqueue('test_broken')
+        run_job(claim_next('w1', ['test']))
+        Job.objects.filter(pk=job.pk).update(run_after=timezone.now())
+        run_job(claim_next('w1', ['test']))
+        job.refresh_from_db()
+        self.assertEqual(job.status, Job.FAILED)
+        self.assertEqual(job.attempts, 2)
+        self.assertIsNotNone(job.finished_at)
+
+    def test_stale_job_is_requeued_then_failed(self):
+        job = enqueue('test_broken')
+        claim_next('w1', ['test'])
+        Job.objects.filter(pk=job.pk).update(updated_at=timezone.now() - timedelta(minutes=5))
+        self.assertEqual(requeue_stale(), 1)
+        job.refresh_from_db()
+        self.assertEqual((job.status, job.worker), (Job.QUEUED, ''))
+
+        claim_next('w2', ['test'])
+        Job.objects.filter(pk=job.pk).update(updated_at=timezone.now() - timedelta(minutes=5))
+        requeue_stale()
+        job.refresh_from_db()
+        self.assertEqual(job.status, Job.FAILED)
+        self.assertEqual(job.attempts, 2)
+
+    def test_lost_job_keeps_the_new_owners_state(self):
+        job = enqueue('test_progress')
+        claimed = claim_next('w1', ['test'])
+        Job.objects.filter(pk=job.pk).update(status=Job.QUEUED, worker='')
+        with self.assertRaises(JobLost):
+            claimed.set_progress(10)
+        run_job(claimed)
+        job.refresh_from_db()
+        self.assertEqual(job.status, Job.QUEUED)
+        self.assertEqual(job.result, '')
+
+
+class EnqueueTest(TestCase):
+    def test_active_key_is_reused(self):
+        first = enqueue('test_echo', key='same')
+        self.assertEqual(enqueue('test_echo', key='same').pk, first.pk)
+        self.assertEqual(Job.objects.count(), 1)
+
+    def test_key_is_free_again_once_done(self):
+        first = enqueue('test_echo', key='same')
+        Job.objects.filter(pk=first.pk).update(status=Job.DONE)
+        self.assertNotEqual(enqueue('test_echo', key='same').pk, first.pk)
+
+    def test_constraint_rejects_second_active_job(self):
+        enqueue('test_echo', key='same')
+        with self.assertRaises(IntegrityError), transaction.atomic():
+            Job.objects.create(name='test_echo', queue='test', key='same')
+
+    def test_jobs_without_key_are_not_deduplicated(self):
+        enqueue('test_echo')
+        enqueue('test_echo')
+        self.assertEqual(Job.objects.count(), 2)
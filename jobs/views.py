@@ -0,0 +1,10 @@
+from django.http import JsonResponse
+from django.shortcuts import get_object_or_404
+
+from .models import Job
+
+
+# status polling endpoint for background jobs
+def job_status(request, pk):
+    job = get_object_or_404(Job, pk=pk)
+    return JsonResponse(job.as_dict())
@@ -0,0 +1,25 @@
+// Live stock quantities from the stock feed (inventory/feed.py), loaded by {% stock_feed %}
+(function () {
+    var script = document.currentScript;
+    if (!window.EventSource) {
+        return;
+    }
+    // served by the ASGI application only; elsewhere the request fails and EventSource gives up
+    var source = new EventSource(script.dataset.url + '?since=' + script.dataset.since);
+
+    source.addEventListener('stock', function (event) {
+        var changes = JSON.parse(event.data);
+        Object.keys(changes).forEach(function (id) {
+            document.querySelectorAll('[data-stock-quantity="' + id + '"]').forEach(function (element) {
+                element.textContent = changes[id];
+            });
+        });
+        document.dispatchEvent(new CustomEvent('stockchange', {detail: changes}));
+    });
+
+    // too far behind to catch up change by change
+    source.addEventListener('reset', function () {
+        source.close();
+        window.location.reload();
+    });
+})();
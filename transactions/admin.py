@@ -4,15 +4,31 @@ from .models import (
     PurchaseBill, 
     PurchaseItem,
     PurchaseBillDetails, 
+    Customer,
     SaleBill, 
     SaleItem,
-    SaleBillDetails
+    SaleBillDetails,
+    ArchivedPurchaseBill,
+    ArchivedPurchaseItem,
+    ArchivedSaleBill,
+    ArchivedSaleItem,
+    SaleDraft,
+    SaleDraftLine,
+    UnparsedTaxAmount
 )
 
 admin.site.register(Supplier)
 admin.site.register(PurchaseBill)
 admin.site.register(PurchaseItem)
 admin.site.register(PurchaseBillDetails)
+admin.site.register(Customer)
 admin.site.register(SaleBill)
 admin.site.register(SaleItem)
-admin.site.register(SaleBillDetails)
\ No newline at end of file
+admin.site.register(SaleBillDetails)
+admin.site.register(ArchivedPurchaseBill)
+admin.site.register(ArchivedPurchaseItem)
+admin.site.register(ArchivedSaleBill)
+admin.site.register(ArchivedSaleItem)
+admin.site.register(SaleDraft)
+admin.site.register(SaleDraftLine)
+admin.site.register(UnparsedTaxAmount)
\ No newline at end of file
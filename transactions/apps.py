@@ -3,3 +3,7 @@ from django.apps import AppConfig
 
 class TransactionsConfig(AppConfig):
     name = 'transactions'
+
+    def ready(self):
+        # connects the stock reorder check, independently of whether the views were imported
+        from . import signals  # noqa: F401
@@ -0,0 +1,192 @@
+"""
+Bill archive: time based partitioning of purchase and sale bills.
+
+Bills older than settings.BILL_ARCHIVE['KEEP_YEARS'] calendar years are moved,
+oldest first and in batches, from the current tables (PurchaseBill, SaleBill and
+their items and details) into the Archived* tables, keeping their bill and item
+numbers. So every archived bill is older than every current one. The numbers of
+moved rows are not given out again: Django creates SQLite primary keys with
+AUTOINCREMENT and PostgreSQL sequences never go back.
+
+bills() is the query layer the list views read through: without a date range it
+is a plain queryset on the current table, with one it also reads the archive and
+returns a BillList, which pages through both tables as if they were one.
+"""
+
+from collections import namedtuple
+from datetime import datetime, timedelta
+
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+
+from .models import (
+    PurchaseBill, PurchaseItem, SaleBill, SaleItem,
+    ArchivedPurchaseBill, ArchivedPurchaseItem, ArchivedSaleBill, ArchivedSaleItem,
+)
+
+PURCHASE = 'purchase'
+SALE = 'sale'
+
+DETAIL_FIELDS = ('eway', 'veh', 'destination', 'po', 'cgst', 'sgst', 'igst', 'cess', 'tcs', 'total')
+
+Source = namedtuple('Source', 'bill item details party archived_bill archived_item')
+
+SOURCES = {
+    PURCHASE: Source(PurchaseBill, PurchaseItem, 'purchasedetailsbillno', 'supplier', ArchivedPurchaseBill, ArchivedPurchaseItem),
+    SALE: Source(SaleBill, SaleItem, 'saledetailsbillno', 'customer', ArchivedSaleBill, ArchivedSaleItem),
+}
+
+
+def get_setting(name, default):
+    return getattr(settings, 'BILL_ARCHIVE', {}).get(name, default)
+
+
+# bills before the start of this (local) year are archived
+def cutoff(now=None):
+    year = timezone.localtime(now or timezone.now()).year - get_setting('KEEP_YEARS', 2) + 1
+    return timezone.make_aware(datetime(year, 1, 1))
+
+
+# (start, end) datetimes from the 'from' and 'to' GET parameters (YYYY-MM-DD, both days included), None where missing or invalid
+def date_range(params):
+    def day(name):
+        try:
+            return timezone.make_aware(datetime.strptime(params.get(name, ''), '%Y-%m-%d'))
+        except ValueError:
+            return None
+
+    end = day('to')
+    return day('from'), end and end + timedelta(days=1)
+
+
+class BillList:
+    """
+    Current bills newest first, then archived ones: enough of the queryset API
+    (count and slicing) for Paginator and the list templates. Each table is
+    counted once and a page only reads the rows it shows.
+    """
+
+    def __init__(self, querysets):
+        self.querysets = querysets
+        self._counts = None
+
+    def counts(self):
+        if self._counts is None:
+            self._counts = [queryset.count() for queryset in self.querysets]
+        return self._counts
+
+    def count(self):
+        return sum(self.counts())
+
+    def __len__(self):
+        return self.count()
+
+    def __iter__(self):
+        for queryset in self.querysets:
+            yield from queryset
+
+    def __getitem__(self, index):
+        if not isinstance(index, slice):
+            bills = self[index:index + 1]
+            if not bills:
+                raise IndexError("BillList index out of range")
+            return bills[0]
+        start, stop = index.start or 0, self.count() if index.stop is None else index.stop
+        bills = []
+        for queryset, count in zip(self.querysets, self.counts()):
+            if start < count and stop > 0:
+                bills.extend(queryset[max(start, 0):min(stop, count)])
+            start, stop = start - count, stop - count
+        return bills
+
+
+# bills of one kind newest first; the archive is only read when a date range asks for it
+def bills(kind, start=None, end=None, **filters):
+    source = SOURCES[kind]
+    models = [source.bill]
+    if start is not None or end is not None:
+        models.append(source.archived_bill)
+
+    querysets = []
+    for model in models:
+        queryset = model.objects.filter(**filters)
+        if start is not None:
+            queryset = queryset.filter(time__gte=start)
+        if end is not None:
+            queryset = queryset.filter(time__lt=end)
+        querysets.append(queryset.select_related(source.party).order_by('-time', '-billno'))
+    return querysets[0] if len(querysets) == 1 else BillList(querysets)
+
+
+# adds up dicts of sums (aggregate() results) read from the current and the archive table, None stays None when all are
+def add_sums(*rows):
+    total = {}
+    for row in rows:
+        for name, value in row.items():
+            if value is None:
+                total.setdefault(name, None)
+            else:
+                total[name] = (total.get(name) or 0) + value
+    return total
+
+
+# the same for rows of values().annotate(), matched and sorted on `key`
+def merge_sums(key, *groups):
+    merged = {}
+    for rows in groups:
+        for row in rows:
+            value = row.pop(key)
+            merged[value] = add_sums(merged.get(value, {}), row)
+    return [dict(merged[value], **{key: value}) for value in sorted(merged)]
+
+
+def _archived_bill(source, bill):
+    details = getattr(bill, source.details, None)
+    values = {}
+    for field in source.archived_bill._meta.concrete_fields:
+        origin = details if field.name in DETAIL_FIELDS else bill
+        values[field.attname] = getattr(origin, field.attname) if origin is not None else None
+    return source.archived_bill(**values)
+
+
+def _archived_item(source, item):
+    return source.archived_item(**{field.attname: getattr(item, field.attname) for field in source.archived_item._meta.concrete_fields})
+
+
+def pending(kind, before=None):
+    return SOURCES[kind].bill.objects.filter(time__lt=before or cutoff()).count()
+
+
+# moves the bills of one kind older than `before` into the archive, one transaction per batch; returns the number moved
+def archive_bills(kind, before=None, batch_size=None, progress=None):
+    from audit.log import suppressed
+    from inventory import analytics
+
+    source = SOURCES[kind]
+    before = before or cutoff()
+    batch_size = batch_size or get_setting('BATCH_SIZE', 500)
+    # the rollups count items by id, so everything must be rolled up before it leaves the table
+    analytics.refresh()
+    total = source.bill.objects.filter(time__lt=before).count()
+
+    moved = 0
+    while True:
+        # moving a bill is not a change to it, the audit trail stays with the bill number
+        with transaction.atomic(), suppressed():
+            batch = list(
+                source.bill.objects.filter(time__lt=before)
+                .select_related(source.details).order_by('time', 'billno')[:batch_size]
+            )
+            if not batch:
+                break
+            billnos = [bill.billno for bill in batch]
+            items = source.item.objects.filter(billno__in=billnos).order_by('id')
+            source.archived_bill.objects.bulk_create([_archived_bill(source, bill) for bill in batch])
+            source.archived_item.objects.bulk_create([_archived_item(source, item) for item in items])
+            # cascades to the items and details; stock movements and cost layers keep their rows, unlinked
+            source.bill.objects.filter(billno__in=billnos).delete()
+        moved += len(batch)
+        if progress:
+            progress(moved, total)
+    return moved
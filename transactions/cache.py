@@ -0,0 +1,11 @@
+from core.fragments import FragmentVersion
+from core.lrucache import ModelLRUCache
+from .models import Supplier, Customer
+
+# read-through cache for Supplier rows, looked up by pk or by name
+supplier_cache = ModelLRUCache(Supplier, natural_key=('name',))
+
+# versions of the supplier and customer details shown in cached bill fragments; sale bills show the name
+# the customer was billed under, only the phone comes from the customer row
+supplier_fragments = FragmentVersion(Supplier, fields=('name', 'phone', 'is_deleted'))
+customer_fragments = FragmentVersion(Customer, fields=('phone',))
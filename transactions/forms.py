@@ -1,11 +1,13 @@
 from django import forms
+from django.db import IntegrityError, transaction
 from django.forms import formset_factory
+from core.concurrency import VersionedFormMixin
 from .models import (
     Supplier, 
     PurchaseBill, 
     PurchaseItem,
     PurchaseBillDetails, 
-    SaleBill, 
+    Customer,
     SaleItem,
     SaleBillDetails
 )
@@ -38,14 +40,14 @@ class PurchaseItemForm(forms.ModelForm):
 PurchaseItemFormset = formset_factory(PurchaseItemForm, extra=1)
 
 # form used to accept the other details for purchase bill
-class PurchaseDetailsForm(forms.ModelForm):
+class PurchaseDetailsForm(VersionedFormMixin, forms.ModelForm):
     class Meta:
         model = PurchaseBillDetails
-        fields = ['eway','veh', 'destination', 'po', 'cgst', 'sgst', 'igst', 'cess', 'tcs', 'total']
+        fields = ['eway','veh', 'destination', 'po', 'cgst', 'sgst', 'igst', 'cess', 'tcs', 'total', 'version']
 
 
 # form used for supplier
-class SupplierForm(forms.ModelForm):
+class SupplierForm(VersionedFormMixin, forms.ModelForm):
     def __init__(self, *args, **kwargs):
         super().__init__(*args, **kwargs)
         self.fields['name'].widget.attrs.update({'class': 'textinput form-control', 'pattern': '[a-zA-Z\s]{1,50}', 'title': 'Alphabets and Spaces only'})
@@ -55,7 +57,7 @@ class SupplierForm(forms.ModelForm):
 
     class Meta:
         model = Supplier
-        fields = ['name', 'phone', 'address', 'email', 'gstin']
+        fields = ['name', 'phone', 'address', 'email', 'gstin', 'version']
         widgets = {
             'address': forms.Textarea(
                 attrs={
@@ -65,16 +67,20 @@ class SupplierForm(forms.ModelForm):
             )
         }
 
-# form used to get customer details
+# form used to get customer details, returning customers are matched on their phone number and their details
+# updated to the ones entered (bills issued before keep the details they were billed with, see SaleBill.bill_to);
+# match_customer=False only validates the fields (the sales ingestion matches a whole batch)
 class SaleForm(forms.ModelForm):
-    def __init__(self, *args, **kwargs):
+    def __init__(self, *args, match_customer=True, **kwargs):
         super().__init__(*args, **kwargs)
+        self.match_customer = match_customer
+        self.changed_details = []                   # fields of a returning customer changed by save()
         self.fields['name'].widget.attrs.update({'class': 'textinput form-control', 'pattern' : '[a-zA-Z\s]{1,50}', 'title' : 'Alphabets and Spaces only', 'required': 'true'})
         self.fields['phone'].widget.attrs.update({'class': 'textinput form-control', 'maxlength': '10', 'pattern' : '[0-9]{10}', 'title' : 'Numbers only', 'required': 'true'})
         self.fields['email'].widget.attrs.update({'class': 'textinput form-control'})
         self.fields['gstin'].widget.attrs.update({'class': 'textinput form-control', 'maxlength': '15', 'pattern' : '[A-Z0-9]{15}', 'title' : 'GSTIN Format Required'})
     class Meta:
-        model = SaleBill
+        model = Customer
         fields = ['name', 'phone', 'address', 'email', 'gstin']
         widgets = {
             'address' : forms.Textarea(
@@ -85,6 +91,44 @@ class SaleForm(forms.ModelForm):
             )
         }
 
+    def clean_gstin(self):
+        return self.cleaned_data['gstin'] or None
+
+    def clean(self):
+        cleaned_data = super().clean()
+        phone = cleaned_data.get('phone')
+        if self.match_customer and phone:
+            # a returning customer: the entered details are applied to their row, so the unique checks skip it
+            existing = Customer.objects.filter(phone=phone).first()
+            if existing is not None:
+                self.instance = existing
+                self._original = {field: getattr(existing, field) for field in self._meta.fields}
+        return cleaned_data
+
+    def validate_unique(self):
+        # the batch of the sales ingestion checks phone and GSTIN itself
+        if self.match_customer:
+            super().validate_unique()
+
+    # saves the new or returning customer, returns None (with a form error) if the phone or GSTIN was taken meanwhile
+    def save(self, commit=True):
+        customer = self.instance
+        if customer.pk is not None:
+            self.changed_details = [field for field in self._meta.fields if getattr(customer, field) != self._original[field]]
+        try:
+            with transaction.atomic():
+                if customer.pk is None:
+                    customer.save()
+                elif self.changed_details:
+                    customer.save(update_fields=self.changed_details)
+        except IntegrityError:
+            if customer.pk is None and Customer.objects.filter(phone=customer.phone).exists():
+                self.add_error('phone', "A customer with this phone number was registered meanwhile, please submit again")
+            else:
+                self.add_error('gstin', "This GSTIN is already registered to a customer with another phone number")
+            return None
+        return customer
+
 # form used to render a single stock item form
 class SaleItemForm(forms.ModelForm):
     def __init__(self, *args, **kwargs):
@@ -100,8 +144,11 @@ class SaleItemForm(forms.ModelForm):
 # formset used to render multiple 'SaleItemForm'
 SaleItemFormset = formset_factory(SaleItemForm, extra=1)
 
+# the same prefilled from a till's draft sale, without the blank row
+SaleDraftFormset = formset_factory(SaleItemForm, extra=0)
+
 # form used to accept the other details for sales bill
-class SaleDetailsForm(forms.ModelForm):
+class SaleDetailsForm(VersionedFormMixin, forms.ModelForm):
     class Meta:
         model = SaleBillDetails
-        fields = ['eway','veh', 'destination', 'po', 'cgst', 'sgst', 'igst', 'cess', 'tcs', 'total']
+        fields = ['eway','veh', 'destination', 'po', 'cgst', 'sgst', 'igst', 'cess', 'tcs', 'total', 'version']
@@ -0,0 +1,217 @@
+"""
+Sales ingestion: batches of sales posted as JSON by POS terminals (SaleIngestView).
+
+Every sale carries a client chosen key, stored in SaleBill.client_key under a
+unique index, so a terminal that lost its connection can post the same batch
+again: sales whose key is already known are answered with their bill number
+and left alone. The sales of a batch are validated first, each on its own,
+then all valid ones are written in one transaction: customers, bills and items
+with one bulk_create each, the stock quantities with one UPDATE and the cost of
+the goods sold through valuation.record_sale_issues.
+
+Terminals authenticate with a bearer token (SALES_INGEST['TOKENS'], token ->
+username) rather than a session, so the endpoint needs no login page or CSRF
+token; terminal_user() resolves the token to the user the sales are audited as.
+
+Reading what is already there happens before the transaction, which then
+starts with a write (on SQLite a transaction that reads first cannot wait for
+another writer). A concurrent batch inserting the same key or customer in
+between makes the unique index fail the transaction, and the batch is planned
+again, now seeing those rows.
+"""
+
+import hmac
+from collections import defaultdict, namedtuple
+
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.db import IntegrityError, transaction
+from django.db.models import Case, F, IntegerField, Value, When
+from django.db.models.signals import post_save
+from django.utils import timezone
+
+from inventory import valuation
+from inventory.models import Stock
+from inventory.scan import scan_index
+from .forms import SaleForm
+from .models import Customer, SaleBill, SaleItem
+
+CREATED = 'created'
+DUPLICATE = 'duplicate'
+INVALID = 'invalid'
+
+Sale = namedtuple('Sale', 'index key customer lines')
+Line = namedtuple('Line', 'stock_id quantity perprice')
+
+
+class BatchError(ValueError):
+    pass
+
+
+def get_setting(name, default):
+    return getattr(settings, 'SALES_INGEST', {}).get(name, default)
+
+
+# the active user a terminal's 'Authorization: Bearer <token>' header stands for, None if it stands for nobody
+def terminal_user(authorization):
+    scheme, _, token = authorization.partition(' ')
+    if scheme.lower() != 'bearer' or not token.strip():
+        return None
+    for known, username in get_setting('TOKENS', {}).items():
+        if hmac.compare_digest(known.encode(), token.strip().encode()):
+            return User.objects.filter(username=username, is_active=True).first()
+    return None
+
+
+def _integer(value, name, minimum):
+    if isinstance(value, bool) or not isinstance(value, int) or value < minimum:
+        raise ValueError(f"'{name}' must be a whole number of at least {minimum}")
+    return value
+
+
+# an item is {"stock": <id>} or {"sku": <code>}, with "quantity" and "perprice"
+def _parse_line(data):
+    if not isinstance(data, dict):
+        raise ValueError("expected an object")
+    if 'sku' in data:
+        stock = scan_index.lookup(str(data['sku']).strip())
+        if stock is None:
+            raise ValueError(f"no stock has the code {data['sku']}")
+        stock_id = stock.id
+    else:
+        stock_id = _integer(data.get('stock'), 'stock', 1)
+    return Line(stock_id, _integer(data.get('quantity'), 'quantity', 1), _integer(data.get('perprice'), 'perprice', 0))
+
+
+# one sale of the batch, raises ValueError with the reason it is invalid
+def _parse_sale(index, data):
+    if not isinstance(data, dict):
+        raise ValueError("expected an object")
+    key = data.get('key')
+    if not isinstance(key, str) or not 0 < len(key) <= SaleBill._meta.get_field('client_key').max_length:
+        raise ValueError("'key' must be a string of 1 to 64 characters")
+
+    # the new sale form's checks, without its lookup: customers are matched on phone for the whole batch
+    form = SaleForm(data=data.get('customer') if isinstance(data.get('customer'), dict) else {}, match_customer=False)
+    if not form.is_valid():
+        raise ValueError('; '.join(f"customer {field}: {' '.join(errors)}" for field, errors in form.errors.items()))
+
+    items = data.get('items')
+    if not isinstance(items, list) or not items:
+        raise ValueError("'items' must be a non-empty list")
+    lines = []
+    for number, item in enumerate(items, 1):
+        try:
+            lines.append(_parse_line(item))
+        except ValueError as e:
+            raise ValueError(f"item {number}: {e}") from None
+    return Sale(index, key, form.cleaned_data, lines)
+
+
+def parse(payload):
+    if not isinstance(payload, dict) or not isinstance(payload.get('sales'), list):
+        raise BatchError("Expected a JSON object with a list of 'sales'")
+    max_batch = get_setting('MAX_BATCH', 500)
+    if len(payload['sales']) > max_batch:
+        raise BatchError(f"At most {max_batch} sales can be posted at once")
+
+    sales, results = [], {}
+    for index, data in enumerate(payload['sales']):
+        try:
+            sales.append(_parse_sale(index, data))
+        except ValueError as e:
+            results[index] = {'key': data.get('key') if isinstance(data, dict) else None, 'status': INVALID, 'error': str(e)}
+    return sales, results
+
+
+# splits the parsed sales into the ones to write and the rest, reading only
+def _plan(sales, results):
+    keys = {sale.key for sale in sales}
+    known = dict(SaleBill.objects.filter(client_key__in=keys).values_list('client_key', 'billno'))
+    stocks = set(Stock.objects.filter(pk__in={line.stock_id for sale in sales for line in sale.lines}, is_deleted=False).values_list('id', flat=True))
+    customers = dict(Customer.objects.filter(phone__in={sale.customer['phone'] for sale in sales}).values_list('phone', 'id'))
+    gstins = {sale.customer['gstin'] for sale in sales if sale.customer['gstin']}
+    taken_gstins = dict(Customer.objects.filter(gstin__in=gstins).values_list('gstin', 'phone'))
+
+    new, new_customers, seen = [], {}, set()
+    for sale in sales:
+        result = {'key': sale.key}
+        missing = [line.stock_id for line in sale.lines if line.stock_id not in stocks]
+        phone, gstin = sale.customer['phone'], sale.customer['gstin']
+        if sale.key in known or sale.key in seen:
+            # billno is filled in for keys first seen in this batch once they are written
+            result.update(status=DUPLICATE, billno=known.get(sale.key))
+        elif missing:
+            result.update(status=INVALID, error=f"no stock with id {missing[0]}")
+        elif phone not in customers and gstin and taken_gstins.setdefault(gstin, phone) != phone:
+            result.update(status=INVALID, error="customer gstin: This GSTIN is already registered to a customer with another phone number")
+        else:
+            result['status'] = CREATED
+            new.append(sale)
+            seen.add(sale.key)
+            if phone not in customers:
+                new_customers.setdefault(phone, sale.customer)
+        results[sale.index] = result
+    return new, new_customers
+
+
+def _write(sales, new_customers):
+    if new_customers:
+        Customer.objects.bulk_create([Customer(**data) for data in new_customers.values()])
+    # SQLite does not return the ids of bulk inserted rows, they are read back by their unique columns
+    customers = dict(Customer.objects.filter(phone__in={sale.customer['phone'] for sale in sales}).values_list('phone', 'id'))
+    bills = []
+    for sale in sales:
+        bill = SaleBill(customer_id=customers[sale.customer['phone']], client_key=sale.key)
+        bill.bill_to(sale.customer['name'], sale.customer['address'], sale.customer['gstin'])
+        bills.append(bill)
+    SaleBill.objects.bulk_create(bills)
+    bills = {bill.client_key: bill for bill in SaleBill.objects.filter(client_key__in=[sale.key for sale in sales])}
+    SaleItem.objects.bulk_create([
+        SaleItem(billno=bills[sale.key], stock_id=line.stock_id, quantity=line.quantity, perprice=line.perprice, totalprice=line.quantity * line.perprice)
+        for sale in sales for line in sale.lines
+    ])
+
+    sold = defaultdict(int)
+    for sale in sales:
+        for line in sale.lines:
+            sold[line.stock_id] += line.quantity
+    stocks = list(Stock.objects.filter(pk__in=list(sold)))
+    Stock.objects.filter(pk__in=list(sold)).update(
+        quantity=F('quantity') - Case(*[When(pk=pk, then=Value(quantity)) for pk, quantity in sold.items()], output_field=IntegerField()),
+        version=F('version') + 1,
+        updated_at=timezone.now(),
+    )
+    valuation.record_sale_issues(SaleItem.objects.filter(billno__in=list(bills.values())).only('id', 'stock_id', 'quantity').order_by('id'))
+
+    # bulk_create and update() send no signals: the audit trail, the caches and the reorder check get them here,
+    # the stocks with their quantity after the batch and the snapshot from before it
+    for bill in bills.values():
+        post_save.send(sender=SaleBill, instance=bill, created=True, update_fields=None, raw=False, using='default')
+    for stock in stocks:
+        stock.quantity -= sold[stock.pk]
+        stock.version += 1
+        post_save.send(sender=Stock, instance=stock, created=False, update_fields=frozenset(['quantity', 'version']), raw=False, using='default')
+    return {key: bill.billno for key, bill in bills.items()}
+
+
+# writes the parsed sales, returns the results in the order they were posted
+def ingest(sales, results, attempts=3):
+    for attempt in range(attempts):
+        results = dict(results)
+        new, new_customers = _plan(sales, results)
+        if not new:
+            break
+        try:
+            with transaction.atomic():
+                billnos = _write(new, new_customers)
+        except IntegrityError:
+            # another batch wrote one of the keys, customers or GSTINs first, plan again
+            if attempt == attempts - 1:
+                raise
+            continue
+        for result in results.values():
+            if result.get('status') in (CREATED, DUPLICATE) and result.get('billno') is None:
+                result['billno'] = billnos[result['key']]
+        break
+    return [results[index] for index in sorted(results)]
@@ -0,0 +1,34 @@
+import time
+from datetime import datetime
+
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+
+from transactions import archive
+
+
+class Command(BaseCommand):
+    help = 'Moves old purchase and sale bills into the archive tables, oldest first, one transaction per batch.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('kind', nargs='?', choices=[archive.PURCHASE, archive.SALE], help='bills to move (default: both)')
+        parser.add_argument('--before', help='archive bills older than this day, YYYY-MM-DD (default: from BILL_ARCHIVE["KEEP_YEARS"])')
+        parser.add_argument('--batch-size', type=int, help='bills per transaction (default: BILL_ARCHIVE["BATCH_SIZE"])')
+        parser.add_argument('--dry-run', action='store_true', help='only count the bills that would be moved')
+
+    def handle(self, *args, **options):
+        try:
+            before = timezone.make_aware(datetime.strptime(options['before'], '%Y-%m-%d')) if options['before'] else archive.cutoff()
+        except ValueError as e:
+            raise CommandError(e)
+
+        for kind in [options['kind']] if options['kind'] else [archive.PURCHASE, archive.SALE]:
+            if options['dry_run']:
+                self.stdout.write(f"{archive.pending(kind, before)} {kind} bills are older than {before.date()}")
+                continue
+            began = time.perf_counter()
+            moved = archive.archive_bills(
+                kind, before, options['batch_size'],
+                progress=lambda moved, total: self.stdout.write(f"  {kind}: {moved}/{total}"),
+            )
+            self.stdout.write(f"Archived {moved} {kind} bills older than {before.date()} in {time.perf_counter() - began:.2f} s")
@@ -0,0 +1,38 @@
+import time
+from datetime import datetime, timedelta
+
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+
+from transactions import pdf
+
+
+class Command(BaseCommand):
+    help = 'Renders the purchase or sale bills of a date range to PDF, in parallel, into one zip archive.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('kind', choices=[pdf.SALE, pdf.PURCHASE])
+        parser.add_argument('--start', help='first day, YYYY-MM-DD (default: today)')
+        parser.add_argument('--end', help='last day, YYYY-MM-DD (default: the start day)')
+        parser.add_argument('--output', help='archive path (default: <kind>-bills-<start>-<end>.zip)')
+        parser.add_argument('--workers', type=int, help='render processes (default: one per CPU)')
+
+    def handle(self, *args, **options):
+        try:
+            start = datetime.strptime(options['start'], '%Y-%m-%d').date() if options['start'] else timezone.localdate()
+            end = datetime.strptime(options['end'], '%Y-%m-%d').date() if options['end'] else start
+        except ValueError as e:
+            raise CommandError(e)
+        output = options['output'] or '%s-bills-%s-%s.zip' % (options['kind'], start, end)
+
+        began = time.perf_counter()
+        start = timezone.make_aware(datetime.combine(start, datetime.min.time()))
+        end = timezone.make_aware(datetime.combine(end + timedelta(days=1), datetime.min.time()))
+        # archived bills are all older than the current ones, so they come first in bill order too
+        bills = pdf.load_bills(options['kind'], start=start, end=end, archived=True) + pdf.load_bills(options['kind'], start=start, end=end)
+        loaded = time.perf_counter()
+        count = pdf.write_archive(output, bills, workers=options['workers'])
+        self.stdout.write(
+            f"Wrote {count} bills to {output} in {time.perf_counter() - began:.2f} s "
+            f"(loading {loaded - began:.2f} s, rendering {time.perf_counter() - loaded:.2f} s)"
+        )
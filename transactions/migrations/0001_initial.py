@@ -0,0 +1,110 @@
+# Generated by Django 3.0.7 on 2026-10-19 16:12
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    initial = True
+
+    dependencies = [
+        ('inventory', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PurchaseBill',
+            fields=[
+                ('billno', models.AutoField(primary_key=True, serialize=False)),
+                ('time', models.DateTimeField(auto_now=True)),
+                ('auto_generated', models.BooleanField(default=False)),
+            ],
+        ),
+        migrations.CreateModel(
+            name='SaleBill',
+            fields=[
+                ('billno', models.AutoField(primary_key=True, serialize=False)),
+                ('time', models.DateTimeField(auto_now=True)),
+                ('name', models.CharField(max_length=150)),
+                ('phone', models.CharField(max_length=12)),
+                ('address', models.CharField(max_length=200)),
+                ('email', models.EmailField(max_length=254)),
+                ('gstin', models.CharField(max_length=15)),
+            ],
+        ),
+        migrations.CreateModel(
+            name='Supplier',
+            fields=[
+                ('id', models.AutoField(primary_key=True, serialize=False)),
+                ('name', models.CharField(max_length=150)),
+                ('phone', models.CharField(max_length=12, unique=True)),
+                ('address', models.CharField(max_length=200)),
+                ('email', models.EmailField(max_length=254, unique=True)),
+                ('gstin', models.CharField(max_length=15, unique=True)),
+                ('is_deleted', models.BooleanField(default=False)),
+            ],
+        ),
+        migrations.CreateModel(
+            name='SaleItem',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('quantity', models.IntegerField(default=1)),
+                ('perprice', models.IntegerField(default=1)),
+                ('totalprice', models.IntegerField(default=1)),
+                ('total_sales_value', models.IntegerField(default=0)),
+                ('billno', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='salebillno', to='transactions.SaleBill')),
+                ('stock', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='saleitem', to='inventory.Stock')),
+            ],
+        ),
+        migrations.CreateModel(
+            name='SaleBillDetails',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('eway', models.CharField(blank=True, max_length=50, null=True)),
+                ('veh', models.CharField(blank=True, max_length=50, null=True)),
+                ('destination', models.CharField(blank=True, max_length=50, null=True)),
+                ('po', models.CharField(blank=True, max_length=50, null=True)),
+                ('cgst', models.CharField(blank=True, max_length=50, null=True)),
+                ('sgst', models.CharField(blank=True, max_length=50, null=True)),
+                ('igst', models.CharField(blank=True, max_length=50, null=True)),
+                ('cess', models.CharField(blank=True, max_length=50, null=True)),
+                ('tcs', models.CharField(blank=True, max_length=50, null=True)),
+                ('total', models.CharField(blank=True, max_length=50, null=True)),
+                ('billno', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='saledetailsbillno', to='transactions.SaleBill')),
+            ],
+        ),
+        migrations.CreateModel(
+            name='PurchaseItem',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('quantity', models.IntegerField(default=1)),
+                ('perprice', models.IntegerField(default=1)),
+                ('totalprice', models.IntegerField(default=1)),
+                ('billno', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='purchasebillno', to='transactions.PurchaseBill')),
+                ('stock', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='purchaseitem', to='inventory.Stock')),
+            ],
+        ),
+        migrations.CreateModel(
+            name='PurchaseBillDetails',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('eway', models.CharField(blank=True, max_length=50, null=True)),
+                ('veh', models.CharField(blank=True, max_length=50, null=True)),
+                ('destination', models.CharField(blank=True, max_length=50, null=True)),
+                ('po', models.CharField(blank=True, max_length=50, null=True)),
+                ('cgst', models.CharField(blank=True, max_length=50, null=True)),
+                ('sgst', models.CharField(blank=True, max_length=50, null=True)),
+                ('igst', models.CharField(blank=True, max_length=50, null=True)),
+                ('cess', models.CharField(blank=True, max_length=50, null=True)),
+                ('tcs', models.CharField(blank=True, max_length=50, null=True)),
+                ('total', models.CharField(blank=True, max_length=50, null=True)),
+                ('billno', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='purchasedetailsbillno', to='transactions.PurchaseBill')),
+            ],
+        ),
+        migrations.AddField(
+            model_name='purchasebill',
+            name='supplier',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='purchasesupplier', to='transactions.Supplier'),
+        ),
+    ]
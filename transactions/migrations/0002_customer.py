@@ -0,0 +1,28 @@
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('transactions', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Customer',
+            fields=[
+                ('id', models.AutoField(primary_key=True, serialize=False)),
+                ('name', models.CharField(max_length=150)),
+                ('phone', models.CharField(max_length=12, unique=True)),
+                ('address', models.CharField(max_length=200)),
+                ('email', models.EmailField(max_length=254)),
+                ('gstin', models.CharField(blank=True, max_length=15, null=True, unique=True)),
+            ],
+        ),
+        migrations.AddField(
+            model_name='salebill',
+            name='customer',
+            field=models.ForeignKey(null=True, on_delete=django.db.models.deletion.CASCADE, related_name='salebills', to='transactions.Customer'),
+        ),
+    ]
@@ -0,0 +1,55 @@
+from django.db import migrations
+
+BATCH_SIZE = 1000
+
+
+def backfill_customers(apps, schema_editor):
+    SaleBill = apps.get_model('transactions', 'SaleBill')
+    Customer = apps.get_model('transactions', 'Customer')
+
+    # bills are walked oldest first, so a customer keeps the details of their first bill
+    by_phone = dict(Customer.objects.values_list('phone', 'id'))
+    by_gstin = dict(Customer.objects.exclude(gstin=None).values_list('gstin', 'id'))
+
+    last_billno = 0
+    while True:
+        bills = list(
+            SaleBill.objects.filter(billno__gt=last_billno, customer=None)
+            .order_by('billno')
+            .only('billno', 'name', 'phone', 'address', 'email', 'gstin')[:BATCH_SIZE]
+        )
+        if not bills:
+            break
+        last_billno = bills[-1].billno
+
+        new_customers = {}
+        for bill in bills:
+            phone = bill.phone.strip()
+            gstin = bill.gstin.strip().upper() or None
+            if phone in by_phone or phone in new_customers:
+                continue
+            if gstin and (gstin in by_gstin or any(c.gstin == gstin for c in new_customers.values())):
+                continue
+            new_customers[phone] = Customer(name=bill.name, phone=phone, address=bill.address, email=bill.email, gstin=gstin)
+        Customer.objects.bulk_create(new_customers.values())
+
+        for phone, pk, gstin in Customer.objects.filter(phone__in=new_customers).values_list('phone', 'id', 'gstin'):
+            by_phone[phone] = pk
+            if gstin:
+                by_gstin[gstin] = pk
+
+        for bill in bills:
+            gstin = bill.gstin.strip().upper()
+            bill.customer_id = by_phone.get(bill.phone.strip()) or by_gstin.get(gstin)
+        SaleBill.objects.bulk_update(bills, ['customer'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('transactions', '0002_customer'),
+    ]
+
+    operations = [
+        migrations.RunPython(backfill_customers, migrations.RunPython.noop),
+    ]
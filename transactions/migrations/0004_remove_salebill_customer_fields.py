@@ -0,0 +1,37 @@
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('transactions', '0003_backfill_customers'),
+    ]
+
+    operations = [
+        migrations.RemoveField(
+            model_name='salebill',
+            name='address',
+        ),
+        migrations.RemoveField(
+            model_name='salebill',
+            name='email',
+        ),
+        migrations.RemoveField(
+            model_name='salebill',
+            name='gstin',
+        ),
+        migrations.RemoveField(
+            model_name='salebill',
+            name='name',
+        ),
+        migrations.RemoveField(
+            model_name='salebill',
+            name='phone',
+        ),
+        migrations.AlterField(
+            model_name='salebill',
+            name='customer',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='salebills', to='transactions.Customer'),
+        ),
+    ]
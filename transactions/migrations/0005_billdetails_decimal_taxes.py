@@ -0,0 +1,105 @@
+from decimal import Decimal, InvalidOperation
+
+from django.db import migrations, models
+
+BATCH_SIZE = 1000
+TAX_FIELDS = ['cgst', 'sgst', 'igst', 'cess', 'tcs', 'total']
+
+
+def parse_amount(value):
+    # the old columns were free text, anything that is not a number becomes NULL (and is kept in UnparsedTaxAmount)
+    if value is None:
+        return None
+    try:
+        amount = Decimal(value.strip().replace(',', '')).quantize(Decimal('0.01'))
+    except (InvalidOperation, ValueError):
+        return None
+    return amount if amount.is_finite() and abs(amount) < 10 ** 10 else None
+
+
+def copy_taxes(model_name, kind):
+    def forwards(apps, schema_editor):
+        model = apps.get_model('transactions', model_name)
+        unparsed = apps.get_model('transactions', 'UnparsedTaxAmount')
+        last_pk = 0
+        while True:
+            rows = list(model.objects.filter(pk__gt=last_pk).order_by('pk').only('pk', 'billno', *TAX_FIELDS)[:BATCH_SIZE])
+            if not rows:
+                break
+            last_pk = rows[-1].pk
+            kept = []
+            for row in rows:
+                for field in TAX_FIELDS:
+                    text = getattr(row, field)
+                    amount = parse_amount(text)
+                    setattr(row, field + '_amount', amount)
+                    if amount is None and text and text.strip():
+                        kept.append(unparsed(kind=kind, billno=row.billno_id, details_id=row.pk, field=field, text=text))
+            model.objects.bulk_update(rows, [field + '_amount' for field in TAX_FIELDS])
+            unparsed.objects.bulk_create(kept)
+
+    # the amounts go back as text, the texts that were not numbers as they were
+    def backwards(apps, schema_editor):
+        model = apps.get_model('transactions', model_name)
+        unparsed = apps.get_model('transactions', 'UnparsedTaxAmount')
+        texts = {(details_id, field): text for details_id, field, text in unparsed.objects.filter(kind=kind).values_list('details_id', 'field', 'text')}
+        last_pk = 0
+        while True:
+            rows = list(model.objects.filter(pk__gt=last_pk).order_by('pk').only('pk', *TAX_FIELDS, *[field + '_amount' for field in TAX_FIELDS])[:BATCH_SIZE])
+            if not rows:
+                break
+            last_pk = rows[-1].pk
+            for row in rows:
+                for field in TAX_FIELDS:
+                    amount = getattr(row, field + '_amount')
+                    setattr(row, field, str(amount) if amount is not None else texts.get((row.pk, field)))
+            model.objects.bulk_update(rows, TAX_FIELDS)
+        unparsed.objects.filter(kind=kind).delete()
+
+    return forwards, backwards
+
+
+def decimal_fields(model_name):
+    return [
+        migrations.AddField(
+            model_name=model_name,
+            name=field + '_amount',
+            field=models.DecimalField(blank=True, decimal_places=2, max_digits=12, null=True),
+        )
+        for field in TAX_FIELDS
+    ]
+
+
+def swap_fields(model_name):
+    operations = []
+    for field in TAX_FIELDS:
+        operations.append(migrations.RemoveField(model_name=model_name, name=field))
+        operations.append(migrations.RenameField(model_name=model_name, old_name=field + '_amount', new_name=field))
+    return operations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('transactions', '0004_remove_salebill_customer_fields'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='UnparsedTaxAmount',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('kind', models.CharField(choices=[('purchase', 'Purchase'), ('sale', 'Sale')], max_length=8)),
+                ('billno', models.IntegerField(db_index=True)),
+                ('details_id', models.IntegerField()),
+                ('field', models.CharField(max_length=10)),
+                ('text', models.CharField(max_length=50)),
+            ],
+        ),
+        *decimal_fields('purchasebilldetails'),
+        *decimal_fields('salebilldetails'),
+        migrations.RunPython(*copy_taxes('PurchaseBillDetails', 'purchase')),
+        migrations.RunPython(*copy_taxes('SaleBillDetails', 'sale')),
+        *swap_fields('purchasebilldetails'),
+        *swap_fields('salebilldetails'),
+    ]
@@ -0,0 +1,40 @@
+from django.db import migrations, models
+from django.db.models import Count, Max
+import django.db.models.deletion
+
+BATCH_SIZE = 1000
+
+
+def drop_duplicate_details(model_name):
+    # bills could end up with several details rows through the old ForeignKey, keep the newest one
+    def forwards(apps, schema_editor):
+        model = apps.get_model('transactions', model_name)
+        duplicates = list(
+            model.objects.values('billno').annotate(rows=Count('pk'), keep=Max('pk')).filter(rows__gt=1).values_list('billno', 'keep')
+        )
+        for start in range(0, len(duplicates), BATCH_SIZE):
+            batch = duplicates[start:start + BATCH_SIZE]
+            model.objects.filter(billno__in=[billno for billno, keep in batch]).exclude(pk__in=[keep for billno, keep in batch]).delete()
+    return forwards
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('transactions', '0005_billdetails_decimal_taxes'),
+    ]
+
+    operations = [
+        migrations.RunPython(drop_duplicate_details('PurchaseBillDetails'), migrations.RunPython.noop),
+        migrations.RunPython(drop_duplicate_details('SaleBillDetails'), migrations.RunPython.noop),
+        migrations.AlterField(
+            model_name='purchasebilldetails',
+            name='billno',
+            field=models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, related_name='purchasedetailsbillno', to='transactions.PurchaseBill'),
+        ),
+        migrations.AlterField(
+            model_name='salebilldetails',
+            name='billno',
+            field=models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, related_name='saledetailsbillno', to='transactions.SaleBill'),
+        ),
+    ]
@@ -0,0 +1,28 @@
+# Generated by Django 3.0.7 on 2026-10-19 16:40
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('transactions', '0006_billdetails_one_to_one'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='purchasebilldetails',
+            name='version',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='salebilldetails',
+            name='version',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='supplier',
+            name='version',
+            field=models.PositiveIntegerField(default=0),
+        ),
+    ]
@@ -0,0 +1,91 @@
+# Generated by Django 3.0.7 on 2026-10-19 16:57
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('inventory', '0004_stock_version'),
+        ('transactions', '0007_version_columns'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ArchivedPurchaseBill',
+            fields=[
+                ('billno', models.IntegerField(primary_key=True, serialize=False)),
+                ('time', models.DateTimeField(db_index=True)),
+                ('eway', models.CharField(blank=True, max_length=50, null=True)),
+                ('veh', models.CharField(blank=True, max_length=50, null=True)),
+                ('destination', models.CharField(blank=True, max_length=50, null=True)),
+                ('po', models.CharField(blank=True, max_length=50, null=True)),
+                ('cgst', models.DecimalField(blank=True, decimal_places=2, max_digits=12, null=True)),
+                ('sgst', models.DecimalField(blank=True, decimal_places=2, max_digits=12, null=True)),
+                ('igst', models.DecimalField(blank=True, decimal_places=2, max_digits=12, null=True)),
+                ('cess', models.DecimalField(blank=True, decimal_places=2, max_digits=12, null=True)),
+                ('tcs', models.DecimalField(blank=True, decimal_places=2, max_digits=12, null=True)),
+                ('total', models.DecimalField(blank=True, decimal_places=2, max_digits=12, null=True)),
+                ('auto_generated', models.BooleanField(default=False)),
+                ('supplier', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='archivedpurchases', to='transactions.Supplier')),
+            ],
+            options={
+                'abstract': False,
+            },
+        ),
+        migrations.CreateModel(
+            name='ArchivedSaleBill',
+            fields=[
+                ('billno', models.IntegerField(primary_key=True, serialize=False)),
+                ('time', models.DateTimeField(db_index=True)),
+                ('eway', models.CharField(blank=True, max_length=50, null=True)),
+                ('veh', models.CharField(blank=True, max_length=50, null=True)),
+                ('destination', models.CharField(blank=True, max_length=50, null=True)),
+                ('po', models.CharField(blank=True, max_length=50, null=True)),
+                ('cgst', models.DecimalField(blank=True, decimal_places=2, max_digits=12, null=True)),
+                ('sgst', models.DecimalField(blank=True, decimal_places=2, max_digits=12, null=True)),
+                ('igst', models.DecimalField(blank=True, decimal_places=2, max_digits=12, null=True)),
+                ('cess', models.DecimalField(blank=True, decimal_places=2, max_digits=12, null=True)),
+                ('tcs', models.DecimalField(blank=True, decimal_places=2, max_digits=12, null=True)),
+                ('total', models.DecimalField(blank=True, decimal_places=2, max_digits=12, null=True)),
+                ('customer', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='archivedsales', to='transactions.Customer')),
+            ],
+            options={
+                'abstract': False,
+            },
+        ),
+        migrations.AlterField(
+            model_name='purchasebill',
+            name='time',
+            field=models.DateTimeField(auto_now=True, db_index=True),
+        ),
+        migrations.AlterField(
+            model_name='salebill',
+            name='time',
+            field=models.DateTimeField(auto_now=True, db_index=True),
+        ),
+        migrations.CreateModel(
+            name='ArchivedSaleItem',
+            fields=[
+                ('id', models.IntegerField(primary_key=True, serialize=False)),
+                ('quantity', models.IntegerField(default=1)),
+                ('perprice', models.IntegerField(default=1)),
+                ('totalprice', models.IntegerField(default=1)),
+                ('total_sales_value', models.IntegerField(default=0)),
+                ('billno', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='items', to='transactions.ArchivedSaleBill')),
+                ('stock', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='archivedsaleitem', to='inventory.Stock')),
+            ],
+        ),
+        migrations.CreateModel(
+            name='ArchivedPurchaseItem',
+            fields=[
+                ('id', models.IntegerField(primary_key=True, serialize=False)),
+                ('quantity', models.IntegerField(default=1)),
+                ('perprice', models.IntegerField(default=1)),
+                ('totalprice', models.IntegerField(default=1)),
+                ('billno', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='items', to='transactions.ArchivedPurchaseBill')),
+                ('stock', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='archivedpurchaseitem', to='inventory.Stock')),
+            ],
+        ),
+    ]
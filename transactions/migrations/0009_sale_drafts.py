@@ -0,0 +1,42 @@
+# Generated by Django 3.0.7 on 2026-10-19 17:07
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('inventory', '0005_stock_sku'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('transactions', '0008_bill_archive'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SaleDraft',
+            fields=[
+                ('id', models.AutoField(primary_key=True, serialize=False)),
+                ('till', models.CharField(blank=True, max_length=30)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='saledrafts', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'unique_together': {('user', 'till')},
+            },
+        ),
+        migrations.CreateModel(
+            name='SaleDraftLine',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('quantity', models.IntegerField(default=1)),
+                ('perprice', models.IntegerField(default=1)),
+                ('draft', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='lines', to='transactions.SaleDraft')),
+                ('stock', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='draftlines', to='inventory.Stock')),
+            ],
+            options={
+                'unique_together': {('draft', 'stock')},
+            },
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 3.0.7 on 2026-10-19 17:12
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('transactions', '0009_sale_drafts'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='salebill',
+            name='client_key',
+            field=models.CharField(blank=True, max_length=64, null=True, unique=True),
+        ),
+    ]
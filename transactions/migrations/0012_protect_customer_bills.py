@@ -0,0 +1,24 @@
+# Generated by Django 3.0.7 on 2026-10-19 17:37
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('transactions', '0011_supplier_updated_at'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='archivedsalebill',
+            name='customer',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.PROTECT, related_name='archivedsales', to='transactions.Customer'),
+        ),
+        migrations.AlterField(
+            model_name='salebill',
+            name='customer',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.PROTECT, related_name='salebills', to='transactions.Customer'),
+        ),
+    ]
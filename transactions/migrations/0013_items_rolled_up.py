@@ -0,0 +1,31 @@
+# Generated by Django 3.0.7 on 2026-10-19 17:53
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('transactions', '0012_protect_customer_bills'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='purchaseitem',
+            name='rolled_up',
+            field=models.BooleanField(default=False),
+        ),
+        migrations.AddField(
+            model_name='saleitem',
+            name='rolled_up',
+            field=models.BooleanField(default=False),
+        ),
+        migrations.AddIndex(
+            model_name='purchaseitem',
+            index=models.Index(condition=models.Q(rolled_up=False), fields=['id'], name='purchaseitem_not_rolled_up'),
+        ),
+        migrations.AddIndex(
+            model_name='saleitem',
+            index=models.Index(condition=models.Q(rolled_up=False), fields=['id'], name='saleitem_not_rolled_up'),
+        ),
+    ]
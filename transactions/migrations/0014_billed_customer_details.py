@@ -0,0 +1,55 @@
+# Generated by Django 3.0.7 on 2026-10-19 17:56
+
+from django.db import migrations, models
+from django.db.models import OuterRef, Subquery
+
+
+# bills issued so far are stamped with their customer's current details, the best record there is of them
+def snapshot_customers(apps, schema_editor):
+    Customer = apps.get_model('transactions', 'Customer')
+    for name in ('SaleBill', 'ArchivedSaleBill'):
+        customer = Customer.objects.filter(pk=OuterRef('customer_id'))
+        apps.get_model('transactions', name).objects.update(**{
+            f'customer_{field}': Subquery(customer.values(field)[:1]) for field in ('name', 'address', 'gstin')
+        })
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('transactions', '0013_items_rolled_up'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='archivedsalebill',
+            name='customer_address',
+            field=models.CharField(blank=True, default='', max_length=200),
+        ),
+        migrations.AddField(
+            model_name='archivedsalebill',
+            name='customer_gstin',
+            field=models.CharField(blank=True, max_length=15, null=True),
+        ),
+        migrations.AddField(
+            model_name='archivedsalebill',
+            name='customer_name',
+            field=models.CharField(blank=True, default='', max_length=150),
+        ),
+        migrations.AddField(
+            model_name='salebill',
+            name='customer_address',
+            field=models.CharField(blank=True, default='', max_length=200),
+        ),
+        migrations.AddField(
+            model_name='salebill',
+            name='customer_gstin',
+            field=models.CharField(blank=True, max_length=15, null=True),
+        ),
+        migrations.AddField(
+            model_name='salebill',
+            name='customer_name',
+            field=models.CharField(blank=True, default='', max_length=150),
+        ),
+        migrations.RunPython(snapshot_customers, migrations.RunPython.noop),
+    ]
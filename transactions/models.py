@@ -1,7 +1,9 @@
-from django.db import models
+from django.db import IntegrityError, models, transaction
+from core.concurrency import VersionedModel
 from inventory.models import Stock
+from inventory.cache import stock_cache
 
-class Supplier(models.Model):
+class Supplier(VersionedModel):
     id = models.AutoField(primary_key=True)
     name = models.CharField(max_length=150)
     phone = models.CharField(max_length=12, unique=True)
@@ -9,27 +11,36 @@ class Supplier(models.Model):
     email = models.EmailField(max_length=254, unique=True)
     gstin = models.CharField(max_length=15, unique=True)
     is_deleted = models.BooleanField(default=False)
+    updated_at = models.DateTimeField(auto_now=True)    # read by delta sync (core/sync.py)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['updated_at', 'id']),
+        ]
 
     def __str__(self):
         return self.name
 
 class PurchaseBill(models.Model):
     billno = models.AutoField(primary_key=True)
-    time = models.DateTimeField(auto_now=True)
+    time = models.DateTimeField(auto_now=True, db_index=True)
     supplier = models.ForeignKey(Supplier, on_delete=models.CASCADE, related_name='purchasesupplier')
     auto_generated = models.BooleanField(default=False)
 
+    archived = False
+
     def __str__(self):
         return f"Bill no: {self.billno}"
 
     def get_items_list(self):
-        return PurchaseItem.objects.filter(billno=self)
+        return PurchaseItem.objects.filter(billno=self).select_related('stock')
 
     def get_total_price(self):
         purchaseitems = PurchaseItem.objects.filter(billno=self)
         total = 0
         for item in purchaseitems:
             total += item.totalprice
+        return total
 
 class PurchaseItem(models.Model):
     billno = models.ForeignKey(PurchaseBill, on_delete=models.CASCADE, related_name='purchasebillno')
@@ -37,43 +48,74 @@ class PurchaseItem(models.Model):
     quantity = models.IntegerField(default=1)
     perprice = models.IntegerField(default=1)
     totalprice = models.IntegerField(default=1)
+    rolled_up = models.BooleanField(default=False)     # counted in the monthly rollups (inventory/analytics.py)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['id'], condition=models.Q(rolled_up=False), name='purchaseitem_not_rolled_up'),
+        ]
 
     def __str__(self):
-        return f"Bill no: {self.billno.billno}, Item = {self.stock.get_full_name()}"
+        return f"Bill no: {self.billno_id}, Item = {stock_cache.get(self.stock_id)}"
 
-class PurchaseBillDetails(models.Model):
-    billno = models.ForeignKey(PurchaseBill, on_delete=models.CASCADE, related_name='purchasedetailsbillno')
+class PurchaseBillDetails(VersionedModel):
+    billno = models.OneToOneField(PurchaseBill, on_delete=models.CASCADE, related_name='purchasedetailsbillno')
 
     eway = models.CharField(max_length=50, blank=True, null=True)
     veh = models.CharField(max_length=50, blank=True, null=True)
     destination = models.CharField(max_length=50, blank=True, null=True)
     po = models.CharField(max_length=50, blank=True, null=True)
 
-    cgst = models.CharField(max_length=50, blank=True, null=True)
-    sgst = models.CharField(max_length=50, blank=True, null=True)
-    igst = models.CharField(max_length=50, blank=True, null=True)
-    cess = models.CharField(max_length=50, blank=True, null=True)
-    tcs = models.CharField(max_length=50, blank=True, null=True)
-    total = models.CharField(max_length=50, blank=True, null=True)
+    cgst = models.DecimalField(max_digits=12, decimal_places=2, blank=True, null=True)
+    sgst = models.DecimalField(max_digits=12, decimal_places=2, blank=True, null=True)
+    igst = models.DecimalField(max_digits=12, decimal_places=2, blank=True, null=True)
+    cess = models.DecimalField(max_digits=12, decimal_places=2, blank=True, null=True)
+    tcs = models.DecimalField(max_digits=12, decimal_places=2, blank=True, null=True)
+    total = models.DecimalField(max_digits=12, decimal_places=2, blank=True, null=True)
 
     def __str__(self):
-        return f"Bill no: {self.billno.billno}"
-
-class SaleBill(models.Model):
-    billno = models.AutoField(primary_key=True)
-    time = models.DateTimeField(auto_now=True)
+        return f"Bill no: {self.billno_id}"
 
+class Customer(models.Model):
+    id = models.AutoField(primary_key=True)
     name = models.CharField(max_length=150)
-    phone = models.CharField(max_length=12)
+    phone = models.CharField(max_length=12, unique=True)                           # customers are deduplicated on phone
     address = models.CharField(max_length=200)
     email = models.EmailField(max_length=254)
-    gstin = models.CharField(max_length=15)
+    gstin = models.CharField(max_length=15, unique=True, blank=True, null=True)   # null for customers without a GSTIN
+
+    def __str__(self):
+        return self.name
+
+    def get_bills(self):
+        return SaleBill.objects.filter(customer=self).order_by('-time')
+
+    def get_lifetime_value(self):
+        total = models.Sum('totalprice')
+        current = SaleItem.objects.filter(billno__customer=self).aggregate(total=total)['total'] or 0
+        return current + (ArchivedSaleItem.objects.filter(billno__customer=self).aggregate(total=total)['total'] or 0)
+
+class SaleBill(models.Model):
+    billno = models.AutoField(primary_key=True)
+    time = models.DateTimeField(auto_now=True, db_index=True)
+    customer = models.ForeignKey(Customer, on_delete=models.PROTECT, related_name='salebills')   # a customer with bills cannot be deleted
+    client_key = models.CharField(max_length=64, unique=True, blank=True, null=True)   # idempotency key of sales posted by terminals (transactions/ingest.py)
+
+    # the customer's details as billed, later changes to the customer do not alter issued invoices
+    customer_name = models.CharField(max_length=150, blank=True, default='')
+    customer_address = models.CharField(max_length=200, blank=True, default='')
+    customer_gstin = models.CharField(max_length=15, blank=True, null=True)
+
+    archived = False
 
     def __str__(self):
         return f"Bill no: {self.billno}"
 
+    def bill_to(self, name, address, gstin):
+        self.customer_name, self.customer_address, self.customer_gstin = name, address, gstin
+
     def get_items_list(self):
-        return SaleItem.objects.filter(billno=self)
+        return SaleItem.objects.filter(billno=self).select_related('stock')
 
     def get_total_price(self):
         saleitems = SaleItem.objects.filter(billno=self)
@@ -92,24 +134,152 @@ class SaleItem(models.Model):
     perprice = models.IntegerField(default=1)
     totalprice = models.IntegerField(default=1)
     total_sales_value = models.IntegerField(default=0)  # New field for total sales value
+    rolled_up = models.BooleanField(default=False)     # counted in the monthly rollups (inventory/analytics.py)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['id'], condition=models.Q(rolled_up=False), name='saleitem_not_rolled_up'),
+        ]
+
+    def __str__(self):
+        return f"Bill no: {self.billno_id}, Item = {stock_cache.get(self.stock_id)}"
+
+class SaleBillDetails(VersionedModel):
+    billno = models.OneToOneField(SaleBill, on_delete=models.CASCADE, related_name='saledetailsbillno')
+
+    eway = models.CharField(max_length=50, blank=True, null=True)
+    veh = models.CharField(max_length=50, blank=True, null=True)
+    destination = models.CharField(max_length=50, blank=True, null=True)
+    po = models.CharField(max_length=50, blank=True, null=True)
+
+    cgst = models.DecimalField(max_digits=12, decimal_places=2, blank=True, null=True)
+    sgst = models.DecimalField(max_digits=12, decimal_places=2, blank=True, null=True)
+    igst = models.DecimalField(max_digits=12, decimal_places=2, blank=True, null=True)
+    cess = models.DecimalField(max_digits=12, decimal_places=2, blank=True, null=True)
+    tcs = models.DecimalField(max_digits=12, decimal_places=2, blank=True, null=True)
+    total = models.DecimalField(max_digits=12, decimal_places=2, blank=True, null=True)
+
+    def __str__(self):
+        return f"Bill no: {self.billno_id}"
+
+
+# Tax amounts of bill details that were not numbers when the free text columns became decimals (migration 0005),
+# kept so they can be corrected by hand and are written back if that migration is reversed
+class UnparsedTaxAmount(models.Model):
+    kind = models.CharField(max_length=8, choices=[('purchase', 'Purchase'), ('sale', 'Sale')])
+    billno = models.IntegerField(db_index=True)
+    details_id = models.IntegerField()                  # the PurchaseBillDetails or SaleBillDetails row it was read from
+    field = models.CharField(max_length=10)
+    text = models.CharField(max_length=50)
+
+    def __str__(self):
+        return f"{self.get_kind_display()} bill no: {self.billno}, {self.field} = {self.text!r}"
+
+
+# The sale a till is building up scan by scan (ScanView), one open draft per user and till,
+# turned into a SaleBill at checkout through the new sale form
+class SaleDraft(models.Model):
+    id = models.AutoField(primary_key=True)
+    user = models.ForeignKey('auth.User', on_delete=models.CASCADE, related_name='saledrafts')
+    till = models.CharField(max_length=30, blank=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        unique_together = ('user', 'till')
+
+    def __str__(self):
+        return f"Draft sale {self.id} ({self.till or 'no till'})"
+
+    # one UPDATE when the stock is already on the draft, an INSERT otherwise; returns the line's quantity
+    def add(self, stock_id, quantity, perprice):
+        lines = SaleDraftLine.objects.filter(draft=self, stock_id=stock_id)
+        if not lines.update(quantity=models.F('quantity') + quantity):
+            try:
+                with transaction.atomic():
+                    SaleDraftLine.objects.create(draft=self, stock_id=stock_id, quantity=quantity, perprice=perprice)
+                return quantity
+            except IntegrityError:
+                # the same stock was scanned twice at once, the other scan created the line
+                lines.update(quantity=models.F('quantity') + quantity)
+        return lines.values_list('quantity', flat=True).get()
+
+class SaleDraftLine(models.Model):
+    draft = models.ForeignKey(SaleDraft, on_delete=models.CASCADE, related_name='lines')
+    stock = models.ForeignKey(Stock, on_delete=models.CASCADE, related_name='draftlines')
+    quantity = models.IntegerField(default=1)
+    perprice = models.IntegerField(default=1)
+
+    class Meta:
+        unique_together = ('draft', 'stock')
 
     def __str__(self):
-        return f"Bill no: {self.billno.billno}, Item = {self.stock.get_full_name()}"
+        return f"Draft {self.draft_id}, Item = {stock_cache.get(self.stock_id)}"
+
 
-class SaleBillDetails(models.Model):
-    billno = models.ForeignKey(SaleBill, on_delete=models.CASCADE, related_name='saledetailsbillno')
+# Bills older than settings.BILL_ARCHIVE['KEEP_YEARS'] are moved here by transactions/archive.py, keeping their
+# bill and item numbers. Archived bills are read only, so their details live on the bill row itself.
+class ArchivedBill(models.Model):
+    billno = models.IntegerField(primary_key=True)
+    time = models.DateTimeField(db_index=True)
 
     eway = models.CharField(max_length=50, blank=True, null=True)
     veh = models.CharField(max_length=50, blank=True, null=True)
     destination = models.CharField(max_length=50, blank=True, null=True)
     po = models.CharField(max_length=50, blank=True, null=True)
 
-    cgst = models.CharField(max_length=50, blank=True, null=True)
-    sgst = models.CharField(max_length=50, blank=True, null=True)
-    igst = models.CharField(max_length=50, blank=True, null=True)
-    cess = models.CharField(max_length=50, blank=True, null=True)
-    tcs = models.CharField(max_length=50, blank=True, null=True)
-    total = models.CharField(max_length=50, blank=True, null=True)
+    cgst = models.DecimalField(max_digits=12, decimal_places=2, blank=True, null=True)
+    sgst = models.DecimalField(max_digits=12, decimal_places=2, blank=True, null=True)
+    igst = models.DecimalField(max_digits=12, decimal_places=2, blank=True, null=True)
+    cess = models.DecimalField(max_digits=12, decimal_places=2, blank=True, null=True)
+    tcs = models.DecimalField(max_digits=12, decimal_places=2, blank=True, null=True)
+    total = models.DecimalField(max_digits=12, decimal_places=2, blank=True, null=True)
+
+    archived = True
+
+    class Meta:
+        abstract = True
+
+    def __str__(self):
+        return f"Bill no: {self.billno} (archived)"
+
+    def get_items_list(self):
+        return self.items.select_related('stock')
+
+    def get_total_price(self):
+        total = 0
+        for item in self.items.all():
+            total += item.totalprice
+        return total
+
+class ArchivedPurchaseBill(ArchivedBill):
+    supplier = models.ForeignKey(Supplier, on_delete=models.CASCADE, related_name='archivedpurchases')
+    auto_generated = models.BooleanField(default=False)
+
+class ArchivedPurchaseItem(models.Model):
+    id = models.IntegerField(primary_key=True)
+    billno = models.ForeignKey(ArchivedPurchaseBill, on_delete=models.CASCADE, related_name='items')
+    stock = models.ForeignKey(Stock, on_delete=models.CASCADE, related_name='archivedpurchaseitem')
+    quantity = models.IntegerField(default=1)
+    perprice = models.IntegerField(default=1)
+    totalprice = models.IntegerField(default=1)
+
+    def __str__(self):
+        return f"Bill no: {self.billno_id}, Item = {stock_cache.get(self.stock_id)}"
+
+class ArchivedSaleBill(ArchivedBill):
+    customer = models.ForeignKey(Customer, on_delete=models.PROTECT, related_name='archivedsales')
+    customer_name = models.CharField(max_length=150, blank=True, default='')
+    customer_address = models.CharField(max_length=200, blank=True, default='')
+    customer_gstin = models.CharField(max_length=15, blank=True, null=True)
+
+class ArchivedSaleItem(models.Model):
+    id = models.IntegerField(primary_key=True)
+    billno = models.ForeignKey(ArchivedSaleBill, on_delete=models.CASCADE, related_name='items')
+    stock = models.ForeignKey(Stock, on_delete=models.CASCADE, related_name='archivedsaleitem')
+    quantity = models.IntegerField(default=1)
+    perprice = models.IntegerField(default=1)
+    totalprice = models.IntegerField(default=1)
+    total_sales_value = models.IntegerField(default=0)
 
     def __str__(self):
-        return f"Bill no: {self.billno.billno}"
+        return f"Bill no: {self.billno_id}, Item = {stock_cache.get(self.stock_id)}"
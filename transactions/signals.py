@@ -0,0 +1,24 @@
+from django.db.models.signals import post_save
+from django.dispatch import receiver
+
+from inventory.models import Stock
+from jobs.registry import enqueue
+
+# Threshold and excess quantity settings, the threshold is used for stocks without a forecast reorder point
+THRESHOLD_QUANTITY = 5
+EXCESS_QUANTITY = 5
+
+def get_reorder_threshold(stock):
+    # a forecast of 0 (no demand) is kept, only a stock that was never forecast falls back to the threshold
+    return stock.reorder_point if stock.reorder_point is not None else THRESHOLD_QUANTITY
+
+@receiver(post_save, sender=Stock)
+def check_inventory_and_create_purchase_order(sender, instance, created, **kwargs):
+    if created:
+        # New product added, no need to check inventory
+        return
+
+    # Check if the quantity is below the threshold, the purchase order itself is created by the
+    # 'reorder_stock' background job (transactions/tasks.py) so the sale request is not held up
+    if instance.quantity < get_reorder_threshold(instance):
+        enqueue('reorder_stock', key=f"reorder-stock:{instance.pk}", stock_id=instance.pk)
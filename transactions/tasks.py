@@ -0,0 +1,59 @@
+from django.db import transaction
+
+from jobs.registry import task
+from inventory.models import Stock
+from inventory.valuation import record_receipt
+from .models import Supplier, PurchaseBill, PurchaseItem
+from . import archive
+from .signals import EXCESS_QUANTITY, get_reorder_threshold
+
+
+# creates an auto generated purchase order for a stock that fell below the threshold
+@task('reorder_stock')
+def reorder_stock(job, stock_id):
+    stock = Stock.objects.filter(pk=stock_id, is_deleted=False).first()
+    if stock is None or stock.quantity >= get_reorder_threshold(stock):
+        # deleted or restocked since the job was queued
+        return {'ordered': 0}
+
+    # Get the first available supplier
+    supplier = Supplier.objects.filter(is_deleted=False).first()
+    if supplier is None:
+        return {'ordered': 0}
+
+    # Calculate the quantity to order
+    quantity_to_order = get_reorder_threshold(stock) - stock.quantity + EXCESS_QUANTITY
+
+    # the bill, its item, the quantity and the cost layer are written together or not at all, so a retry after
+    # a failure does not leave a second auto generated bill behind (the transaction starts with a write, see ingest.py)
+    with transaction.atomic():
+        # Create a new purchase order and set auto_generated to True
+        purchase_order = PurchaseBill.objects.create(
+            supplier=supplier,
+            auto_generated=True
+        )
+        job.set_progress(50, f"Created purchase bill {purchase_order.billno}")
+
+        # Create a purchase item using the actual cost from the Stock instance
+        purchase_item = PurchaseItem.objects.create(
+            billno=purchase_order,
+            stock=stock,
+            perprice=stock.cost,
+            quantity=quantity_to_order,
+            totalprice=quantity_to_order * stock.cost,
+        )
+        # Update stock quantity
+        stock.adjust_quantity(quantity_to_order)
+        record_receipt(stock.pk, quantity_to_order, stock.cost, purchase_item=purchase_item)
+    return {'ordered': quantity_to_order, 'billno': purchase_order.billno}
+
+
+# moves bills older than BILL_ARCHIVE['KEEP_YEARS'] into the archive tables, purchases then sales
+@task('archive_bills', queue='heavy', max_attempts=1)
+def archive_bills(job):
+    moved = {}
+    for step, kind in enumerate((archive.PURCHASE, archive.SALE)):
+        def progress(done, total, step=step, kind=kind):
+            job.set_progress((step + done / max(total, 1)) * 50, f"Archived {done} of {total} {kind} bills")
+        moved[kind] = archive.archive_bills(kind, progress=progress)
+    return moved
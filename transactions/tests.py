@@ -1,3 +1,438 @@
-from django.test import TestCase
+import json
+import re
+import zlib
+from datetime import datetime, timedelta
+from decimal import Decimal
+from unittest import mock
 
-# Create your tests here.
+from django.contrib.auth.models import User
+from django.core.paginator import Paginator
+from django.db import IntegrityError, transaction
+from django.core.cache import caches
+from django.test import TestCase, TransactionTestCase, override_settings
+from django.urls import reverse
+from django.utils import timezone
+
+from inventory import valuation
+from inventory.models import Stock, StockMovement
+from jobs.models import Job
+from . import archive, ingest, pdf
+from .cache import supplier_fragments
+from .forms import SaleForm
+from .models import (
+    ArchivedSaleBill, ArchivedSaleItem, Customer, PurchaseBill, PurchaseItem, SaleBill, SaleBillDetails, SaleItem, Supplier,
+)
+
+
+class SupplierConflictTest(TestCase):
+    def setUp(self):
+        self.client.force_login(User.objects.create_user('clerk'))
+        self.supplier = Supplier.objects.create(
+            name='Acme', phone='9876543210', address='Old road', email='acme@example.com', gstin='22AAAAA0000A1Z5',
+        )
+        self.url = reverse('edit-supplier', args=[self.supplier.pk])
+
+    def edit(self, version, **changes):
+        data = {
+            'name': 'Acme', 'phone': '9876543210', 'address': 'Old road', 'email': 'acme@example.com',
+            'gstin': '22AAAAA0000A1Z5', 'version': version,
+        }
+        data.update(changes)
+        return self.client.post(self.url, data)
+
+    def test_stale_version_is_refused_with_409(self):
+        self.assertEqual(self.edit(0, address='New road').status_code, 302)
+        response = self.edit(0, email='sales@example.com')
+        self.assertEqual(response.status_code, 409)
+        self.supplier.refresh_from_db()
+        self.assertEqual((self.supplier.address, self.supplier.email, self.supplier.version), ('New road', 'acme@example.com', 1))
+
+
+class SaleCustomerTest(TestCase):
+    def setUp(self):
+        self.client.force_login(User.objects.create_user('clerk'))
+        self.stock = Stock.objects.create(name='Widget', quantity=100, cost=Decimal('2.00'))
+
+    def details(self, **changes):
+        data = {'name': 'Ann', 'phone': '9876543210', 'address': 'Old road', 'email': 'ann@example.com', 'gstin': ''}
+        data.update(changes)
+        return data
+
+    def sell(self, **changes):
+        data = self.details(**changes)
+        data.update({
+            'form-TOTAL_FORMS': '1', 'form-INITIAL_FORMS': '0',
+            'form-0-stock': self.stock.pk, 'form-0-quantity': '1', 'form-0-perprice': '5',
+        })
+        return self.client.post(reverse('new-sale'), data)
+
+    def test_returning_customer_is_matched_on_phone(self):
+        self.sell()
+        self.sell(address='New road')
+        self.assertEqual(Customer.objects.count(), 1)
+        customer = Customer.objects.get()
+        self.assertEqual(customer.address, 'New road')
+        self.assertEqual(customer.salebills.count(), 2)
+
+    def test_issued_bills_keep_the_details_they_were_billed_with(self):
+        self.sell(gstin='22AAAAA0000A1Z5')
+        self.sell(name='Ann Lee', address='New road', gstin='')
+        first, second = SaleBill.objects.order_by('billno')
+        self.assertEqual((first.customer_name, first.customer_address, first.customer_gstin), ('Ann', 'Old road', '22AAAAA0000A1Z5'))
+        self.assertEqual((second.customer_name, second.customer_address, second.customer_gstin), ('Ann Lee', 'New road', None))
+        self.assertContains(self.client.get(reverse('sale-bill', args=[first.billno])), 'Old road')
+
+    def test_gstin_of_another_customer_is_refused(self):
+        Customer.objects.create(name='Bob', phone='9876500000', address='Road', email='bob@example.com', gstin='22AAAAA0000A1Z5')
+        form = SaleForm(data=self.details(gstin='22AAAAA0000A1Z5'))
+        self.assertFalse(form.is_valid())
+        self.assertIn('gstin', form.errors)
+
+    def test_phone_registered_meanwhile_is_a_form_error(self):
+        form = SaleForm(data=self.details())
+        self.assertTrue(form.is_valid())
+        Customer.objects.create(name='Bob', phone='9876543210', address='Road', email='bob@example.com')
+        self.assertIsNone(form.save())
+        self.assertIn('phone', form.errors)
+        self.assertEqual(Customer.objects.get().name, 'Bob')
+
+    def test_gstin_registered_meanwhile_is_a_form_error(self):
+        form = SaleForm(data=self.details(gstin='22AAAAA0000A1Z5'))
+        self.assertTrue(form.is_valid())
+        Customer.objects.create(name='Bob', phone='9876500000', address='Road', email='bob@example.com', gstin='22AAAAA0000A1Z5')
+        self.assertIsNone(form.save())
+        self.assertIn('gstin', form.errors)
+        self.assertEqual(Customer.objects.count(), 1)
+
+
+class BillDetailsTest(TestCase):
+    def setUp(self):
+        self.client.force_login(User.objects.create_user('clerk'))
+        customer = Customer.objects.create(name='Ann', phone='9876543210', address='Road', email='ann@example.com')
+        self.bill = SaleBill.objects.create(customer=customer)
+        self.url = reverse('sale-bill', args=[self.bill.billno])
+
+    def edit(self, version, **changes):
+        data = {'eway': 'E1', 'veh': '', 'destination': '', 'po': '', 'cgst': '9.00', 'sgst': '9.00', 'igst': '', 'cess': '', 'tcs': '', 'total': '118.00', 'version': version}
+        data.update(changes)
+        return self.client.post(self.url, data)
+
+    def test_viewing_a_bill_writes_no_details(self):
+        self.assertEqual(self.client.get(self.url).status_code, 200)
+        self.assertFalse(SaleBillDetails.objects.exists())
+
+    def test_details_are_written_on_first_edit_then_updated(self):
+        self.assertEqual(self.edit(0).status_code, 200)
+        self.assertEqual(self.edit(0, cgst='1250.50').status_code, 200)
+        # the edit above moved the details to version 1
+        self.assertEqual(self.edit(0, cgst='1.00').status_code, 409)
+        details = SaleBillDetails.objects.get()
+        self.assertEqual((details.billno_id, details.eway, details.cgst, details.total), (self.bill.billno, 'E1', Decimal('1250.50'), Decimal('118.00')))
+        self.assertEqual(self.client.get(self.url).context['billdetails'].pk, details.pk)
+
+    def test_tax_that_is_not_a_number_is_refused(self):
+        self.edit(0, cgst='nine')
+        self.assertFalse(SaleBillDetails.objects.exists())
+
+    def test_a_bill_has_one_details_row(self):
+        SaleBillDetails.objects.create(billno=self.bill)
+        with self.assertRaises(IntegrityError), transaction.atomic():
+            SaleBillDetails.objects.create(billno=self.bill)
+
+    def test_bill_comes_with_its_details(self):
+        SaleBillDetails.objects.create(billno=self.bill, eway='E1')
+        bill = SaleBill.objects.select_related('saledetailsbillno').get(pk=self.bill.pk)
+        with self.assertNumQueries(0):
+            self.assertEqual(bill.saledetailsbillno.eway, 'E1')
+
+
+class ArchiveTest(TestCase):
+    def setUp(self):
+        self.client.force_login(User.objects.create_user('clerk'))
+        self.customer = Customer.objects.create(name='Ann', phone='9876543210', address='Road', email='ann@example.com')
+        self.stock = Stock.objects.create(name='Widget', quantity=100, cost=Decimal('2.00'))
+        self.cutoff = timezone.make_aware(datetime(2020, 1, 1))
+
+    # a sale bill with one item, `days` before the cutoff (negative for after it)
+    def sale(self, days, quantity=1):
+        bill = SaleBill.objects.create(customer=self.customer)
+        SaleItem.objects.create(billno=bill, stock=self.stock, quantity=quantity, perprice=5, totalprice=5 * quantity)
+        SaleBillDetails.objects.create(billno=bill, eway=f"E{bill.billno}", cgst=Decimal('1.50'))
+        # time is auto_now, so it is set past the model
+        SaleBill.objects.filter(pk=bill.pk).update(time=self.cutoff - timedelta(days=days))
+        return bill
+
+    def test_round_trip(self):
+        old = [self.sale(30, quantity=2), self.sale(20)]
+        new = self.sale(-1)
+        self.assertEqual(archive.archive_bills(archive.SALE, before=self.cutoff, batch_size=1), 2)
+
+        self.assertEqual(list(SaleBill.objects.values_list('billno', flat=True)), [new.billno])
+        archived = ArchivedSaleBill.objects.get(billno=old[0].billno)
+        self.assertEqual((archived.customer_id, archived.eway, archived.cgst), (self.customer.pk, f"E{old[0].billno}", Decimal('1.50')))
+        self.assertEqual(archived.time, self.cutoff - timedelta(days=30))
+        self.assertEqual(list(archived.items.values_list('stock_id', 'quantity', 'totalprice')), [(self.stock.pk, 2, 10)])
+        self.assertEqual(ArchivedSaleItem.objects.count(), 2)
+
+        # the bill page falls back to the archive, the list shows it once a date range asks for it
+        response = self.client.get(reverse('sale-bill', args=[old[0].billno]))
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.context['bill'].archived)
+        response = self.client.get(reverse('sales-list'), {'from': '2019-01-01', 'to': '2020-01-31'})
+        self.assertEqual([bill.billno for bill in response.context['bills']], [new.billno, old[1].billno, old[0].billno])
+        self.assertEqual([bill.billno for bill in self.client.get(reverse('sales-list')).context['bills']], [new.billno])
+
+    def test_archived_bill_numbers_are_not_given_out_again(self):
+        only = self.sale(30)
+        self.assertEqual(archive.archive_bills(archive.SALE, before=self.cutoff), 1)
+        self.assertFalse(SaleBill.objects.exists())
+        self.assertGreater(SaleBill.objects.create(customer=self.customer).billno, only.billno)
+
+    def test_bill_list_pages_across_both_tables(self):
+        for days in range(5, 0, -1):
+            self.sale(days)
+        for days in range(-1, -4, -1):
+            self.sale(days)
+        archive.archive_bills(archive.SALE, before=self.cutoff)
+        newest_first = list(SaleBill.objects.order_by('-time').values_list('billno', flat=True)) + list(
+            ArchivedSaleBill.objects.order_by('-time').values_list('billno', flat=True)
+        )
+        self.assertEqual((SaleBill.objects.count(), ArchivedSaleBill.objects.count()), (3, 5))
+
+        bills = archive.bills(archive.SALE, self.cutoff - timedelta(days=10), self.cutoff + timedelta(days=10))
+        self.assertIsInstance(bills, archive.BillList)
+        self.assertEqual(len(bills), 8)
+        pages = Paginator(bills, 3)
+        self.assertEqual(pages.num_pages, 3)
+        self.assertEqual([bill.billno for number in pages.page_range for bill in pages.page(number)], newest_first)
+        self.assertEqual(bills[3].billno, newest_first[3])
+        self.assertEqual(bills[4].billno, newest_first[4])
+        with self.assertRaises(IndexError):
+            bills[8]
+
+        response = self.client.get(reverse('sales-list'), {'from': '2019-12-01', 'to': '2020-01-31'})
+        self.assertEqual([bill.billno for bill in response.context['bills']], newest_first)
+        self.assertEqual(response.context['range_query'], '&from=2019-12-01&to=2020-01-31')
+
+
+class FragmentCacheTest(TransactionTestCase):
+    def setUp(self):
+        caches['template_fragments'].clear()
+        self.client.force_login(User.objects.create_user('clerk'))
+        self.supplier = Supplier.objects.create(name='Acme', phone='9876543210', address='Road', email='acme@example.com', gstin='G1')
+        stock = Stock.objects.create(name='Widget', quantity=10, cost=Decimal('2.00'))
+        bill = PurchaseBill.objects.create(supplier=self.supplier)
+        PurchaseItem.objects.create(billno=bill, stock=stock, quantity=2, perprice=5, totalprice=10)
+
+    def test_version_changes_once_the_save_commits(self):
+        version = supplier_fragments.get()
+        with transaction.atomic():
+            self.supplier.name = 'Apex'
+            self.supplier.save()
+            self.assertEqual(supplier_fragments.get(), version)
+        self.assertNotEqual(supplier_fragments.get(), version)
+
+    def test_saving_other_fields_keeps_the_version(self):
+        version = supplier_fragments.get()
+        self.supplier.address = 'New road'
+        self.supplier.save(update_fields=['address'])
+        self.assertEqual(supplier_fragments.get(), version)
+
+    def test_cached_row_is_rebuilt_after_a_commit(self):
+        self.assertContains(self.client.get(reverse('purchases-list')), 'Acme')
+        # a write that skips the save signals leaves the cached row as it was
+        Supplier.objects.filter(pk=self.supplier.pk).update(name='Apex')
+        self.assertContains(self.client.get(reverse('purchases-list')), 'Acme')
+        self.supplier.refresh_from_db()
+        self.supplier.name = 'Zenith'
+        self.supplier.save()
+        response = self.client.get(reverse('purchases-list'))
+        self.assertContains(response, 'Zenith')
+        self.assertNotContains(response, 'Acme')
+
+
+class PdfTest(TestCase):
+    def bill(self, billno, lines):
+        return {
+            'kind': pdf.SALE, 'billno': billno, 'date': '2020-01-01',
+            'party': {'name': 'Ann', 'address': 'Road\nTown', 'gstin': None},
+            'details': {'eway': 'E1', 'total': '118.00'},
+            'items': [(f"Part {number}", 1, 5, 5) for number in range(lines)],
+        }
+
+    # the text drawn on each page, read back from the compressed streams
+    def pages(self, document):
+        texts = [zlib.decompress(data).decode('latin-1') for data in re.findall(rb'stream\n(.*?)\nendstream', document, re.S)]
+        return [text for text in texts if 'Page ' in text]
+
+    def test_long_bill_runs_over_several_pages(self):
+        document = pdf.render_bill(self.bill(7, pdf.ROWS_PER_PAGE + 3))
+        self.assertTrue(document.startswith(b'%PDF-1.4'))
+        self.assertIn(b'/Count 2', document)
+        first, second = self.pages(document)
+        self.assertIn('(Page 1 of 2)', first)
+        self.assertIn(f"(Part {pdf.ROWS_PER_PAGE - 1})", first)
+        self.assertIn(f"(Part {pdf.ROWS_PER_PAGE})", second)
+        # the taxes are printed once, under the last page's items
+        self.assertNotIn('(118.00)', first)
+        self.assertIn('(118.00)', second)
+
+    def test_cross_reference_points_at_every_object(self):
+        document = pdf.render_bill(self.bill(7, 3))
+        xref = int(re.search(rb'startxref\n(\d+)', document).group(1))
+        offsets = [int(offset) for offset in re.findall(rb'(\d{10}) 00000 n', document[xref:])]
+        for number, offset in enumerate(offsets, 1):
+            self.assertTrue(document[offset:].startswith(b'%d 0 obj' % number))
+
+    def test_render_many_names_every_bill(self):
+        bills = [self.bill(billno, 2) for billno in range(1, 6)]
+        serial = list(pdf.render_many(bills, workers=1, chunk_size=2))
+        self.assertEqual([name for name, _ in serial], [f"sale-bill-{billno}.pdf" for billno in range(1, 6)])
+        self.assertEqual(list(pdf.render_many(bills, workers=2, chunk_size=2)), serial)
+
+    def test_bill_is_loaded_and_served(self):
+        self.client.force_login(User.objects.create_user('clerk'))
+        customer = Customer.objects.create(name='Ann', phone='9876543210', address='Road', email='ann@example.com')
+        stock = Stock.objects.create(name='Widget', quantity=10, cost=Decimal('2.00'))
+        bill = SaleBill(customer=customer)
+        bill.bill_to('Ann Lee', 'Old road', None)
+        bill.save()
+        SaleItem.objects.create(billno=bill, stock=stock, quantity=2, perprice=5, totalprice=10)
+        SaleBillDetails.objects.create(billno=bill, cgst=Decimal('0.25'))
+
+        [loaded] = pdf.load_bills(pdf.SALE, billnos=[bill.billno])
+        self.assertEqual(loaded['party'], {'name': 'Ann Lee', 'address': 'Old road', 'gstin': None})
+        self.assertEqual(loaded['items'], [('Widget', 2, 5, 10)])
+        self.assertEqual(loaded['details']['cgst'], '0.25')
+
+        response = self.client.get(reverse('sale-bill-pdf', args=[bill.billno]))
+        self.assertEqual(response['Content-Type'], 'application/pdf')
+        self.assertIn('(Ann Lee)', self.pages(response.content)[0])
+        self.assertEqual(self.client.get(reverse('sale-bill-pdf', args=[bill.billno + 1])).status_code, 404)
+
+
+@override_settings(SALES_INGEST={'TOKENS': {'till-1-token': 'till'}, 'MAX_BATCH': 10})
+class SaleIngestTest(TestCase):
+    def setUp(self):
+        User.objects.create_user('till')
+        self.stock = Stock.objects.create(name='Widget', quantity=20, cost=Decimal('2.00'))
+
+    def post(self, sales, token='till-1-token'):
+        headers = {'HTTP_AUTHORIZATION': f"Bearer {token}"} if token else {}
+        return self.client.post(reverse('pos-sales'), json.dumps({'sales': sales}), content_type='application/json', **headers)
+
+    def sale(self, key, phone='9876543210', quantity=2):
+        customer = {'name': 'Ann', 'phone': phone, 'address': 'Road', 'email': 'ann@example.com', 'gstin': ''}
+        return {'key': key, 'customer': customer, 'items': [{'stock': self.stock.pk, 'quantity': quantity, 'perprice': 5}]}
+
+    def test_terminal_token_is_required(self):
+        response = self.post([self.sale('a')], token=None)
+        self.assertEqual(response.status_code, 401)
+        self.assertEqual(response['WWW-Authenticate'], 'Bearer')
+        self.assertEqual(self.post([self.sale('a')], token='guess').status_code, 403)
+        self.assertFalse(SaleBill.objects.exists())
+
+    def test_batch_is_written(self):
+        response = self.post([self.sale('a'), self.sale('b', quantity=3), self.sale('c', phone='9876500000')])
+        self.assertEqual(response.status_code, 200)
+        data = response.json()
+        self.assertEqual(data['created'], 3)
+        self.assertEqual([result['status'] for result in data['results']], [ingest.CREATED] * 3)
+        self.assertEqual(Stock.objects.get(pk=self.stock.pk).quantity, 13)
+        self.assertEqual(Customer.objects.count(), 2)
+        self.assertEqual(sorted(SaleBill.objects.values_list('client_key', flat=True)), ['a', 'b', 'c'])
+        self.assertEqual(set(SaleBill.objects.values_list('customer_name', 'customer_address', 'customer_gstin')), {('Ann', 'Road', None)})
+        self.assertEqual(SaleItem.objects.filter(billno__client_key='b').get().totalprice, 15)
+
+    def test_replayed_batch_is_not_written_twice(self):
+        batch = [self.sale('a'), self.sale('b')]
+        first = self.post(batch).json()
+        replay = self.post(batch).json()
+        self.assertEqual(replay['created'], 0)
+        self.assertEqual([result['status'] for result in replay['results']], [ingest.DUPLICATE] * 2)
+        self.assertEqual([result['billno'] for result in replay['results']], [result['billno'] for result in first['results']])
+        self.assertEqual(SaleBill.objects.count(), 2)
+        self.assertEqual(Stock.objects.get(pk=self.stock.pk).quantity, 16)
+
+    def test_duplicate_key_within_a_batch(self):
+        data = self.post([self.sale('a'), self.sale('a', quantity=5)]).json()
+        self.assertEqual(data['created'], 1)
+        first, second = data['results']
+        self.assertEqual((first['status'], second['status']), (ingest.CREATED, ingest.DUPLICATE))
+        self.assertEqual(second['billno'], first['billno'])
+        self.assertEqual(SaleBill.objects.count(), 1)
+        self.assertEqual(Stock.objects.get(pk=self.stock.pk).quantity, 18)
+
+    def test_invalid_sales_do_not_hold_up_the_others(self):
+        bad_stock = self.sale('b')
+        bad_stock['items'][0]['stock'] = 9999
+        data = self.post([self.sale('a'), bad_stock, {'key': 'c', 'customer': {}, 'items': []}]).json()
+        self.assertEqual([result['status'] for result in data['results']], [ingest.CREATED, ingest.INVALID, ingest.INVALID])
+        self.assertIn('9999', data['results'][1]['error'])
+        self.assertEqual(SaleBill.objects.count(), 1)
+
+    def test_malformed_batches_are_refused(self):
+        self.assertEqual(self.post([self.sale(str(i)) for i in range(11)]).status_code, 400)
+        response = self.client.post(reverse('pos-sales'), 'not json', content_type='application/json', HTTP_AUTHORIZATION='Bearer till-1-token')
+        self.assertEqual(response.status_code, 400)
+
+
+class BillDeleteTest(TestCase):
+    def setUp(self):
+        self.client.force_login(User.objects.create_user('clerk'))
+        self.stocks = [Stock.objects.create(name=name, quantity=0, cost=Decimal('2.00')) for name in ('Widget', 'Gadget')]
+        supplier = Supplier.objects.create(name='Acme', phone='9876543210', address='Road', email='acme@example.com', gstin='G1')
+        self.purchase = PurchaseBill.objects.create(supplier=supplier)
+        for stock in self.stocks:
+            item = PurchaseItem.objects.create(billno=self.purchase, stock=stock, quantity=10, perprice=2, totalprice=20)
+            stock.adjust_quantity(10)
+            valuation.record_receipt(stock.pk, 10, Decimal('2.00'), purchase_item=item)
+        customer = Customer.objects.create(name='Ann', phone='9876500000', address='Road', email='ann@example.com')
+        self.sale = SaleBill.objects.create(customer=customer)
+        for stock in self.stocks:
+            item = SaleItem.objects.create(billno=self.sale, stock=stock, quantity=3, perprice=5, totalprice=15)
+            stock.adjust_quantity(-3)
+            valuation.record_issue(stock.pk, 3, sale_item=item)
+
+    def state(self):
+        return (
+            list(Stock.objects.order_by('id').values_list('quantity', flat=True)),
+            StockMovement.objects.count(),
+            valuation.inventory_value(),
+        )
+
+    # the valuation of the second item fails, after the first item's quantity and movement were written
+    def fail_second(self, name):
+        original = getattr(valuation, name)
+        calls = []
+
+        def failing(item):
+            calls.append(item)
+            if len(calls) == 2:
+                raise RuntimeError("valuation failed")
+            return original(item)
+        return mock.patch.object(valuation, name, failing)
+
+    def test_failed_purchase_delete_changes_nothing(self):
+        before = self.state()
+        with self.fail_second('reverse_purchase_item'), self.assertRaises(RuntimeError):
+            self.client.post(reverse('delete-purchase', args=[self.purchase.pk]))
+        self.assertEqual(self.state(), before)
+        self.assertTrue(PurchaseBill.objects.filter(pk=self.purchase.pk).exists())
+        # the reorder check is connected again: a stock running low queues its reorder
+        self.stocks[0].adjust_quantity(-7)
+        self.assertTrue(Job.objects.filter(name='reorder_stock', key=f"reorder-stock:{self.stocks[0].pk}").exists())
+
+    def test_failed_sale_delete_changes_nothing(self):
+        before = self.state()
+        with self.fail_second('reverse_sale_item'), self.assertRaises(RuntimeError):
+            self.client.post(reverse('delete-sale', args=[self.sale.pk]))
+        self.assertEqual(self.state(), before)
+        self.assertTrue(SaleBill.objects.filter(pk=self.sale.pk).exists())
+
+    def test_sale_delete_puts_deleted_stock_back_in_step(self):
+        Stock.objects.filter(pk=self.stocks[0].pk).update(is_deleted=True)
+        self.assertEqual(self.client.post(reverse('delete-sale', args=[self.sale.pk])).status_code, 302)
+        for stock in Stock.objects.all():
+            self.assertEqual((stock.quantity, valuation.get_balance(stock.pk)), (10, (10, Decimal('20.00'))))
+        self.assertFalse(SaleBill.objects.exists())
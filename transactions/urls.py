@@ -18,7 +18,15 @@ urlpatterns = [
     path('sales/', views.SaleView.as_view(), name='sales-list'),
     path('sales/new', views.SaleCreateView.as_view(), name='new-sale'),
     path('sales/<pk>/delete', views.SaleDeleteView.as_view(), name='delete-sale'),
+    path('pos/scan', views.ScanView.as_view(), name='pos-scan'),
+    path('pos/draft', views.DraftView.as_view(), name='pos-draft'),
+    path('pos/sales', views.SaleIngestView.as_view(), name='pos-sales'),
+    path('sync/suppliers', views.SupplierSyncView.as_view(), name='supplier-sync'),
 
+    path('reports/tax-summary/', views.TaxSummaryView.as_view(), name='tax-summary'),
+
+    path("purchases/<int:billno>/pdf", views.BillPDFView.as_view(kind='purchase'), name="purchase-bill-pdf"),
+    path("sales/<int:billno>/pdf", views.BillPDFView.as_view(kind='sale'), name="sale-bill-pdf"),
     path("purchases/<billno>", views.PurchaseBillView.as_view(), name="purchase-bill"),
     path("sales/<billno>", views.SaleBillView.as_view(), name="sale-bill"),
     # Example in urls.py
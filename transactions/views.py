@@ -1,28 +1,46 @@
 from django.shortcuts import render, redirect, get_object_or_404
-from django.http import Http404
+from django.urls import reverse
+from django.http import Http404, HttpResponse, JsonResponse
 from django.views.generic import View, ListView, CreateView, UpdateView, DeleteView
+from django.views.decorators.csrf import csrf_exempt
+from django.utils.decorators import method_decorator
 from django.contrib.messages.views import SuccessMessageMixin
 from django.contrib import messages
 from django.core.paginator import Paginator, EmptyPage, PageNotAnInteger
-from django.db.models.signals import post_save, pre_delete
-from django.dispatch import receiver
+from django.db import IntegrityError, transaction
+from django.db.models import F, Sum
+from django.db.models.functions import TruncMonth
+from django.db.models.signals import post_save
 from datetime import datetime, timedelta
+import json
 from collections import defaultdict
+from urllib.parse import urlencode
 
 from .models import (
     PurchaseBill, Supplier, PurchaseItem, PurchaseBillDetails,
-    SaleBill, SaleItem, SaleBillDetails
+    SaleBill, SaleItem, SaleBillDetails,
+    ArchivedPurchaseBill, ArchivedSaleBill, SaleDraft
 )
 from .forms import (
     SelectSupplierForm, PurchaseItemFormset,
     PurchaseDetailsForm, SupplierForm,
-    SaleForm, SaleItemFormset, SaleDetailsForm, PurchaseItemForm
+    SaleForm, SaleItemFormset, SaleDraftFormset, SaleDetailsForm, PurchaseItemForm
 )
+from .cache import supplier_cache
+from core.concurrency import ConflictError, ConflictMixin
+from core.sync import SyncView
+from . import archive, ingest, pdf
 from inventory.models import Stock
+from inventory.cache import stock_cache
+from inventory.scan import scan_index
+from inventory import valuation
+from .signals import THRESHOLD_QUANTITY, EXCESS_QUANTITY, get_reorder_threshold, check_inventory_and_create_purchase_order
 
-# Threshold and excess quantity settings
-THRESHOLD_QUANTITY = 5
-EXCESS_QUANTITY = 5
+# 'from' / 'to' of a bill list, and the same as a query string for its page links
+def range_context(params):
+    date_from, date_to = params.get('from', ''), params.get('to', '')
+    query = urlencode([(name, value) for name, value in (('from', date_from), ('to', date_to)) if value])
+    return {'date_from': date_from, 'date_to': date_to, 'range_query': '&' + query if query else ''}
 
 # Views for Suppliers
 class SupplierListView(ListView):
@@ -44,7 +62,7 @@ class SupplierCreateView(SuccessMessageMixin, CreateView):
         context["savebtn"] = 'Add Supplier'
         return context
 
-class SupplierUpdateView(SuccessMessageMixin, UpdateView):
+class SupplierUpdateView(ConflictMixin, SuccessMessageMixin, UpdateView):
     model = Supplier
     form_class = SupplierForm
     success_url = '/transactions/suppliers'
@@ -61,6 +79,7 @@ class SupplierUpdateView(SuccessMessageMixin, UpdateView):
 class SupplierDeleteView(View):
     template_name = "suppliers/delete_supplier.html"
     success_message = "Supplier has been deleted successfully"
+    conflict_message = "Someone else changed this supplier while it was being deleted. Check it and delete it again."
 
     def get(self, request, pk):
         supplier = get_object_or_404(Supplier, pk=pk)
@@ -69,15 +88,25 @@ class SupplierDeleteView(View):
     def post(self, request, pk):
         supplier = get_object_or_404(Supplier, pk=pk)
         supplier.is_deleted = True
-        supplier.save()
+        try:
+            supplier.save(update_fields=['is_deleted'])
+        except ConflictError:
+            messages.error(request, self.conflict_message)
+            return redirect('delete-supplier', pk=pk)
         messages.success(request, self.success_message)
         return redirect('suppliers-list')
 
+# the suppliers changed since a client's last sync (core/sync.py)
+class SupplierSyncView(SyncView):
+    model = Supplier
+    fields = ('id', 'name', 'phone', 'address', 'email', 'gstin', 'is_deleted', 'updated_at')
+
 # View to show supplier profile
 class SupplierView(View):
     def get(self, request, name):
-        supplierobj = get_object_or_404(Supplier, name=name)
-        bill_list = PurchaseBill.objects.filter(supplier=supplierobj)
+        supplierobj = supplier_cache.get_or_404(name=name)
+        start, end = archive.date_range(request.GET)
+        bill_list = archive.bills(archive.PURCHASE, start, end, supplier=supplierobj)
         page = request.GET.get('page', 1)
         paginator = Paginator(bill_list, 10)
         try:
@@ -88,16 +117,28 @@ class SupplierView(View):
             bills = paginator.page(paginator.num_pages)
         context = {
             'supplier': supplierobj,
-            'bills': bills
+            'bills': bills,
+            **range_context(request.GET),
         }
         return render(request, 'suppliers/supplier.html', context)
 
 # Views for Purchases
-class PurchaseView(ListView):
-    model = PurchaseBill
+# Lists only read the current bills, unless a 'from' / 'to' date range reaches into the archive (transactions/archive.py)
+class BillRangeMixin:
+    kind = None
+
+    def get_queryset(self):
+        return archive.bills(self.kind, *archive.date_range(self.request.GET))
+
+    def get_context_data(self, **kwargs):
+        context = super().get_context_data(**kwargs)
+        context.update(range_context(self.request.GET))
+        return context
+
+class PurchaseView(BillRangeMixin, ListView):
+    kind = archive.PURCHASE
     template_name = "purchases/purchases_list.html"
     context_object_name = 'bills'
-    ordering = ['-time']
     paginate_by = 10
 
 class SelectSupplierView(View):
@@ -112,7 +153,7 @@ class SelectSupplierView(View):
         form = self.form_class(request.POST)
         if form.is_valid():
             supplierid = request.POST.get("supplier")
-            supplier = get_object_or_404(Supplier, id=supplierid)
+            supplier = supplier_cache.get_or_404(supplierid)
             return redirect('new-purchase', supplier.pk)
         return render(request, self.template_name, {'form': form})
 
@@ -121,7 +162,7 @@ class PurchaseCreateView(View):
 
     def get(self, request, pk):
         formset = PurchaseItemFormset(request.GET or None)
-        supplierobj = get_object_or_404(Supplier, pk=pk)
+        supplierobj = supplier_cache.get_or_404(pk)
         context = {
             'formset': formset,
             'supplier': supplierobj,
@@ -130,26 +171,23 @@ class PurchaseCreateView(View):
 
     def post(self, request, pk):
         formset = PurchaseItemFormset(request.POST)
-        supplierobj = get_object_or_404(Supplier, pk=pk)
+        supplierobj = supplier_cache.get_or_404(pk)
         if formset.is_valid():
-            billobj = PurchaseBill(supplier=supplierobj)
-            billobj.save()
-            billdetailsobj = PurchaseBillDetails(billno=billobj)
-            billdetailsobj.save()
-            
-            for form in formset:
-                billitem = form.save(commit=False)
-                billitem.billno = billobj
-                stock = Stock.objects.filter(name=billitem.stock.name, sub_category=billitem.stock.sub_category).first()
-
-                if stock is None:
-                    raise Http404("Stock not found for the given name and sub_category")
-
-                billitem.totalprice = billitem.perprice * billitem.quantity
-                stock.quantity += billitem.quantity
-                stock.save()
-                billitem.save()
-            
+            # the bill, its items, the quantities and the cost layers are written together or not at all
+            with transaction.atomic():
+                billobj = PurchaseBill(supplier=supplierobj)
+                billobj.save()
+
+                for form in formset:
+                    billitem = form.save(commit=False)
+                    billitem.billno = billobj
+                    stock = stock_cache.get_or_404(name=billitem.stock.name, sub_category=billitem.stock.sub_category)
+
+                    billitem.totalprice = billitem.perprice * billitem.quantity
+                    stock.adjust_quantity(billitem.quantity)
+                    billitem.save()
+                    valuation.record_receipt(stock.pk, billitem.quantity, billitem.perprice, purchase_item=billitem)
+
             messages.success(request, "Purchased items have been registered successfully")
             return redirect('purchase-bill', billno=billobj.billno)
         
@@ -160,203 +198,380 @@ class PurchaseCreateView(View):
         }
         return render(request, self.template_name, context)
 
-from django.db.models.signals import post_save
-from django.dispatch import receiver, Signal
-from .models import Stock
-
-# Import the function to disconnect
-# from your_app.views import check_inventory_and_create_purchase_order
-
 class PurchaseDeleteView(SuccessMessageMixin, DeleteView):
     model = PurchaseBill
     template_name = "purchases/delete_purchase.html"
     success_url = '/transactions/purchases'
     
     def delete(self, *args, **kwargs):
-        # Temporarily disconnect the post_save signal for Stock
-        post_save.disconnect(check_inventory_and_create_purchase_order, sender=Stock)
-        
-        # Perform the deletion
+        from inventory import analytics
+
         self.object = self.get_object()
-        items = PurchaseItem.objects.filter(billno=self.object.billno)
-        
-        # Update stock quantities
-        for item in items:
-            stock = get_object_or_404(Stock, name=item.stock.name, sub_category=item.stock.sub_category)
-            if not stock.is_deleted:
-                stock.quantity -= item.quantity
-                stock.save()
-        
-        # After deletion, reconnect the post_save signal for Stock
-        post_save.connect(check_inventory_and_create_purchase_order, sender=Stock)
-        
-        # Display success message and perform the actual deletion
+        items = list(PurchaseItem.objects.filter(billno=self.object.billno))
+        stocks = [stock_cache.get_or_404(item.stock_id) for item in items]
+
+        # Temporarily disconnect the post_save signal for Stock, taking stock out is not a reason to reorder it
+        post_save.disconnect(check_inventory_and_create_purchase_order, sender=Stock)
+        try:
+            # the quantities, the valuation, the rollups and the bill change together or not at all
+            with transaction.atomic():
+                analytics.forget_items(analytics.PURCHASE, self.object, items)
+                # deleted stocks too, so their quantity and valuation stay in step
+                for item, stock in zip(items, stocks):
+                    stock.adjust_quantity(-item.quantity)
+                    valuation.reverse_purchase_item(item)
+                response = super().delete(*args, **kwargs)
+        finally:
+            post_save.connect(check_inventory_and_create_purchase_order, sender=Stock)
+
         messages.success(self.request, "Purchase bill has been deleted successfully")
-        return super().delete(*args, **kwargs)
+        return response
 
 
 # Views for Sales
-class SaleView(ListView):
-    model = SaleBill
+class SaleView(BillRangeMixin, ListView):
+    kind = archive.SALE
     template_name = "sales/sales_list.html"
     context_object_name = 'bills'
-    ordering = ['-time']
     paginate_by = 10
 
 class SaleCreateView(View):
     template_name = 'sales/new_sale.html'
 
+    # ?draft=<id> checks out a till's draft sale (ScanView), only the user who scanned it can
+    def get_draft(self, data):
+        draft = data.get('draft', '')
+        return SaleDraft.objects.filter(pk=draft, user=self.request.user).first() if draft.isdigit() else None
+
     def get(self, request):
-        form = SaleForm(request.GET or None)
-        formset = SaleItemFormset(request.GET or None)
+        draft = self.get_draft(request.GET)
+        if draft is not None:
+            form = SaleForm()
+            formset = SaleDraftFormset(initial=list(draft.lines.values('stock', 'quantity', 'perprice').order_by('id')))
+        else:
+            form = SaleForm(request.GET or None)
+            formset = SaleItemFormset(request.GET or None)
         stocks = Stock.objects.filter(is_deleted=False)
         context = {
             'form': form,
             'formset': formset,
-            'stocks': stocks
+            'stocks': stocks,
+            'draft': draft,
         }
         return render(request, self.template_name, context)
 
     def post(self, request):
         form = SaleForm(request.POST)
         formset = SaleItemFormset(request.POST)
+        customer = None
         if form.is_valid() and formset.is_valid():
-            billobj = form.save(commit=False)
-            billobj.save()
-            billdetailsobj = SaleBillDetails(billno=billobj)
-            billdetailsobj.save()
-            
-            for form in formset:
-                billitem = form.save(commit=False)
-                billitem.billno = billobj
-                
-                stock_name = billitem.stock.name
-                stock_sub_category = billitem.stock.sub_category
-
-                stock = get_object_or_404(Stock, name=stock_name, sub_category=stock_sub_category)
-                
-                billitem.totalprice = billitem.perprice * billitem.quantity
-                
-                # Update stock quantity based on sale
-                stock.quantity -= billitem.quantity
-                
-                # Save the stock and bill item
-                stock.save()
-                billitem.save()
-            
+            # the customer, the bill, its items, the quantities and the cost of goods sold are written together or not at all
+            with transaction.atomic():
+                customer = form.save()
+                if customer is not None:
+                    billobj = SaleBill(customer=customer)
+                    billobj.bill_to(customer.name, customer.address, customer.gstin)
+                    billobj.save()
+
+                    for item_form in formset:
+                        billitem = item_form.save(commit=False)
+                        billitem.billno = billobj
+
+                        stock_name = billitem.stock.name
+                        stock_sub_category = billitem.stock.sub_category
+
+                        stock = stock_cache.get_or_404(name=stock_name, sub_category=stock_sub_category)
+
+                        billitem.totalprice = billitem.perprice * billitem.quantity
+
+                        # Update stock quantity based on sale, then save the bill item and cost the goods sold
+                        stock.adjust_quantity(-billitem.quantity)
+                        billitem.save()
+                        valuation.record_issue(stock.pk, billitem.quantity, sale_item=billitem)
+
+                    draft = self.get_draft(request.POST)
+                    if draft is not None:
+                        draft.delete()
+        if customer is not None:
+            if form.changed_details:
+                messages.info(request, f"Updated the {', '.join(form.changed_details)} of {customer}")
             messages.success(request, "Sold items have been registered successfully")
             return redirect('sale-bill', billno=billobj.billno)
         
-        form = SaleForm(request.GET or None)
-        formset = SaleItemFormset(request.GET or None)
+        # keep the bound forms so field errors (e.g. a GSTIN clash) are shown
         context = {
             'form': form,
             'formset': formset,
+            'stocks': Stock.objects.filter(is_deleted=False),
+            'draft': self.get_draft(request.POST),
         }
         return render(request, self.template_name, context)
 
+# POS scan: resolves a barcode / SKU through the in-memory scan index and adds it to the till's open draft sale.
+# Expects JSON {"code": ..., "quantity": 1, "till": ""}, sent with the X-CSRFToken header
+class ScanView(View):
+    def post(self, request):
+        try:
+            data = json.loads(request.body)
+            code = str(data['code']).strip()
+            quantity = int(data.get('quantity', 1))
+            till = str(data.get('till', ''))[:30]
+        except (ValueError, KeyError, TypeError, AttributeError):
+            return JsonResponse({'error': "Expected a JSON object with a 'code', and optionally 'quantity' and 'till'"}, status=400)
+        if quantity < 1:
+            return JsonResponse({'error': "Quantity must be at least 1"}, status=400)
+
+        stock = scan_index.lookup(code)
+        if stock is None:
+            return JsonResponse({'error': f"No stock has the code {code}"}, status=404)
+        perprice = int(stock.cost)
+        # no surrounding transaction: every statement is atomic on its own, and on SQLite a read
+        # followed by a write in one transaction fails instead of waiting when another till writes
+        draft, _ = SaleDraft.objects.get_or_create(user=request.user, till=till)
+        line_quantity = draft.add(stock.id, quantity, perprice)
+        return JsonResponse({
+            'draft': draft.pk,
+            'stock': stock.id,
+            'name': f"{stock.name} ({stock.sub_category})" if stock.sub_category else stock.name,
+            'quantity': line_quantity,
+            'perprice': perprice,
+        })
+
+# the lines of a till's open draft sale, and where to check it out
+class DraftView(View):
+    def get(self, request):
+        draft = SaleDraft.objects.filter(user=request.user, till=request.GET.get('till', '')).first()
+        if draft is None:
+            return JsonResponse({'draft': None, 'lines': [], 'total': 0})
+        lines = [
+            {'stock': stock, 'name': name, 'quantity': quantity, 'perprice': perprice, 'total': quantity * perprice}
+            for stock, name, quantity, perprice in draft.lines.order_by('id').values_list('stock', 'stock__name', 'quantity', 'perprice')
+        ]
+        return JsonResponse({
+            'draft': draft.pk,
+            'lines': lines,
+            'total': sum(line['total'] for line in lines),
+            'checkout': reverse('new-sale') + f'?draft={draft.pk}',
+        })
+
+# Sales posted in batches by POS terminals (transactions/ingest.py), JSON
+# {"sales": [{"key": ..., "customer": {...}, "items": [{"stock" or "sku": ..., "quantity": ..., "perprice": ...}]}]}
+# answered with one result per sale; posting the same batch again changes nothing
+# POS terminals post with a bearer token instead of a session, so neither CSRF nor the login redirect applies
+@method_decorator(csrf_exempt, name='dispatch')
+class SaleIngestView(View):
+    def dispatch(self, request, *args, **kwargs):
+        if not request.META.get('HTTP_AUTHORIZATION'):
+            response = JsonResponse({'error': "Send the terminal's token as 'Authorization: Bearer <token>'"}, status=401)
+            response['WWW-Authenticate'] = 'Bearer'
+            return response
+        user = ingest.terminal_user(request.META['HTTP_AUTHORIZATION'])
+        if user is None:
+            return JsonResponse({'error': "Unknown terminal token"}, status=403)
+        # the audit trail of the sales names the terminal's user
+        request.user = user
+        return super().dispatch(request, *args, **kwargs)
+
+    def post(self, request):
+        try:
+            sales, results = ingest.parse(json.loads(request.body))
+        except ValueError as e:
+            message = str(e) if isinstance(e, ingest.BatchError) else "The request body is not valid JSON"
+            return JsonResponse({'error': message}, status=400)
+        results = ingest.ingest(sales, results)
+        return JsonResponse({
+            'results': results,
+            'created': sum(result['status'] == ingest.CREATED for result in results),
+        })
+
 class SaleDeleteView(SuccessMessageMixin, DeleteView):
     model = SaleBill
     template_name = "sales/delete_sale.html"
     success_url = '/transactions/sales'
     
     def delete(self, *args, **kwargs):
+        from inventory import analytics
+
         self.object = self.get_object()
-        items = SaleItem.objects.filter(billno=self.object.billno)
-        
-        # Update stock quantities when sale items are deleted
-        for item in items:
-            stock = get_object_or_404(Stock, name=item.stock.name, sub_category=item.stock.sub_category)
-            if not stock.is_deleted:
-                stock.quantity += item.quantity
-                stock.save()
-        
+        items = list(SaleItem.objects.filter(billno=self.object.billno))
+        stocks = [stock_cache.get_or_404(item.stock_id) for item in items]
+
+        # the quantities, the valuation, the rollups and the bill change together or not at all
+        with transaction.atomic():
+            analytics.forget_items(analytics.SALE, self.object, items)
+            # Update stock quantities when sale items are deleted, deleted stocks too so their valuation stays in step
+            for item, stock in zip(items, stocks):
+                stock.adjust_quantity(item.quantity)
+                valuation.reverse_sale_item(item)
+            response = super().delete(*args, **kwargs)
+
         messages.success(self.request, "Sale bill has been deleted successfully")
-        return super().delete(*args, **kwargs)
+        return response
 
 # Views for Purchase and Sale Bills
+class BillPDFView(View):
+    kind = None
+
+    def get(self, request, billno):
+        bills = pdf.load_bills(self.kind, billnos=[billno]) or pdf.load_bills(self.kind, billnos=[billno], archived=True)
+        if not bills:
+            raise Http404("No bill matches the given query.")
+        response = HttpResponse(pdf.render_bill(bills[0]), content_type='application/pdf')
+        response['Content-Disposition'] = 'inline; filename="%s"' % pdf.filename(bills[0])
+        return response
+
+
 class PurchaseBillView(View):
     model = PurchaseBill
     template_name = "bill/purchase_bill.html"
     bill_base = "bill/bill_base.html"
 
+    # bill, supplier and details in one query; details are only written once the bill is first edited
+    def get_bill(self, billno):
+        bill = get_object_or_404(PurchaseBill.objects.select_related('supplier', 'purchasedetailsbillno'), billno=billno)
+        billdetails = getattr(bill, 'purchasedetailsbillno', None) or PurchaseBillDetails(billno=bill)
+        return bill, billdetails
+
+    # archived bills are shown read only, their details are kept on the bill row
+    def get_archived_bill(self, billno):
+        bill = get_object_or_404(ArchivedPurchaseBill.objects.select_related('supplier'), billno=billno)
+        return bill, bill
+
     def get(self, request, billno):
-        bill = PurchaseBill.objects.get(billno=billno)
+        try:
+            bill, billdetails = self.get_bill(billno)
+        except Http404:
+            bill, billdetails = self.get_archived_bill(billno)
         context = {
             'bill': bill,
-            'items': PurchaseItem.objects.filter(billno=billno),
-            'billdetails': PurchaseBillDetails.objects.get(billno=billno),
+            'items': bill.get_items_list(),
+            'billdetails': billdetails,
             'bill_base': self.bill_base,
             'auto_generated': bill.auto_generated  # Add auto_generated to context
         }
         return render(request, self.template_name, context)
 
     def post(self, request, billno):
-        form = PurchaseDetailsForm(request.POST)
+        bill, billdetails = self.get_bill(billno)
+        form = PurchaseDetailsForm(request.POST, instance=billdetails)
+        status = 200
         if form.is_valid():
-            billdetailsobj = PurchaseBillDetails.objects.get(billno=billno)
-            
-            billdetailsobj.eway = request.POST.get("eway")    
-            billdetailsobj.veh = request.POST.get("veh")
-            billdetailsobj.destination = request.POST.get("destination")
-            billdetailsobj.po = request.POST.get("po")
-            billdetailsobj.cgst = request.POST.get("cgst")
-            billdetailsobj.sgst = request.POST.get("sgst")
-            billdetailsobj.igst = request.POST.get("igst")
-            billdetailsobj.cess = request.POST.get("cess")
-            billdetailsobj.tcs = request.POST.get("tcs")
-            billdetailsobj.total = request.POST.get("total")
-
-            billdetailsobj.save()
-            messages.success(request, "Bill details have been modified successfully")
+            try:
+                # the form parses the tax amounts into decimals; a first save may race another clerk's
+                with transaction.atomic():
+                    billdetails = form.save()
+                messages.success(request, "Bill details have been modified successfully")
+            except (ConflictError, IntegrityError):
+                messages.error(request, form.conflict_message)
+                bill, billdetails = self.get_bill(billno)
+                status = 409
+        else:
+            messages.error(request, "Tax amounts must be numbers, bill details were not saved")
+            bill, billdetails = self.get_bill(billno)
         
         context = {
-            'bill': PurchaseBill.objects.get(billno=billno),
-            'items': PurchaseItem.objects.filter(billno=billno),
-            'billdetails': PurchaseBillDetails.objects.get(billno=billno),
+            'bill': bill,
+            'items': PurchaseItem.objects.filter(billno=billno).select_related('stock'),
+            'billdetails': billdetails,
             'bill_base': self.bill_base,
         }
-        return render(request, self.template_name, context)
+        return render(request, self.template_name, context, status=status)
 
 class SaleBillView(View):
     model = SaleBill
     template_name = "bill/sale_bill.html"
     bill_base = "bill/bill_base.html"
+
+    # bill and details in one query, the bill carries the customer's details as billed; details are only written once the bill is first edited
+    def get_bill(self, billno):
+        bill = get_object_or_404(SaleBill.objects.select_related('saledetailsbillno'), billno=billno)
+        billdetails = getattr(bill, 'saledetailsbillno', None) or SaleBillDetails(billno=bill)
+        return bill, billdetails
     
+    # archived bills are shown read only, their details are kept on the bill row
+    def get_archived_bill(self, billno):
+        bill = get_object_or_404(ArchivedSaleBill.objects.all(), billno=billno)
+        return bill, bill
+
     def get(self, request, billno):
+        try:
+            bill, billdetails = self.get_bill(billno)
+        except Http404:
+            bill, billdetails = self.get_archived_bill(billno)
         context = {
-            'bill': SaleBill.objects.get(billno=billno),
-            'items': SaleItem.objects.filter(billno=billno),
-            'billdetails': SaleBillDetails.objects.get(billno=billno),
+            'bill': bill,
+            'items': bill.get_items_list(),
+            'billdetails': billdetails,
             'bill_base': self.bill_base,
         }
         return render(request, self.template_name, context)
 
     def post(self, request, billno):
-        form = SaleDetailsForm(request.POST)
+        bill, billdetails = self.get_bill(billno)
+        form = SaleDetailsForm(request.POST, instance=billdetails)
+        status = 200
         if form.is_valid():
-            billdetailsobj = SaleBillDetails.objects.get(billno=billno)
-            
-            billdetailsobj.eway = request.POST.get("eway")    
-            billdetailsobj.veh = request.POST.get("veh")
-            billdetailsobj.destination = request.POST.get("destination")
-            billdetailsobj.po = request.POST.get("po")
-            billdetailsobj.cgst = request.POST.get("cgst")
-            billdetailsobj.sgst = request.POST.get("sgst")
-            billdetailsobj.igst = request.POST.get("igst")
-            billdetailsobj.cess = request.POST.get("cess")
-            billdetailsobj.tcs = request.POST.get("tcs")
-            billdetailsobj.total = request.POST.get("total")
-
-            billdetailsobj.save()
-            messages.success(request, "Bill details have been modified successfully")
+            try:
+                # the form parses the tax amounts into decimals; a first save may race another clerk's
+                with transaction.atomic():
+                    billdetails = form.save()
+                messages.success(request, "Bill details have been modified successfully")
+            except (ConflictError, IntegrityError):
+                messages.error(request, form.conflict_message)
+                bill, billdetails = self.get_bill(billno)
+                status = 409
+        else:
+            messages.error(request, "Tax amounts must be numbers, bill details were not saved")
+            bill, billdetails = self.get_bill(billno)
         
         context = {
-            'bill': SaleBill.objects.get(billno=billno),
-            'items': SaleItem.objects.filter(billno=billno),
-            'billdetails': SaleBillDetails.objects.get(billno=billno),
+            'bill': bill,
+            'items': SaleItem.objects.filter(billno=billno).select_related('stock'),
+            'billdetails': billdetails,
             'bill_base': self.bill_base,
         }
+        return render(request, self.template_name, context, status=status)
+
+# Tax summary report, every table is a single aggregate query
+TAX_HEADS = ['cgst', 'sgst', 'igst', 'cess', 'tcs', 'total']
+
+class TaxSummaryView(View):
+    template_name = 'reports/tax_summary.html'
+
+    def get(self, request):
+        try:
+            year = int(request.GET.get('year', datetime.now().year))
+        except ValueError:
+            year = datetime.now().year
+        sums = {head + '_sum': Sum(head) for head in TAX_HEADS}
+
+        purchases = PurchaseBillDetails.objects.filter(billno__time__year=year)
+        sales = SaleBillDetails.objects.filter(billno__time__year=year)
+        # archived bills carry their details on the bill row, their sums are added to the current ones
+        archived_purchases = ArchivedPurchaseBill.objects.filter(time__year=year)
+        archived_sales = ArchivedSaleBill.objects.filter(time__year=year)
+
+        context = {
+            'year': year,
+            'tax_heads': TAX_HEADS,
+            'purchase_months': archive.merge_sums(
+                'month',
+                purchases.annotate(month=TruncMonth('billno__time')).values('month').annotate(**sums).order_by('month'),
+                archived_purchases.annotate(month=TruncMonth('time')).values('month').annotate(**sums).order_by('month'),
+            ),
+            'sale_months': archive.merge_sums(
+                'month',
+                sales.annotate(month=TruncMonth('billno__time')).values('month').annotate(**sums).order_by('month'),
+                archived_sales.annotate(month=TruncMonth('time')).values('month').annotate(**sums).order_by('month'),
+            ),
+            'suppliers': archive.merge_sums(
+                'supplier_name',
+                purchases.values(supplier_name=F('billno__supplier__name')).annotate(**sums).order_by('supplier_name'),
+                archived_purchases.values(supplier_name=F('supplier__name')).annotate(**sums).order_by('supplier_name'),
+            ),
+            'purchase_totals': archive.add_sums(purchases.aggregate(**sums), archived_purchases.aggregate(**sums)),
+            'sale_totals': archive.add_sums(sales.aggregate(**sums), archived_sales.aggregate(**sums)),
+        }
         return render(request, self.template_name, context)
 
 # Product Details View for Sales data
@@ -391,45 +606,3 @@ class ProductDetailsView(View):
         }
 
         return render(request, self.template_name, context)
-
-@receiver(post_save, sender=Stock)
-def check_inventory_and_create_purchase_order(sender, instance, created, **kwargs):
-    if created:
-        # New product added, no need to check inventory
-        return
-
-    # Check if the quantity is below the threshold
-    if instance.quantity < THRESHOLD_QUANTITY:
-        # Print the actual cost from the Stock instance for debugging
-        print(f"Stock instance cost: {instance.cost}")
-        
-        # Get the first available supplier
-        supplier = Supplier.objects.filter(is_deleted=False).first()
-        if supplier:
-            # Calculate the quantity to order
-            quantity_to_order = THRESHOLD_QUANTITY - instance.quantity + EXCESS_QUANTITY
-
-            # Create a new purchase order and set auto_generated to True
-            new_purchase_order = PurchaseBill.objects.create(
-                supplier=supplier,
-                auto_generated=True
-            )
-
-            # Create purchase bill details
-            PurchaseBillDetails.objects.create(billno=new_purchase_order)
-            print(f"Stock instance cost: {instance.cost}")
-            perprice = instance.cost
-            totalprice = quantity_to_order * perprice
-
-
-            # Create a purchase item using the actual cost from the Stock instance
-            purchase_item = PurchaseItem.objects.create(
-                billno=new_purchase_order,
-                stock=instance,
-                perprice=perprice,  # Set perprice to the actual cost from the Stock instance
-                quantity=quantity_to_order,
-                totalprice = totalprice,
-            )
-            # Update stock quantity
-            instance.quantity += quantity_to_order
-            instance.save()